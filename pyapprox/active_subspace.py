@@ -312,20 +312,9 @@ def coeffs_of_active_subspace_polynomials(W1_trans, as_poly_indices):
             degree = as_index[var_num]
             coeffs_dd = monomial_power_coeffs[var_num][degree]
             indices_dd = monomial_power_indices[var_num][degree]
-
-            # TODO Extension does not groud like terms,but pure python function
-            # multiply_multivariate_polynomials does.
-            # This is only a valid substitution if this function is
-            # only called by intergrate moments
-            try:
-                from pyapprox.cython.manipulate_polynomials import \
-                    multiply_multivariate_polynomials_pyx
-                indices, coeffs = multiply_multivariate_polynomials_pyx(
-                    indices, coeffs, indices_dd, coeffs_dd)
-            except:
-                print('multiply_multivariate_polynomials extension failed')
-                indices, coeffs = multiply_multivariate_polynomials(
-                    indices, coeffs, indices_dd, coeffs_dd)
+            indices, coeffs = multiply_multivariate_polynomials(
+                indices, coeffs[:, None], indices_dd, coeffs_dd[:, None])
+            coeffs = coeffs[:, 0]
         indices_list.append(indices)
         coeffs_list.append(coeffs)
 
@@ -1,6 +1,6 @@
 import numpy as np
 from pyapprox.multivariate_polynomials import PolynomialChaosExpansion, \
-    define_poly_options_from_variable_transformation
+    define_poly_options_from_variable_transformation, BasisMatrixCache
 from pyapprox.adaptive_sparse_grid import SubSpaceRefinementManager
 from pyapprox.induced_sampling import increment_induced_samples_migliorati, \
     generate_induced_samples_migliorati_tolerance, christoffel_weights
@@ -95,6 +95,7 @@ class AdaptiveInducedPCE(SubSpaceRefinementManager):
         self.fit_opts = {'omp_tol':0}
         self.set_preconditioning_function(chistoffel_preconditioning_function)
         self.fit_function = self._fit
+        self.basis_matrix_cache = None
         if cond_tol<1:
             self.induced_sampling=False
             self.set_preconditioning_function(precond_func = lambda m,x: np.ones(x.shape[1]))
@@ -115,6 +116,7 @@ class AdaptiveInducedPCE(SubSpaceRefinementManager):
             self.pce.configure(poly_opts)
         else:
             self.pce=pce
+        self.basis_matrix_cache = None
 
     def increment_samples(self,current_poly_indices,unique_poly_indices):
         if self.induced_sampling:
@@ -183,10 +185,23 @@ class AdaptiveInducedPCE(SubSpaceRefinementManager):
                 canonical_basis_matrix,samples,values,precond_func,omp_tol)
         self.pce.set_coefficients(coef)
         
+    def cached_canonical_basis_matrix(self,samples):
+        """
+        Evaluate the canonical basis matrix of self.pce at the training
+        samples reusing the columns and rows computed by previous fits.
+        """
+        if (self.basis_matrix_cache is None or
+                self.basis_matrix_cache.pce is not self.pce):
+            self.basis_matrix_cache = BasisMatrixCache(
+                self.pce,samples,canonical=True)
+        else:
+            self.basis_matrix_cache.update_samples(samples)
+        return self.basis_matrix_cache(self.pce.indices)
+
     def fit(self):
         return self.fit_function(
-            self.pce,self.pce.canonical_basis_matrix,self.samples,self.values,
-            **self.fit_opts)
+            self.pce,self.cached_canonical_basis_matrix,self.samples,
+            self.values,**self.fit_opts)
 
     def add_new_subspaces(self,new_subspace_indices):
         num_new_subspaces = new_subspace_indices.shape[1]
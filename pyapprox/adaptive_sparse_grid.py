@@ -7,9 +7,13 @@ from pyapprox.sparse_grid import *
 from pyapprox.models.wrappers import WorkTracker
 import copy
 from pyapprox.utilities import lists_of_lists_of_arrays_equal, \
-    lists_of_arrays_equal, partial_functions_equal
+    lists_of_arrays_equal, partial_functions_equal, hash_array, \
+    hash_array_columns
 import pickle
-from pyapprox.indexing import get_forward_neighbor, get_backward_neighbor
+from pyapprox.indexing import get_forward_neighbor, get_backward_neighbor, \
+    get_forward_neighbors, get_backward_neighbors
+from pyapprox.manipulate_polynomials import get_packed_index_radices, \
+    pack_indices
 from functools import partial
 # try:
 #     # Python version < 3
@@ -18,6 +22,13 @@ from functools import partial
 #     import queue
 
 import heapq
+import os
+from concurrent.futures import wait, FIRST_COMPLETED
+from numba import njit
+
+
+# the version of the format written by CombinationSparseGrid.save_checkpoint
+SPARSE_GRID_CHECKPOINT_VERSION = 1
 
 
 class mypriorityqueue():
@@ -68,33 +79,155 @@ def extract_items_from_priority_queue(pqueue):
     return items, pqueue1
 
 
-def update_smolyak_coefficients(new_index, subspace_indices, smolyak_coeffs):
-    assert new_index.ndim == 1
-    assert subspace_indices.ndim == 2
+def append_to_buffered_array(buffer, array, new_array, axis):
+    """
+    Append an array to another along an axis without copying the existing
+    entries, unless the capacity of the buffer storing them is exceeded,
+    in which case the capacity is doubled. Appending n entries one at a
+    time thus has O(n) amortized cost.
+
+    Parameters
+    ----------
+    buffer : np.ndarray
+        The storage whose leading entries along axis are ``array``.
+        If None or ``array`` is not a view of buffer a new buffer is created
 
-    new_smolyak_coeffs = smolyak_coeffs.copy()
-
-    try:
-        from pyapprox.cython.adaptive_sparse_grid import \
-            update_smolyak_coefficients_pyx
-        return update_smolyak_coefficients_pyx(new_index, subspace_indices,
-                                               new_smolyak_coeffs)
-        # from pyapprox.weave.adaptive_sparse_grid import \
-        #     c_update_smolyak_coefficients failed
-        # # new_index.copy is needed
-        # return c_update_smolyak_coefficients(
-        #    new_index.copy(),subspace_indices,smolyak_coeffs)
-    except:
-        print('update_smolyak_coefficients extension failed')
+    array : np.ndarray
+        The current array. Can be None
 
+    new_array : np.ndarray
+        The array appended to ``array``
+
+    axis : integer
+        The axis along which the arrays are joined
+
+    Returns
+    -------
+    buffer : np.ndarray
+        The storage of the joined array
+
+    array : np.ndarray
+        The joined array, which is a view of the leading entries of buffer
+    """
+    if array is None:
+        array = new_array[tuple(
+            slice(0, 0) if dd == axis else slice(None)
+            for dd in range(new_array.ndim))]
+    size = array.shape[axis]
+    new_size = size+new_array.shape[axis]
+    if (buffer is None or array.base is not buffer or
+            buffer.shape[axis] < new_size):
+        shape = list(array.shape)
+        shape[axis] = max(new_size, 2*size)
+        new_buffer = np.empty(shape, dtype=np.result_type(array, new_array))
+        index = [slice(None)]*array.ndim
+        index[axis] = slice(0, size)
+        new_buffer[tuple(index)] = array
+        buffer = new_buffer
+    index = [slice(None)]*array.ndim
+    index[axis] = slice(size, new_size)
+    buffer[tuple(index)] = new_array
+    index[axis] = slice(0, new_size)
+    return buffer, buffer[tuple(index)]
+
+
+@njit(cache=True)
+def _update_smolyak_coefficients(new_indices, subspace_indices,
+                                 smolyak_coeffs):
     num_vars, num_subspace_indices = subspace_indices.shape
-    for ii in range(num_subspace_indices):
-        diff = new_index-subspace_indices[:, ii]
-        if np.all(diff >= 0) and diff.max() <= 1:
-            new_smolyak_coeffs[ii] += (-1.)**diff.sum()
+    # count the changes before storing them so that no storage
+    # proportional to the number of subspaces is needed
+    num_changes = 0
+    for store in range(2):
+        if store == 1:
+            changed_ids = np.empty(num_changes, dtype=np.int64)
+            changes = np.empty(num_changes, dtype=np.double)
+            num_changes = 0
+        for kk in range(new_indices.shape[1]):
+            for ii in range(num_subspace_indices):
+                diff_sum = 0
+                update = True
+                for jj in range(num_vars):
+                    diff = new_indices[jj, kk]-subspace_indices[jj, ii]
+                    if diff < 0 or diff > 1:
+                        update = False
+                        break
+                    diff_sum += diff
+                if update:
+                    if store == 1:
+                        changed_ids[num_changes] = ii
+                        changes[num_changes] = (-1.)**diff_sum
+                        smolyak_coeffs[ii] += changes[num_changes]
+                    num_changes += 1
+    return changed_ids, changes
+
+
+def update_smolyak_coefficients(new_index, subspace_indices, smolyak_coeffs):
+    """
+    Update the smolyak coefficients of a sparse grid when one or more
+    indices are added to its downward closed set of subspace indices.
+
+    Parameters
+    ----------
+    new_index : np.ndarray (num_vars) or (num_vars, num_new_indices)
+        The new indices. Each must be in subspace_indices and the set
+        of subspace indices must be downward closed once all of the new
+        indices are added.
+
+    subspace_indices : np.ndarray (num_vars, num_subspace_indices)
+        The subspace indices
+
+    smolyak_coeffs : np.ndarray (num_subspace_indices)
+        The smolyak coefficients before the new indices are added
+
+    Returns
+    -------
+    new_smolyak_coeffs : np.ndarray (num_subspace_indices)
+        The updated smolyak coefficients
+    """
+    new_smolyak_coeffs = smolyak_coeffs.astype(float)
+    update_smolyak_coefficients_inplace(
+        new_index, subspace_indices, new_smolyak_coeffs)
     return new_smolyak_coeffs
 
 
+def update_smolyak_coefficients_inplace(new_index, subspace_indices,
+                                        smolyak_coeffs):
+    """
+    Update the smolyak coefficients of a sparse grid, without copying them,
+    when one or more indices are added to its downward closed set of
+    subspace indices.
+
+    Parameters
+    ----------
+    new_index : np.ndarray (num_vars) or (num_vars, num_new_indices)
+        The new indices. See :func:`update_smolyak_coefficients`
+
+    subspace_indices : np.ndarray (num_vars, num_subspace_indices)
+        The subspace indices
+
+    smolyak_coeffs : np.ndarray (num_subspace_indices)
+        The smolyak coefficients before the new indices are added. Updated
+        in place so must have dtype double
+
+    Returns
+    -------
+    changed_ids : np.ndarray (num_changes)
+        The subspaces whose coefficients changed. A subspace appears
+        once for each new index that changed its coefficient
+
+    changes : np.ndarray (num_changes)
+        The change to the coefficient of each subspace in changed_ids
+    """
+    assert new_index.ndim in [1, 2]
+    assert subspace_indices.ndim == 2
+    assert smolyak_coeffs.dtype == np.double
+    new_indices = new_index.reshape(new_index.shape[0], -1)
+    return _update_smolyak_coefficients(
+        new_indices.astype(np.int64, copy=False),
+        subspace_indices.astype(np.int64, copy=False), smolyak_coeffs)
+
+
 def add_unique_poly_indices(poly_indices_dict, new_poly_indices):
     unique_poly_indices = []
     num_unique_poly_indices = len(poly_indices_dict)
@@ -128,6 +261,92 @@ def subspace_index_is_admissible(subspace_index, subspace_indices_dict):
     return True
 
 
+def get_index_ids(indices, set_indices):
+    """
+    Find the position of each of a set of indices in another set of indices.
+
+    The indices are packed into integer keys and looked up with a binary
+    search so no Python object is created for each index.
+
+    Parameters
+    ----------
+    indices : np.ndarray (num_vars, num_indices)
+        The indices to find
+
+    set_indices : np.ndarray (num_vars, num_set_indices)
+        The unique indices searched
+
+    Returns
+    -------
+    ids : np.ndarray (num_indices)
+        The column of set_indices equal to each index, or -1 if the index
+        is not in set_indices
+    """
+    ids = np.full(indices.shape[1], -1, dtype=np.int64)
+    if set_indices.shape[1] == 0:
+        return ids
+    max_levels = set_indices.max(axis=1)
+    radices = get_packed_index_radices(max_levels)
+    if radices is None:
+        # the keys would overflow so fall back to hashing
+        set_ids = dict(zip(hash_array_columns(set_indices),
+                           range(set_indices.shape[1])))
+        return np.array([set_ids.get(key, -1)
+                         for key in hash_array_columns(indices)],
+                        dtype=np.int64)
+    # indices with a level larger than any in the set are not members and
+    # cannot be packed with the radices of the set
+    in_range = np.where(
+        np.all(indices <= max_levels[:, np.newaxis], axis=0))[0]
+    set_keys = pack_indices(set_indices, radices)
+    order = np.argsort(set_keys)
+    sorted_keys = set_keys[order]
+    keys = pack_indices(indices[:, in_range], radices)
+    pos = np.minimum(np.searchsorted(sorted_keys, keys), order.shape[0]-1)
+    found = sorted_keys[pos] == keys
+    ids[in_range[found]] = order[pos[found]]
+    return ids
+
+
+def subspace_indices_are_admissible(subspace_indices, set_indices,
+                                    in_downward_closed_set=None):
+    """
+    Determine which of a set of indices can be added to a downward closed
+    set of indices, i.e. which are not already in the set and have all
+    of their backward neighbors in the set.
+
+    Parameters
+    ----------
+    subspace_indices : np.ndarray (num_vars, num_indices)
+        The candidate indices
+
+    set_indices : np.ndarray (num_vars, num_set_indices)
+        The unique indices of the downward closed set and possibly other
+        indices, e.g. the active subspaces of a sparse grid. A candidate
+        in set_indices is never admissible
+
+    in_downward_closed_set : np.ndarray (num_set_indices)
+        True if the corresponding index of set_indices is in the downward
+        closed set. If None all set_indices are in the set
+
+    Returns
+    -------
+    admissible : np.ndarray (num_indices)
+        True if the candidate index is admissible
+    """
+    num_indices = subspace_indices.shape[1]
+    neighbors, index_ids = get_backward_neighbors(subspace_indices)
+    ids = get_index_ids(
+        np.hstack([subspace_indices, neighbors]), set_indices)
+    admissible = ids[:num_indices] < 0
+    neighbor_ids = ids[num_indices:]
+    missing = neighbor_ids < 0
+    if in_downward_closed_set is not None:
+        missing[~missing] = ~in_downward_closed_set[neighbor_ids[~missing]]
+    admissible[index_ids[missing]] = False
+    return admissible
+
+
 def max_level_admissibility_function(max_level, max_level_1d,
                                      max_num_sparse_grid_samples, error_tol,
                                      sparse_grid, subspace_index, verbose=0):
@@ -516,13 +735,102 @@ def compute_hierarchical_surpluses_direct(subspace_index, sparse_grid):
     return surpluses
 
 
-def surplus_refinement_indicator(subspace_index, num_new_subspace_samples,
-                                 sparse_grid, output=False, hierarchical=False,
-                                 norm_order=np.inf):
+def compute_surpluses_batch(subspace_indices, sparse_grid,
+                            hierarchical=False):
+    """
+    Compute the surpluses of a set of active subspaces, i.e. the change in
+    the sparse grid at the samples of each subspace if that subspace is
+    added to the sparse grid.
+
+    The sparse grid interpolates the function at all the samples of the
+    backward neighbors of an active subspace, so the surpluses are only
+    non-zero at the hierarchical samples of the subspace where they equal
+    the difference between the function values and the current sparse grid.
+    Consequently the current sparse grid is evaluated once at the
+    hierarchical samples of all the subspaces, reusing the univariate
+    bases for all subspaces, instead of evaluating the current and the
+    refined sparse grid at all the samples of each subspace.
+
+    This requires nested univariate rules. If the rules are not nested,
+    e.g. Gauss rules, the surpluses of each subspace are computed
+    separately with :func:`compute_surpluses`.
 
-    surpluses, hier_indices = compute_surpluses(
-        subspace_index, sparse_grid, hierarchical=hierarchical)
+    Parameters
+    ----------
+    subspace_indices : np.ndarray (num_vars, num_subspaces)
+        The active subspace indices
+
+    sparse_grid : :class:`pyapprox.adaptive_sparse_grid.CombinationSparseGrid`
+        The sparse grid
+
+    hierarchical : boolean
+        True - only return the surpluses at the hierarchical samples
+        False - return the surpluses at all samples of each subspace
+
+    Returns
+    -------
+    surpluses_list : list (num_subspaces)
+        The surpluses np.ndarray (num_subspace_samples, num_qoi) and
+        the hierarchical indices of each subspace (None if
+        hierarchical is False). See :func:`compute_surpluses`
+    """
+    if (sparse_grid.config_variables_idx is not None or
+            not univariate_samples_are_nested(sparse_grid.samples_1d)):
+        # the sparse grid does not interpolate the config variables or
+        # the samples of the backward neighbors of each subspace
+        return [compute_surpluses(
+            subspace_indices[:, ii], sparse_grid, hierarchical)
+                for ii in range(subspace_indices.shape[1])]
+
+    hier_samples, hier_values, hier_indices_list = [], [], []
+    for ii in range(subspace_indices.shape[1]):
+        subspace_index = subspace_indices[:, ii]
+        idx = sparse_grid.active_subspace_indices_dict[
+            hash_array(subspace_index)]
+        poly_indices = sparse_grid.subspace_poly_indices_list[idx]
+        hier_indices = get_hierarchical_sample_indices(
+            subspace_index, poly_indices, sparse_grid.samples_1d, None)
+        hier_indices_list.append(hier_indices)
+        hier_samples.append(get_sparse_grid_samples(
+            poly_indices[:, hier_indices], sparse_grid.samples_1d))
+        hier_values.append(get_subspace_values(
+            sparse_grid.values,
+            sparse_grid.subspace_values_indices_list[idx][hier_indices]))
 
+    current_approx_values = evaluate_sparse_grid(
+        np.hstack(hier_samples),
+        sparse_grid.values,
+        sparse_grid.poly_indices_dict,
+        sparse_grid.subspace_indices,
+        sparse_grid.subspace_poly_indices_list,
+        sparse_grid.smolyak_coefficients,
+        sparse_grid.samples_1d,
+        sparse_grid.subspace_values_indices_list,
+        sparse_grid.config_variables_idx)
+
+    surpluses_list = []
+    lb = 0
+    for ii in range(subspace_indices.shape[1]):
+        hier_indices = hier_indices_list[ii]
+        ub = lb+hier_indices.shape[0]
+        surpluses = hier_values[ii]-current_approx_values[lb:ub]
+        lb = ub
+        if not hierarchical:
+            idx = sparse_grid.active_subspace_indices_dict[
+                hash_array(subspace_indices[:, ii])]
+            num_subspace_samples = \
+                sparse_grid.subspace_values_indices_list[idx].shape[0]
+            hier_surpluses = surpluses
+            surpluses = np.zeros((num_subspace_samples, surpluses.shape[1]))
+            surpluses[hier_indices] = hier_surpluses
+            hier_indices = None
+        surpluses_list.append((surpluses, hier_indices))
+    return surpluses_list
+
+
+def _surplus_refinement_indicator(subspace_index, num_new_subspace_samples,
+                                  sparse_grid, surpluses, hier_indices,
+                                  norm_order):
     subspace_weights = get_subspace_weights(
         subspace_index, sparse_grid.weights_1d, sparse_grid.config_variables_idx)
     if hier_indices is not None:
@@ -552,6 +860,46 @@ def surplus_refinement_indicator(subspace_index, num_new_subspace_samples,
     return -indicator, error
 
 
+def surplus_refinement_indicator(subspace_index, num_new_subspace_samples,
+                                 sparse_grid, output=False, hierarchical=False,
+                                 norm_order=np.inf):
+
+    surpluses, hier_indices = compute_surpluses(
+        subspace_index, sparse_grid, hierarchical=hierarchical)
+
+    return _surplus_refinement_indicator(
+        subspace_index, num_new_subspace_samples, sparse_grid, surpluses,
+        hier_indices, norm_order)
+
+
+def surplus_refinement_indicator_batch(
+        subspace_indices, num_new_subspace_samples, sparse_grid,
+        output=False, hierarchical=False, norm_order=np.inf):
+    """
+    Batched version of :func:`surplus_refinement_indicator` which
+    uses :func:`compute_surpluses_batch`, so it is only faster than
+    the unbatched version for nested univariate rules. Use with
+    :meth:`SubSpaceRefinementManager.set_batch_refinement_indicator`.
+
+    Returns
+    -------
+    priorities : np.ndarray (num_subspaces)
+        The priority of each subspace
+
+    errors : np.ndarray (num_subspaces)
+        The error indicator of each subspace
+    """
+    surpluses_list = compute_surpluses_batch(
+        subspace_indices, sparse_grid, hierarchical=hierarchical)
+    priorities = np.empty(subspace_indices.shape[1])
+    errors = np.empty(subspace_indices.shape[1])
+    for ii, (surpluses, hier_indices) in enumerate(surpluses_list):
+        priorities[ii], errors[ii] = _surplus_refinement_indicator(
+            subspace_indices[:, ii], num_new_subspace_samples[ii],
+            sparse_grid, surpluses, hier_indices, norm_order)
+    return priorities, errors
+
+
 def convert_sparse_grid_to_polynomial_chaos_expansion(sparse_grid, pce_opts,
                                                       debug=False):
     from pyapprox.multivariate_polynomials import PolynomialChaosExpansion
@@ -643,6 +991,9 @@ class SubSpaceRefinementManager(object):
         self.num_config_vars = 0
         self.subspace_indices_dict = dict()
         self.subspace_indices = np.zeros((self.num_vars, 0), dtype=int)
+        # True for the subspaces in self.subspace_indices_dict, i.e.
+        # that have been refined and are no longer active
+        self.subspace_is_refined = np.zeros((0), dtype=bool)
         self.active_subspace_indices_dict = dict()
         self.active_subspace_queue = mypriorityqueue()
         self.admissibility_function = None
@@ -663,6 +1014,28 @@ class SubSpaceRefinementManager(object):
         self.compact_univariate_growth_rule = None
         self.unique_poly_indices_idx = np.zeros((0), dtype=int)
         self.enforce_variable_ordering = False
+        self.refinement_batch_size = 1
+        self.refinement_batch_priority_fraction = None
+        self.batch_refinement_indicator = None
+        # storage with spare capacity for the arrays that grow as the
+        # sparse grid is refined
+        self._buffers = dict()
+
+    def append_to_array(self, name, new_array, axis):
+        """
+        Append new_array to the array attribute with the given name, e.g.
+        self.samples, with amortized constant cost per entry.
+        """
+        buffer, array = append_to_buffered_array(
+            self._buffers.get(name), getattr(self, name), new_array, axis)
+        self._buffers[name] = buffer
+        setattr(self, name, array)
+
+    def __getstate__(self):
+        # do not pickle the spare capacity of the buffers
+        state = self.__dict__.copy()
+        state['_buffers'] = dict()
+        return state
 
     def initialize(self):
         self.poly_indices_dict = dict()
@@ -672,25 +1045,67 @@ class SubSpaceRefinementManager(object):
         # self.prioritize_active_subspaces(
         #    self.subspace_indices, np.asarray([self.samples.shape[1]]))
         #self.active_subspace_queue.list[0] = (np.inf,self.error[0],0)
-        self.error = np.concatenate([self.error, [np.inf]])
+        self.append_to_array('error', np.array([np.inf]), 0)
         self.active_subspace_queue.put((-np.inf, self.error[0], 0))
 
+    def set_refinement_batch(self, batch_size, priority_fraction=None):
+        """
+        Refine multiple active subspaces at each call to refine(). The
+        new samples of all the forward neighbors of the refined subspaces
+        are evaluated with a single call to self.function.
+
+        Parameters
+        ----------
+        batch_size : integer
+            The maximum number of active subspaces refined at once
+
+        priority_fraction : float
+            If provided only the active subspaces with priority
+            <= priority_fraction times the priority of the best subspace
+            are refined, i.e. only subspaces whose (negative) priority is
+            within this fraction of the best. The best subspace is always
+            refined.
+        """
+        if batch_size < 1:
+            raise Exception('batch_size must be a positive integer')
+        self.refinement_batch_size = batch_size
+        self.refinement_batch_priority_fraction = priority_fraction
+
+    def get_refinement_batch(self):
+        """
+        Pop the active subspaces refined at the next call to refine()
+        from the active subspace queue.
+        """
+        items = [self.active_subspace_queue.get()]
+        best_priority = items[0][0]
+        while (len(items) < self.refinement_batch_size and
+               not self.active_subspace_queue.empty()):
+            priority = self.active_subspace_queue.list[0][0]
+            if (self.refinement_batch_priority_fraction is not None and
+                priority > self.refinement_batch_priority_fraction *
+                    best_priority):
+                break
+            items.append(self.active_subspace_queue.get())
+        return items
+
     def refine(self):
         if self.subspace_indices.shape[1] == 0:
             self.initialize()
 
-        priority, error, best_subspace_idx = self.active_subspace_queue.get()
-        best_active_subspace_index = self.subspace_indices[:,
-                                                           best_subspace_idx]
+        items = self.get_refinement_batch()
+        best_subspace_idx = np.array([item[2] for item in items])
+        best_active_subspace_indices = self.subspace_indices[
+            :, best_subspace_idx]
         if self.verbose > 1:
-            msg = f'refining index {best_active_subspace_index} '
-            msg += f'with priority {priority}\n'
+            msg = f'refining indices {best_active_subspace_indices.T} '
+            msg += f'with priorities {[item[0] for item in items]}\n'
             msg += 'The Current number of equivalent function evaluations is '
             msg += f'{self.num_equivalent_function_evaluations}'
             print(msg)
 
         new_active_subspace_indices, num_new_subspace_samples = \
-            self.refine_and_add_new_subspaces(best_active_subspace_index)
+            self.refine_and_add_new_subspaces_batch(
+                best_active_subspace_indices)
 
         self.prioritize_active_subspaces(
             new_active_subspace_indices, num_new_subspace_samples)
@@ -776,16 +1191,15 @@ class SubSpaceRefinementManager(object):
         return new_active_subspace_indices
 
     def refine_subspace(self, subspace_index):
-        new_active_subspace_indices = np.zeros((self.num_vars, 0), dtype=int)
-        for ii in range(self.num_vars):
-            neighbor_index = get_forward_neighbor(subspace_index, ii)
-            if (subspace_index_is_admissible(
-                neighbor_index, self.subspace_indices_dict) and
-                    hash_array(neighbor_index) not in
-                    self.active_subspace_indices_dict and
-                    self.admissibility_function(self, neighbor_index)):
-                new_active_subspace_indices = np.hstack(
-                    (new_active_subspace_indices, neighbor_index[:, np.newaxis]))
+        # check all the neighbors in the downward closed set at once
+        # before calling the user defined admissibility function
+        neighbor_indices = get_forward_neighbors(subspace_index)
+        admissible = subspace_indices_are_admissible(
+            neighbor_indices, self.subspace_indices,
+            self.subspace_is_refined)
+        II = [ii for ii in np.where(admissible)[0]
+              if self.admissibility_function(self, neighbor_indices[:, ii])]
+        new_active_subspace_indices = neighbor_indices[:, II]
 
         if self.enforce_variable_ordering:
             new_active_subspace_indices = self.postpone_subspace_refinement(
@@ -802,20 +1216,185 @@ class SubSpaceRefinementManager(object):
             if callback is not None:
                 callback(self)
 
+    def build_asynchronously(self, executor, max_pending_subspaces=None,
+                             callback=None):
+        """
+        Build the sparse grid without waiting for all the samples of a
+        refinement to be evaluated. The samples of each new active subspace
+        are submitted to the executor separately. As soon as the values
+        of a subspace are returned the subspace is prioritized and the best
+        evaluated active subspaces are refined, submitting the samples
+        of their forward neighbors.
+
+        Parameters
+        ----------
+        executor : object
+            An object with the concurrent.futures.Executor interface, e.g.
+            concurrent.futures.ProcessPoolExecutor, used to evaluate
+            self.function. The function must be picklable if the executor
+            uses multiple processes
+
+        max_pending_subspaces : integer
+            The number of subspaces being evaluated at which the refinement
+            of evaluated active subspaces stops until more values are
+            returned. If None the number of workers of the executor is used,
+            or the number of CPUs if the executor does not expose it
+
+        callback : callable
+            Function with signature ``callback(sparse_grid)`` called each
+            time the values of a subspace are returned
+        """
+        if self.subspace_indices.shape[1] == 0:
+            self.initialize()
+
+        if max_pending_subspaces is None:
+            max_pending_subspaces = getattr(
+                executor, '_max_workers', os.cpu_count())
+
+        pending = dict()
+        while not self.active_subspace_queue.empty() or len(pending) > 0:
+            while (not self.active_subspace_queue.empty() and
+                   len(pending) < max_pending_subspaces):
+                priority, error, best_subspace_idx = \
+                    self.active_subspace_queue.get()
+                new_active_subspace_indices = self.refine_active_subspace(
+                    self.subspace_indices[:, best_subspace_idx])
+                self.error[best_subspace_idx] = 0.0
+                if new_active_subspace_indices.shape[1] > 0:
+                    pending.update(self.submit_new_subspaces(
+                        new_active_subspace_indices, executor))
+
+            if len(pending) == 0:
+                break
+
+            done = wait(pending, return_when=FIRST_COMPLETED)[0]
+            for future in done:
+                subspace_idx, idx1, idx2 = pending.pop(future)
+                self.values[idx1:idx2] = future.result()
+                self.add_subspace_values(subspace_idx, idx2-idx1)
+                if callback is not None:
+                    callback(self)
+
+    def submit_new_subspaces(self, new_subspace_indices, executor):
+        """
+        Add new active subspaces and submit the evaluation of their samples.
+        Storage for the values is allocated but the values are only set
+        when the evaluations complete.
+
+        Returns
+        -------
+        futures : dict
+            Map from each future to the tuple (subspace_idx, idx1, idx2)
+            where subspace_idx is the column of self.subspace_indices
+            and self.values[idx1:idx2] are the values of the subspace
+        """
+        num_current_subspaces = self.subspace_indices.shape[1]
+        num_current_samples = self.samples.shape[1]
+        new_samples, num_new_subspace_samples = self.create_new_subspaces_data(
+            new_subspace_indices)
+        self.append_to_array('subspace_indices', new_subspace_indices, 1)
+        self.append_to_array('subspace_is_refined', np.zeros(
+            new_subspace_indices.shape[1], dtype=bool), 0)
+        self.append_to_array('samples', new_samples, 1)
+        self.append_to_array('values', np.full(
+            (new_samples.shape[1], self.values.shape[1]), np.nan), 0)
+        self.append_to_array(
+            'error', np.zeros(new_subspace_indices.shape[1]), 0)
+        self.num_equivalent_function_evaluations += self.get_cost(
+            new_subspace_indices, num_new_subspace_samples)
+        self.allocate_subspace_data(new_subspace_indices.shape[1])
+
+        futures = dict()
+        idx2 = num_current_samples
+        for ii in range(new_subspace_indices.shape[1]):
+            idx1, idx2 = idx2, idx2+num_new_subspace_samples[ii]
+            subspace_idx = num_current_subspaces+ii
+            if idx2 == idx1:
+                self.add_subspace_values(subspace_idx, 0)
+                continue
+            future = executor.submit(
+                self.function, self.map_samples_from_canonical_space(
+                    self.samples[:, idx1:idx2]))
+            futures[future] = (subspace_idx, idx1, idx2)
+        return futures
+
+    def add_subspace_values(self, subspace_idx, num_new_subspace_samples):
+        """
+        Prioritize a subspace submitted by submit_new_subspaces once its
+        values have been set.
+        """
+        self.update_subspace_data(subspace_idx)
+        subspace_index = self.subspace_indices[:, subspace_idx]
+        priorities, errors = self.evaluate_refinement_indicator(
+            subspace_index[:, np.newaxis],
+            np.atleast_1d(num_new_subspace_samples))
+        priority, error = priorities[0], errors[0]
+        self.active_subspace_queue.put((priority, error, subspace_idx))
+        self.error[subspace_idx] = error
+
+        if self.verbose > 1:
+            msg = f'adding new index {subspace_index} '
+            msg += f'with priority {priority}'
+            print(msg)
+
+    def allocate_subspace_data(self, num_new_subspaces):
+        """
+        Allocate any data, computed from the values of each subspace, that
+        is stored by derived classes.
+        """
+        pass
+
+    def update_subspace_data(self, subspace_idx):
+        """
+        Update any data, computed from the values of each subspace, that
+        is stored by derived classes.
+        """
+        pass
+
     def refine_and_add_new_subspaces(self, best_active_subspace_index):
+        return self.refine_and_add_new_subspaces_batch(
+            best_active_subspace_index[:, np.newaxis])
+
+    def refine_active_subspace(self, best_active_subspace_index):
+        """
+        Add an active subspace to the sparse grid and return its
+        admissible forward neighbors. The neighbors are not added
+        to the sparse grid.
+        """
         key = hash_array(best_active_subspace_index)
         self.subspace_indices_dict[key] =\
             self.active_subspace_indices_dict[key]
+        self.subspace_is_refined[self.subspace_indices_dict[key]] = True
 
         # get all new active subspace indices
         new_active_subspace_indices = self.refine_subspace(
             best_active_subspace_index)
         del self.active_subspace_indices_dict[key]
+        return new_active_subspace_indices
 
-        if new_active_subspace_indices.shape[1] > 0:
+    def refine_and_add_new_subspaces_batch(self,
+                                           best_active_subspace_indices):
+        new_active_subspace_indices = []
+        new_active_keys = set()
+        for ii in range(best_active_subspace_indices.shape[1]):
+            # The forward neighbors of a subspace refined earlier in the
+            # batch are not yet active so remove duplicates
+            neighbor_indices = self.refine_active_subspace(
+                best_active_subspace_indices[:, ii])
+            for jj in range(neighbor_indices.shape[1]):
+                neighbor_key = hash_array(neighbor_indices[:, jj])
+                if neighbor_key not in new_active_keys:
+                    new_active_keys.add(neighbor_key)
+                    new_active_subspace_indices.append(neighbor_indices[:, jj])
+
+        if len(new_active_subspace_indices) > 0:
+            new_active_subspace_indices = np.asarray(
+                new_active_subspace_indices, dtype=int).T
             num_new_subspace_samples = self.add_new_subspaces(
                 new_active_subspace_indices)
         else:
+            new_active_subspace_indices = np.zeros(
+                (self.num_vars, 0), dtype=int)
             num_new_subspace_samples = 0
         return new_active_subspace_indices, num_new_subspace_samples
 
@@ -837,10 +1416,14 @@ class SubSpaceRefinementManager(object):
         self.poly_indices_dict, unique_poly_indices, \
             subspace_values_indices = add_unique_poly_indices(
                 self.poly_indices_dict, subspace_poly_indices)
-        self.unique_poly_indices_idx = np.concatenate(
-            [self.unique_poly_indices_idx, [self.poly_indices.shape[1]]])
+        self.append_to_array(
+            'unique_poly_indices_idx', np.array([self.poly_indices.shape[1]]),
+            0)
         self.subspace_values_indices_list.append(subspace_values_indices)
-        self.poly_indices = np.hstack((self.poly_indices, unique_poly_indices))
+        if unique_poly_indices.shape[0] == 0:
+            # no unique indices
+            unique_poly_indices = np.zeros((self.num_vars, 0), dtype=int)
+        self.append_to_array('poly_indices', unique_poly_indices, 1)
         return unique_poly_indices
 
     def initialize_subspaces(self, new_subspace_indices):
@@ -857,7 +1440,7 @@ class SubSpaceRefinementManager(object):
         num_current_subspaces = self.subspace_indices.shape[1]
         self.initialize_subspaces(new_subspace_indices)
         num_vars, num_new_subspaces = new_subspace_indices.shape
-        new_samples = np.empty((num_vars, 0), dtype=float)
+        new_samples = [np.empty((num_vars, 0), dtype=float)]
         #num_current_subspaces = self.subspace_indices.shape[1]
         #cnt = num_current_subspaces
         num_new_subspace_samples = np.empty((num_new_subspaces), dtype=int)
@@ -872,26 +1455,22 @@ class SubSpaceRefinementManager(object):
             unique_poly_indices = self.poly_indices[:, idx1:idx2]
             unique_subspace_samples = self.get_subspace_samples(
                 subspace_index, unique_poly_indices)
-            new_samples = np.hstack(
-                (new_samples, unique_subspace_samples))
+            new_samples.append(unique_subspace_samples)
             num_new_subspace_samples[ii] = unique_subspace_samples.shape[1]
             # self.active_subspace_indices_dict[hash_array(subspace_index)]=cnt
             #cnt += 1
-        return new_samples, num_new_subspace_samples
+        return np.hstack(new_samples), num_new_subspace_samples
 
     def add_new_subspaces(self, new_subspace_indices):
         new_samples, num_new_subspace_samples = self.create_new_subspaces_data(
             new_subspace_indices)
 
         new_values = self.eval_function(new_samples)
-        self.subspace_indices = np.hstack(
-            (self.subspace_indices, new_subspace_indices))
-        self.samples = np.hstack((self.samples, new_samples))
-
-        if self.values is None:
-            self.values = new_values
-        else:
-            self.values = np.vstack((self.values, new_values))
+        self.append_to_array('subspace_indices', new_subspace_indices, 1)
+        self.append_to_array('subspace_is_refined', np.zeros(
+            new_subspace_indices.shape[1], dtype=bool), 0)
+        self.append_to_array('samples', new_samples, 1)
+        self.append_to_array('values', new_values, 0)
 
         self.num_equivalent_function_evaluations += self.get_cost(
             new_subspace_indices, num_new_subspace_samples)
@@ -902,13 +1481,13 @@ class SubSpaceRefinementManager(object):
                                     num_new_subspace_samples):
         cnt = self.subspace_indices.shape[1] -\
             new_active_subspace_indices.shape[1]
+        priorities, errors = self.evaluate_refinement_indicator(
+            new_active_subspace_indices, num_new_subspace_samples)
         for ii in range(new_active_subspace_indices.shape[1]):
             subspace_index = new_active_subspace_indices[:, ii]
-
-            priority, error = self.refinement_indicator(
-                subspace_index, num_new_subspace_samples[ii], self)
+            priority, error = priorities[ii], errors[ii]
             self.active_subspace_queue.put((priority, error, cnt))
-            self.error = np.concatenate([self.error, [error]])
+            self.append_to_array('error', np.array([error]), 0)
 
             if self.verbose > 1:
                 msg = f'adding new index {subspace_index} '
@@ -916,6 +1495,42 @@ class SubSpaceRefinementManager(object):
                 print(msg)
             cnt += 1
 
+    def set_batch_refinement_indicator(self, batch_refinement_indicator):
+        """
+        Set a function which computes the priorities of all the subspaces
+        activated by a refinement at once, e.g.
+        :func:`surplus_refinement_indicator_batch`. If set it is used
+        instead of self.refinement_indicator.
+
+        Parameters
+        ----------
+        batch_refinement_indicator : callable
+            Function with signature
+
+            `batch_refinement_indicator(subspace_indices, num_new_subspace_samples, sparse_grid) -> np.ndarray (num_subspaces), np.ndarray (num_subspaces)`
+
+            which returns the priority and error of each subspace
+        """
+        self.batch_refinement_indicator = batch_refinement_indicator
+
+    def evaluate_refinement_indicator(self, subspace_indices,
+                                      num_new_subspace_samples):
+        """
+        Return the priority and error of a set of active subspaces.
+        """
+        if subspace_indices.shape[1] == 0:
+            return np.zeros(0), np.zeros(0)
+        if self.batch_refinement_indicator is not None:
+            return self.batch_refinement_indicator(
+                subspace_indices, num_new_subspace_samples, self)
+        priorities, errors = [], []
+        for ii in range(subspace_indices.shape[1]):
+            priority, error = self.refinement_indicator(
+                subspace_indices[:, ii], num_new_subspace_samples[ii], self)
+            priorities.append(priority)
+            errors.append(error)
+        return priorities, errors
+
     def set_function(self, function, variable_transformation=None):
         self.function = function
         self.variable_transformation = variable_transformation
@@ -943,12 +1558,15 @@ class SubSpaceRefinementManager(object):
                     random_samples)
         return random_samples
 
-    def eval_function(self, canonical_samples):
+    def map_samples_from_canonical_space(self, canonical_samples):
         random_samples = self.map_random_samples_from_canonical_space(
             canonical_samples)
         config_samples = self.map_config_samples_from_canonical_space(
             canonical_samples)
-        samples = np .vstack((random_samples, config_samples))
+        return np.vstack((random_samples, config_samples))
+
+    def eval_function(self, canonical_samples):
+        samples = self.map_samples_from_canonical_space(canonical_samples)
         values = self.function(samples)
 
         return values
@@ -1084,7 +1702,7 @@ class SubSpaceRefinementManager(object):
         base class.
         """
         member_names = [
-            m[0] for m in vars(self).items() if not m[0].startswith("__")]
+            m[0] for m in vars(self).items() if not m[0].startswith("_")]
         for m in member_names:
             attr = getattr(other, m)
             # print(m)
@@ -1112,16 +1730,16 @@ class SubSpaceRefinementManager(object):
         items = extract_items_from_priority_queue(
             self.active_subspace_queue)[0]
         self.active_subspace_queue = mypriorityqueue()
-        for item in items:
-            count = item[2]  # index of grid.subspace_indices
-            # find num_samples for subspace
-            subspace_index = self.subspace_indices[:, count]
-            num_subspace_samples = \
-                self.subspace_values_indices_list[count].shape[0]
-            # print(num_subspace_samples,subspace_index)
-            # compute priority and error for subspace
-            priority, error = self.refinement_indicator(
-                subspace_index, num_subspace_samples, self)
+        # index of grid.subspace_indices
+        counts = np.array([item[2] for item in items], dtype=int)
+        # find num_samples for subspace
+        num_subspace_samples = np.array(
+            [self.subspace_values_indices_list[count].shape[0]
+             for count in counts], dtype=int)
+        # compute priority and error for subspace
+        priorities, errors = self.evaluate_refinement_indicator(
+            self.subspace_indices[:, counts], num_subspace_samples)
+        for priority, error, count in zip(priorities, errors, counts):
             new_item = (priority, error, count)
             self.active_subspace_queue.put(new_item)
             self.error[count] = error
@@ -1211,14 +1829,22 @@ class CombinationSparseGrid(SubSpaceRefinementManager):
 
         self.univariate_quad_rule = None
         self.samples_1d, self.weights_1d = [None, None]
-        self.smolyak_coefficients = np.empty((0), np.float)
+        self.smolyak_coefficients = np.empty((0), float)
         self.variable_transformation = None
         self.compact_univariate_quad_rule = None
 
         # extra storage to reduce cost of repeated interrogation
         self.subspace_moments = None
+        # if True only the moments of the sparse grid are stored
+        self.stream_moments = False
+        self.streamed_moments = None
         self.subspace_interrogation_values = []
         self.canonical_interrogation_samples = None
+        # the smolyak coefficients of the sparse grid that includes all
+        # active subspaces with values
+        self.all_data_smolyak_coefficients = np.empty((0), float)
+        self.interrogation_values = None
+        self.all_data_interrogation_values = None
 
     def setup(self, function, config_variables_idx, refinement_indicator,
               admissibility_function, univariate_growth_rule,
@@ -1290,14 +1916,98 @@ class CombinationSparseGrid(SubSpaceRefinementManager):
             [max_level]*dd, self.config_variables_idx,
             self.unique_quadrule_indices)
 
-    def refine_and_add_new_subspaces(self, best_active_subspace_index):
-        new_active_subspace_indices, num_new_subspace_samples = super(
-            CombinationSparseGrid, self).refine_and_add_new_subspaces(
+    def refine_active_subspace(self, best_active_subspace_index):
+        new_active_subspace_indices = super(
+            CombinationSparseGrid, self).refine_active_subspace(
             best_active_subspace_index)
-        self.smolyak_coefficients = update_smolyak_coefficients(
+        # the forward neighbors do not change the smolyak coefficients of
+        # the subspaces already in self.subspace_indices. Update the
+        # coefficients in place so they stay in their buffer
+        changed_ids, changes = update_smolyak_coefficients_inplace(
             best_active_subspace_index, self.subspace_indices,
             self.smolyak_coefficients)
-        return new_active_subspace_indices, num_new_subspace_samples
+        if self.canonical_interrogation_samples is not None:
+            self.interrogation_values = \
+                self.accumulate_interrogation_values(
+                    self.interrogation_values, changed_ids, changes)
+        if self.stream_moments:
+            self.streamed_moments = self.accumulate_moments(
+                self.streamed_moments, changed_ids, changes)
+        return new_active_subspace_indices
+
+    def set_stream_moments(self, stream_moments=True):
+        """
+        Set whether the mean and variance of every subspace are stored.
+
+        When the moments are streamed the moments of the sparse grid are
+        accumulated in a single array as the smolyak coefficients change,
+        reducing the memory from O(num_subspaces*num_qoi) to O(num_qoi).
+        The moments of a subspace are recomputed from its values whenever
+        its coefficient changes. Must be called before the sparse grid is
+        refined.
+
+        Parameters
+        ----------
+        stream_moments : boolean
+            True - only store the moments of the sparse grid
+            False - store the moments of every subspace
+        """
+        if self.subspace_indices.shape[1] > 0:
+            msg = 'set_stream_moments must be called before the sparse grid '
+            msg += 'is refined'
+            raise Exception(msg)
+        self.stream_moments = stream_moments
+
+    def update_moments(self, moments, smolyak_coefficients,
+                       new_smolyak_coefficients):
+        """
+        Update the moments of a sparse grid using only the subspaces
+        whose smolyak coefficients changed.
+        """
+        II = np.where(np.absolute(
+            new_smolyak_coefficients-smolyak_coefficients) >
+                      np.finfo(float).eps)[0]
+        return self.accumulate_moments(
+            moments, II, new_smolyak_coefficients[II]-smolyak_coefficients[II])
+
+    def accumulate_moments(self, moments, subspace_ids, coefficient_changes):
+        """
+        Update the moments of a sparse grid given the changes to the
+        smolyak coefficients of a set of subspaces.
+        """
+        moments = moments.copy()
+        for ii, change in zip(subspace_ids, coefficient_changes):
+            subspace_values = get_subspace_values(
+                self.values, self.subspace_values_indices_list[ii])
+            accumulate_sparse_grid_subspace_moments(
+                moments, change, self.subspace_indices[:, ii],
+                subspace_values, self.weights_1d, self.config_variables_idx)
+        return moments
+
+    def update_interrogation_values(self, interrogation_values,
+                                    smolyak_coefficients,
+                                    new_smolyak_coefficients):
+        """
+        Update the values of a sparse grid at the interrogation samples
+        using only the subspaces whose smolyak coefficients changed.
+        """
+        II = np.where(np.absolute(
+            new_smolyak_coefficients-smolyak_coefficients) >
+                      np.finfo(float).eps)[0]
+        return self.accumulate_interrogation_values(
+            interrogation_values, II,
+            new_smolyak_coefficients[II]-smolyak_coefficients[II])
+
+    def accumulate_interrogation_values(self, interrogation_values,
+                                        subspace_ids, coefficient_changes):
+        """
+        Update the values of a sparse grid at the interrogation samples
+        given the changes to the smolyak coefficients of a set of subspaces.
+        """
+        for ii, change in zip(subspace_ids, coefficient_changes):
+            interrogation_values = interrogation_values + \
+                change*self.subspace_interrogation_values[ii]
+        return interrogation_values
 
     def get_subspace_samples(self, subspace_index, unique_poly_indices):
         samples_1d, weights_1d = update_1d_samples_weights(
@@ -1306,8 +2016,7 @@ class CombinationSparseGrid(SubSpaceRefinementManager):
             subspace_index, self.samples_1d, self.weights_1d,
             self.config_variables_idx, self.unique_quadrule_indices)
 
-        self.smolyak_coefficients = np.hstack(
-            (self.smolyak_coefficients, np.zeros(1)))
+        self.append_to_array('smolyak_coefficients', np.zeros(1), 0)
 
         return get_sparse_grid_samples(
             unique_poly_indices, self.samples_1d, self.config_variables_idx)
@@ -1335,6 +2044,10 @@ class CombinationSparseGrid(SubSpaceRefinementManager):
             self.config_variables_idx)
 
     def moments_(self, smolyak_coefficients):
+        if self.stream_moments:
+            return self.update_moments(
+                self.streamed_moments, self.smolyak_coefficients,
+                smolyak_coefficients)
         return integrate_sparse_grid_from_subspace_moments(
             self.subspace_indices, smolyak_coefficients,
             self.subspace_moments)
@@ -1358,6 +2071,11 @@ class CombinationSparseGrid(SubSpaceRefinementManager):
         is called no major computations are required.
         Note the reduced time complexity requires more storage
 
+        The values of the sparse grid at the samples, with and without
+        the active subspaces, are updated each time the smolyak
+        coefficients change at a cost proportional to the number of
+        subspaces whose coefficients changed.
+
         Parameters
         ----------
         samples : np.ndarray (num_vars) or (num_vars-num_config_vars)
@@ -1372,33 +2090,50 @@ class CombinationSparseGrid(SubSpaceRefinementManager):
             canonical_samples = samples[:self.config_variables_idx, :]
         self.canonical_interrogation_samples = canonical_samples
 
-    def evaluate_at_interrogation_samples(self):
+        self.subspace_interrogation_values = []
+        if self.values is None:
+            return
+        for ii in range(self.subspace_indices.shape[1]):
+            self.subspace_interrogation_values.append(
+                self.evaluate_subspace_at_interrogation_samples(ii))
+        num_qoi = self.values.shape[1]
+        self.interrogation_values = self.update_interrogation_values(
+            np.zeros((canonical_samples.shape[1], num_qoi)),
+            np.zeros_like(self.smolyak_coefficients),
+            self.smolyak_coefficients)
+        self.all_data_interrogation_values = self.update_interrogation_values(
+            np.zeros((canonical_samples.shape[1], num_qoi)),
+            np.zeros_like(self.all_data_smolyak_coefficients),
+            self.all_data_smolyak_coefficients)
+
+    def evaluate_subspace_at_interrogation_samples(self, subspace_idx):
+        subspace_values = get_subspace_values(
+            self.values, self.subspace_values_indices_list[subspace_idx])
+        return evaluate_sparse_grid_subspace(
+            self.canonical_interrogation_samples,
+            self.subspace_indices[:, subspace_idx], subspace_values,
+            self.samples_1d, self.config_variables_idx, False)
+
+    def evaluate_at_interrogation_samples(self, use_all_data=False):
         """
         Evaluate the sparse grid at self.canonical_interrogation_samples.
 
-        Note, this fuction only uses subspaces which are not active
+        Parameters
+        ----------
+        use_all_data : boolean
+            False - only use the subspaces which are not active
+            True  - use all subspaces including active subspaces
         """
-        return evaluate_sparse_grid_from_subspace_values(
-            self.subspace_indices, self.smolyak_coefficients,
-            self.subspace_interrogation_values)
+        if use_all_data:
+            return self.all_data_interrogation_values
+        return self.interrogation_values
 
     def evaluate_using_all_data(self, samples):
         """
         Evaluate sparse grid using all subspace indices including
         active subspaces. __call__ only uses subspaces which are not active
         """
-        # extract active subspaces from queue without destroying queue
-        pairs, self.active_subspace_queue = \
-            extract_items_from_priority_queue(self.active_subspace_queue)
-        # copy smolyak coefficients so as not affect future refinement
-        smolyak_coefficients = self.smolyak_coefficients.copy()
-        # add all active subspaces to sparse grid by updating smolyak
-        # coefficients
-        for ii in range(len(pairs)):
-            subspace_index = self.subspace_indices[:, pairs[ii][-1]]
-            smolyak_coefficients = update_smolyak_coefficients(
-                subspace_index, self.subspace_indices,
-                smolyak_coefficients)
+        smolyak_coefficients = self.all_data_smolyak_coefficients
 
         if self.variable_transformation is not None:
             canonical_samples = \
@@ -1424,35 +2159,57 @@ class CombinationSparseGrid(SubSpaceRefinementManager):
         num_new_subspace_samples = super(
             CombinationSparseGrid, self).add_new_subspaces(new_subspace_indices)
 
-        cnt = num_current_subspaces
-        new_subspace_moments = np.empty(
-            (num_new_subspaces, self.values.shape[1], 2), dtype=float)
-        for ii in range(num_new_subspaces):
-            subspace_index = new_subspace_indices[:, ii]
+        self.allocate_subspace_data(num_new_subspaces)
+        for cnt in range(num_current_subspaces,
+                         num_current_subspaces+num_new_subspaces):
+            self.update_subspace_data(cnt)
+
+        return num_new_subspace_samples
+
+    def allocate_subspace_data(self, num_new_subspaces):
+        if self.stream_moments:
+            if self.streamed_moments is None:
+                self.streamed_moments = np.zeros((2, self.values.shape[1]))
+        else:
+            # subspaces waiting to be evaluated have zero smolyak
+            # coefficients so the zero moments are never used
+            new_subspace_moments = np.zeros(
+                (num_new_subspaces, self.values.shape[1], 2), dtype=float)
+            self.append_to_array('subspace_moments', new_subspace_moments, 0)
+        self.append_to_array(
+            'all_data_smolyak_coefficients', np.zeros(num_new_subspaces), 0)
+        if self.canonical_interrogation_samples is not None:
+            self.subspace_interrogation_values += [None]*num_new_subspaces
+            if self.interrogation_values is None:
+                num_qoi = self.values.shape[1]
+                num_samples = self.canonical_interrogation_samples.shape[1]
+                self.interrogation_values = np.zeros((num_samples, num_qoi))
+                self.all_data_interrogation_values = np.zeros(
+                    (num_samples, num_qoi))
+
+    def update_subspace_data(self, subspace_idx):
+        subspace_index = self.subspace_indices[:, subspace_idx]
+        if not self.stream_moments:
             subspace_values = get_subspace_values(
-                self.values, self.subspace_values_indices_list[cnt])
+                self.values, self.subspace_values_indices_list[subspace_idx])
             subspace_moments = integrate_sparse_grid_subspace(
                 subspace_index, subspace_values, self.weights_1d,
                 self.config_variables_idx)
-            new_subspace_moments[ii, :, :] = subspace_moments.T
-            if self.canonical_interrogation_samples is not None:
-                # if storage becomes a problem may need to remove subspace values
-                # when they have a non-zero smolyak coefficient and recompute it
-                # if needed again
-                self.subspace_interrogation_values.append(
-                    evaluate_sparse_grid_subspace(
-                        self.canonical_interrogation_samples, subspace_index,
-                        subspace_values, self.samples_1d,
-                        self.config_variables_idx, False))
-            cnt += 1
-
-        if self.subspace_moments is None:
-            self.subspace_moments = new_subspace_moments
-        else:
-            self.subspace_moments = np.vstack(
-                (self.subspace_moments, new_subspace_moments))
-
-        return num_new_subspace_samples
+            self.subspace_moments[subspace_idx, :, :] = subspace_moments.T
+        # the subspace is added to the sparse grid containing all
+        # subspaces with values. Its backward neighbors are all in the grid
+        changed_ids, changes = update_smolyak_coefficients_inplace(
+            subspace_index, self.subspace_indices,
+            self.all_data_smolyak_coefficients)
+        if self.canonical_interrogation_samples is not None:
+            # if storage becomes a problem may need to remove subspace values
+            # when they have a non-zero smolyak coefficient and recompute it
+            # if needed again
+            self.subspace_interrogation_values[subspace_idx] = \
+                self.evaluate_subspace_at_interrogation_samples(subspace_idx)
+            self.all_data_interrogation_values = \
+                self.accumulate_interrogation_values(
+                    self.all_data_interrogation_values, changed_ids, changes)
 
     def save(self, filename):
         try:
@@ -1470,6 +2227,176 @@ class CombinationSparseGrid(SubSpaceRefinementManager):
             msg = 'Second save was successful'
             print(msg)
 
+    def save_checkpoint(self, dirname):
+        """
+        Append the current state of the sparse grid to a checkpoint so that
+        an adaptive build can be resumed with :meth:`load_checkpoint`.
+
+        Only the samples and values added since the last call are written,
+        to a new file ``dirname/data-<chunk>.npz``. The remaining state,
+        i.e. the subspace indices, smolyak coefficients, errors and the
+        active subspace queue, is small and rewritten to
+        ``dirname/state.npz``, which is replaced atomically. If a failure
+        occurs while writing, the checkpoint remains valid and describes
+        the state saved by the previous call.
+
+        Checkpoints must not be saved while subspaces submitted by
+        :meth:`build_asynchronously` are waiting to be evaluated.
+
+        Parameters
+        ----------
+        dirname : string
+            The directory storing the checkpoint. It is created if it
+            does not exist.
+        """
+        if self.values is None:
+            raise Exception('The sparse grid has not been initialized')
+        if np.any(np.isnan(self.values)):
+            msg = 'Cannot save a checkpoint while subspaces are being '
+            msg += 'evaluated'
+            raise Exception(msg)
+
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        state_filename = os.path.join(dirname, 'state.npz')
+        if os.path.exists(state_filename):
+            with np.load(state_filename) as state:
+                num_saved_samples = int(state['num_samples'])
+                num_chunks = int(state['num_chunks'])
+        else:
+            num_saved_samples, num_chunks = 0, 0
+        if num_saved_samples > self.samples.shape[1]:
+            msg = f'The checkpoint in {dirname} does not belong to this '
+            msg += 'sparse grid'
+            raise Exception(msg)
+
+        if num_saved_samples < self.samples.shape[1]:
+            np.savez(
+                os.path.join(dirname, f'data-{num_chunks}.npz'),
+                samples=self.samples[:, num_saved_samples:],
+                values=self.values[num_saved_samples:])
+            num_chunks += 1
+
+        refined = np.zeros(self.subspace_indices.shape[1], dtype=bool)
+        refined[list(self.subspace_indices_dict.values())] = True
+        queue = self.active_subspace_queue.list
+        postponed_subspace_indices = np.asarray(
+            list(getattr(self, 'postponed_subspace_indices', {}).values()),
+            dtype=int).reshape(-1, self.num_vars).T
+        # np.savez appends .npz to filenames without the extension
+        tmp_filename = os.path.join(dirname, 'state-tmp.npz')
+        np.savez(
+            tmp_filename,
+            version=SPARSE_GRID_CHECKPOINT_VERSION,
+            num_samples=self.samples.shape[1], num_chunks=num_chunks,
+            subspace_indices=self.subspace_indices.astype(
+                np.min_scalar_type(self.subspace_indices.max())),
+            refined=refined,
+            smolyak_coefficients=self.smolyak_coefficients,
+            error=self.error,
+            queue_priorities=np.array(
+                [item[0] for item in queue], dtype=float),
+            queue_errors=np.array([item[1] for item in queue], dtype=float),
+            queue_subspace_idx=np.array(
+                [item[2] for item in queue], dtype=int),
+            num_equivalent_function_evaluations=(
+                self.num_equivalent_function_evaluations),
+            postponed_subspace_indices=postponed_subspace_indices)
+        os.replace(tmp_filename, state_filename)
+
+    def load_checkpoint(self, dirname):
+        """
+        Restore the state of a sparse grid from a checkpoint written by
+        :meth:`save_checkpoint`.
+
+        The sparse grid must have been setup, but not refined, with the
+        same univariate quadrature rules, growth rules and admissibility
+        function used to create the checkpoint. The subspaces are
+        reconstructed from the saved values so self.function is not
+        evaluated.
+
+        Parameters
+        ----------
+        dirname : string
+            The directory storing the checkpoint.
+        """
+        if self.subspace_indices.shape[1] > 0:
+            msg = 'A checkpoint can only be loaded into a sparse grid that '
+            msg += 'has not been refined'
+            raise Exception(msg)
+
+        with np.load(os.path.join(dirname, 'state.npz')) as state:
+            state = dict(state)
+        if int(state['version']) != SPARSE_GRID_CHECKPOINT_VERSION:
+            msg = f'Checkpoint version {int(state["version"])} is not '
+            msg += f'supported. Version {SPARSE_GRID_CHECKPOINT_VERSION} '
+            msg += 'is required'
+            raise Exception(msg)
+        samples, values = [], []
+        for ii in range(int(state['num_chunks'])):
+            with np.load(os.path.join(dirname, f'data-{ii}.npz')) as data:
+                samples.append(data['samples'])
+                values.append(data['values'])
+        samples, values = np.hstack(samples), np.vstack(values)
+        num_samples = int(state['num_samples'])
+        samples, values = samples[:, :num_samples], values[:num_samples]
+        subspace_indices = state['subspace_indices'].astype(int)
+
+        # add the subspaces in the order they were originally added
+        # returning the saved values instead of evaluating the function
+        num_values_used = [0]
+
+        def saved_values(new_samples):
+            idx = num_values_used[0]
+            num_values_used[0] += new_samples.shape[1]
+            return values[idx:num_values_used[0]]
+
+        function = self.function
+        self.function = saved_values
+        try:
+            self.initialize()
+            if subspace_indices.shape[1] > 1:
+                self.add_new_subspaces(subspace_indices[:, 1:])
+        finally:
+            self.function = function
+
+        if (self.samples.shape != samples.shape or
+                not np.allclose(self.samples, samples)):
+            msg = 'The samples of the sparse grid are inconsistent with the '
+            msg += 'checkpoint. Check the sparse grid was setup correctly'
+            raise Exception(msg)
+
+        for ii in np.where(state['refined'])[0]:
+            key = hash_array(subspace_indices[:, ii])
+            self.subspace_indices_dict[key] = \
+                self.active_subspace_indices_dict.pop(key)
+            self.subspace_is_refined[self.subspace_indices_dict[key]] = True
+        self.smolyak_coefficients = state['smolyak_coefficients']
+        self.error = state['error']
+        self.active_subspace_queue = mypriorityqueue()
+        self.active_subspace_queue.list = [
+            (priority, error, idx) for priority, error, idx in zip(
+                state['queue_priorities'].tolist(),
+                state['queue_errors'].tolist(),
+                state['queue_subspace_idx'].tolist())]
+        self.num_equivalent_function_evaluations = \
+            state['num_equivalent_function_evaluations'].item()
+        if state['postponed_subspace_indices'].shape[1] > 0:
+            self.postponed_subspace_indices = dict()
+            for index in state['postponed_subspace_indices'].T:
+                self.postponed_subspace_indices[hash_array(index)] = index
+
+        if self.canonical_interrogation_samples is not None:
+            self.interrogation_values = self.update_interrogation_values(
+                np.zeros_like(self.interrogation_values),
+                np.zeros_like(self.smolyak_coefficients),
+                self.smolyak_coefficients)
+        if self.stream_moments:
+            self.streamed_moments = self.update_moments(
+                np.zeros_like(self.streamed_moments),
+                np.zeros_like(self.smolyak_coefficients),
+                self.smolyak_coefficients)
+
 
 def plot_adaptive_sparse_grid_3d(sparse_grid, plot_grid=True):
     from pyapprox.visualization import plot_3d_indices
@@ -17,8 +17,14 @@ import numpy as np
 from pyapprox.adaptive_sparse_grid import variance_refinement_indicator, \
     CombinationSparseGrid, \
     get_sparse_grid_univariate_leja_quadrature_rules_economical, \
-    max_level_admissibility_function
+    max_level_admissibility_function, append_to_buffered_array
 from pyapprox.variables import IndependentMultivariateRandomVariable
+from pyapprox.multivariate_polynomials import BasisMatrixCache
+from pyapprox.utilities import update_cholesky_factorization, \
+    update_cholesky_factorization_rank_one, \
+    cholesky_solve_linear_system, get_random_k_fold_sample_indices, \
+    leave_many_out_lsq_cross_validation
+from scipy.linalg import solve_triangular
 from pyapprox.variable_transformations import AffineRandomVariableTransformation
 from functools import partial
 from scipy.optimize import OptimizeResult
@@ -532,11 +538,22 @@ class LinearLeastSquares(LinearModel):
         return self
 
 
+def _get_linear_least_squares_cv_fold_sample_indices(
+        nsamples, cv, random_folds):
+    """
+    Return the samples in each fold used to cross validate least squares
+    solutions. A single fold (cv=1) denotes leave one out cross validation.
+    """
+    if cv == 1:
+        cv = nsamples
+    return get_random_k_fold_sample_indices(nsamples, cv, random_folds)
+
+
 class LinearLeastSquaresCV(LinearModel):
     """
     Parameters
     ----------
-    - None, to use the default 5-fold cross-validation
+    - None or 1, to use leave one out cross-validation
     - integer to specify the number of folds
     """
     def __init__(self, alphas=[0.], cv=None, random_folds=True):
@@ -552,8 +569,9 @@ class LinearLeastSquaresCV(LinearModel):
         if y.ndim == 1:
             y = y[:, None]
         assert y.shape[1] == 1
-        fold_sample_indices = get_random_k_fold_sample_indices(
-            X.shape[0], self.cv, self.random_folds)
+        fold_sample_indices = \
+            _get_linear_least_squares_cv_fold_sample_indices(
+                X.shape[0], self.cv, self.random_folds)
         results = []
         for ii in range(len(self.alphas)):
             results.append(leave_many_out_lsq_cross_validation(
@@ -569,6 +587,251 @@ class LinearLeastSquaresCV(LinearModel):
         return self
 
 
+class IncrementalLinearLeastSquares(object):
+    r"""
+    Solve the regularized linear least squares problem
+
+    .. math:: \min_\beta \lVert X\beta-y\rVert_2^2+\alpha\lVert\beta\rVert_2^2
+
+    while columns and rows are added to, or columns are removed from,
+    :math:`X`. The Cholesky factorization :math:`LL^T=X^TX+\alpha I` and the
+    matrix :math:`L^{-1}X^T` used to cross validate are updated instead of
+    recomputed, so adding a column costs :math:`O(Nk)`, removing a column
+    costs :math:`O(Nk+k^2)` and adding a row costs :math:`O(k^2)`, where
+    :math:`N` is the number of rows and :math:`k` the number of columns of
+    :math:`X`. Adding rows invalidates :math:`L^{-1}X^T` which is then
+    recomputed, at a cost of :math:`O(Nk^2)`, the next time the basis is
+    cross validated.
+
+    Parameters
+    ----------
+    train_vals : np.ndarray (nsamples, nqoi)
+        The values of the function at the training samples
+
+    alpha : float
+        The ridge regularization parameter
+    """
+    def __init__(self, train_vals, alpha=0.):
+        assert train_vals.ndim == 2
+        self.alpha = alpha
+        self.train_vals = train_vals.copy()
+        self.basis_matrix = np.empty((train_vals.shape[0], 0))
+        self.chol_factor = np.empty((0, 0))
+        self.rhs = np.empty((0, train_vals.shape[1]))
+        self.column_ids = np.empty(0, dtype=np.int64)
+        # L^{-1}X^T. The basis matrix and this matrix are views of
+        # preallocated buffers so adding columns does not copy them
+        self.chol_inv_basis_matrix_trans = np.empty(
+            (0, train_vals.shape[0]))
+        self._basis_matrix_buffer = None
+        self._chol_inv_basis_matrix_trans_buffer = None
+
+    def num_terms(self):
+        return self.basis_matrix.shape[1]
+
+    def num_samples(self):
+        return self.basis_matrix.shape[0]
+
+    def add_columns(self, columns, column_ids=None):
+        """
+        Append columns to the basis matrix.
+
+        Parameters
+        ----------
+        columns : np.ndarray (nsamples, ncolumns)
+            The new columns
+
+        column_ids : np.ndarray (ncolumns)
+            Integers identifying each column. If None the columns are
+            numbered consecutively after the largest existing id
+        """
+        assert columns.shape[0] == self.num_samples()
+        ncolumns = columns.shape[1]
+        if ncolumns == 0:
+            return
+        if column_ids is None:
+            start = self.column_ids.max()+1 if self.num_terms() > 0 else 0
+            column_ids = np.arange(start, start+ncolumns)
+        nterms = self.num_terms()
+        gram_12 = self.basis_matrix.T.dot(columns)
+        gram_22 = columns.T.dot(columns)+self.alpha*np.eye(ncolumns)
+        self.chol_factor = update_cholesky_factorization(
+            self.chol_factor, gram_12, gram_22)
+        self.rhs = np.vstack([self.rhs, columns.T.dot(self.train_vals)])
+        self._basis_matrix_buffer, self.basis_matrix = \
+            append_to_buffered_array(
+                self._basis_matrix_buffer, self.basis_matrix, columns, 1)
+        self.column_ids = np.concatenate([self.column_ids, column_ids])
+        if self.chol_inv_basis_matrix_trans is None:
+            return
+        # The new rows of L^{-1}X^T solve L_12^TZ_1+L_22Z_2=C^T
+        L_12_trans = self.chol_factor[nterms:, :nterms]
+        L_22 = self.chol_factor[nterms:, nterms:]
+        new_rows = solve_triangular(
+            L_22, columns.T-L_12_trans.dot(self.chol_inv_basis_matrix_trans),
+            lower=True)
+        (self._chol_inv_basis_matrix_trans_buffer,
+         self.chol_inv_basis_matrix_trans) = append_to_buffered_array(
+             self._chol_inv_basis_matrix_trans_buffer,
+             self.chol_inv_basis_matrix_trans, new_rows, 0)
+
+    def _remove_column(self, pos):
+        """
+        Remove the column at position pos. As in
+        :func:`pyapprox.utilities.delete_cholesky_factorization_row_and_column`
+        the trailing factor absorbs the removed column of the Cholesky factor
+        via Givens rotations. The same rotations are applied to the rows
+        of :math:`L^{-1}X^T`.
+        """
+        nterms = self.num_terms()
+        vec = self.chol_factor[pos+1:, pos].copy()
+        self.chol_factor = np.delete(
+            np.delete(self.chol_factor, pos, axis=0), pos, axis=1)
+        self.basis_matrix[:, pos:nterms-1] = self.basis_matrix[:, pos+1:]
+        self.basis_matrix = self.basis_matrix[:, :nterms-1]
+        Z = self.chol_inv_basis_matrix_trans
+        if Z is not None:
+            row = Z[pos].copy()
+        L = self.chol_factor[pos:, pos:]
+        for kk in range(nterms-pos-1):
+            rr = np.hypot(L[kk, kk], vec[kk])
+            cc, ss = rr/L[kk, kk], vec[kk]/L[kk, kk]
+            L[kk, kk] = rr
+            L[kk+1:, kk] = (L[kk+1:, kk]+ss*vec[kk+1:])/cc
+            vec[kk+1:] = cc*vec[kk+1:]-ss*L[kk+1:, kk]
+            if Z is not None:
+                Z[pos+kk] = (Z[pos+kk+1]+ss*row)/cc
+                row = cc*row-ss*Z[pos+kk]
+        if Z is not None:
+            self.chol_inv_basis_matrix_trans = Z[:nterms-1]
+
+    def remove_columns(self, positions):
+        """
+        Remove the columns of the basis matrix at the specified positions.
+        """
+        positions = np.unique(positions)
+        for pos in positions[::-1]:
+            self._remove_column(pos)
+        self.rhs = np.delete(self.rhs, positions, axis=0)
+        self.column_ids = np.delete(self.column_ids, positions)
+
+    def set_columns(self, column_ids, get_columns):
+        """
+        Add and remove columns so the basis consists of the columns with
+        the specified ids. Columns already in the basis are not recomputed.
+        The columns are stored in the order they were added, which is
+        given by ``self.column_ids``.
+
+        Parameters
+        ----------
+        column_ids : np.ndarray (ncolumns)
+            The ids of the columns in the new basis
+
+        get_columns : callable
+            Function with signature
+
+            ``get_columns(column_ids) -> np.ndarray (nsamples, ncolumns)``
+
+            returning the columns with the ids requested
+        """
+        self.remove_columns(
+            np.where(~np.isin(self.column_ids, column_ids))[0])
+        new_ids = np.asarray(column_ids)[
+            ~np.isin(column_ids, self.column_ids)]
+        self.add_columns(get_columns(new_ids), new_ids)
+
+    def add_rows(self, rows, values):
+        """
+        Append training samples to the least squares problem.
+
+        Parameters
+        ----------
+        rows : np.ndarray (nnew_samples, nterms)
+            The new rows of the basis matrix
+
+        values : np.ndarray (nnew_samples, nqoi)
+            The values of the function at the new samples
+        """
+        assert rows.shape[1] == self.num_terms()
+        for row in rows:
+            self.chol_factor = update_cholesky_factorization_rank_one(
+                self.chol_factor, row)
+        self.rhs += rows.T.dot(values)
+        self.basis_matrix = np.vstack([self.basis_matrix, rows])
+        self._basis_matrix_buffer = None
+        self.train_vals = np.vstack([self.train_vals, values])
+        # every entry of L^{-1}X^T changes so compute it when next needed
+        self.chol_inv_basis_matrix_trans = None
+        self._chol_inv_basis_matrix_trans_buffer = None
+
+    def solve(self):
+        """
+        Return the coefficients of the columns ordered like
+        ``self.column_ids``.
+        """
+        return cholesky_solve_linear_system(self.chol_factor, self.rhs)
+
+    def cross_validate(self, fold_sample_indices):
+        """
+        Compute the k-fold cross validation error of the current basis
+        using the same closed form expressions as
+        :func:`pyapprox.utilities.leave_many_out_lsq_cross_validation`.
+
+        The cost is :math:`O(Nkn)` where :math:`n` is the number of samples
+        in each fold.
+
+        Returns
+        -------
+        cv_errors : np.ndarray (nfolds, nfold_samples, nqoi)
+            The cross validation residuals at the samples in each fold
+
+        cv_score : np.ndarray (nqoi)
+            The cross validation score
+
+        coef : np.ndarray (nterms, nqoi)
+            The coefficients of the solution using all the data
+        """
+        if self.chol_inv_basis_matrix_trans is None:
+            self.chol_inv_basis_matrix_trans = solve_triangular(
+                self.chol_factor, self.basis_matrix.T, lower=True)
+        coef = self.solve()
+        residuals = self.basis_matrix.dot(coef)-self.train_vals
+        cv_errors = []
+        cv_score = 0
+        for indices_kk in fold_sample_indices:
+            nvalidation_samples_kk = indices_kk.shape[0]
+            assert (self.num_samples()-nvalidation_samples_kk >=
+                    self.num_terms())
+            temp = self.chol_inv_basis_matrix_trans[:, indices_kk]
+            H_mat = np.eye(nvalidation_samples_kk)-temp.T.dot(temp)
+            cv_errors.append(np.linalg.solve(H_mat, residuals[indices_kk]))
+            cv_score += np.sum(cv_errors[-1]**2, axis=0)
+        return (np.asarray(cv_errors), np.sqrt(cv_score/self.num_samples()),
+                coef)
+
+
+def _fit_incremental_linear_least_squares(
+        lstsq_solvers, basis_matrix_cache, fold_sample_indices, indices):
+    """
+    Use the least squares solver with the regularization parameter that
+    has the best cross validation score to fit the basis defined by
+    indices. Each solver only factorizes the columns that have changed
+    since the last fit.
+    """
+    column_ids = basis_matrix_cache.get_column_ids(indices)
+    results = []
+    for lstsq in lstsq_solvers:
+        lstsq.set_columns(
+            column_ids, lambda ids: basis_matrix_cache.columns[:, ids])
+        results.append(lstsq.cross_validate(fold_sample_indices))
+    cv_scores = [r[1][0] for r in results]
+    ii_best_alpha = np.argmin(cv_scores)
+    lstsq = lstsq_solvers[ii_best_alpha]
+    positions = dict(zip(lstsq.column_ids, range(lstsq.num_terms())))
+    coef = results[ii_best_alpha][2][[positions[ii] for ii in column_ids]]
+    return coef, cv_scores[ii_best_alpha], lstsq.alpha
+
+
 @ignore_warnings(category=ConvergenceWarning)
 @ignore_warnings(category=LinAlgWarning)
 @ignore_warnings(category=RuntimeWarning)
@@ -678,10 +941,192 @@ def extract_cross_validation_score(linear_model):
         raise Exception('attribute mse_path_ not found')
 
 
+def _fit_linear_model_candidate(basis_matrix, train_vals, rng_state,
+                                candidate):
+    column_ids, solver_type, linear_solver_options = candidate
+    # use the same state (thus cross validation folds) for each candidate
+    np.random.set_state(rng_state)
+    try:
+        return fit_linear_model(
+            basis_matrix[:, column_ids], train_vals, solver_type,
+            **linear_solver_options)
+    except Exception as exception:
+        return exception
+
+
+def _get_process_pool(max_eval_concurrency):
+    # The numba threading layers used by the parallel kernels cannot be
+    # safely forked once they have been initialized so always spawn
+    import multiprocessing
+    return multiprocessing.get_context('spawn').Pool(max_eval_concurrency)
+
+
+def _share_array(array):
+    """
+    Copy an array to shared memory so it can be accessed by the processes
+    of a pool without being copied to each process.
+
+    Returns
+    -------
+    shm : :class:`multiprocessing.shared_memory.SharedMemory`
+        The shared memory, which must be closed and unlinked by the caller.
+        None if shared memory is not supported (Python<3.8) in which case
+        the array is sent to each process
+
+    shared_array : tuple
+        The arguments needed by :func:`_get_shared_array` to access the array
+    """
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        return None, (None, array)
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype)
+
+
+def _fit_linear_model_candidate_worker(shared_basis_matrix, train_vals,
+                                       rng_state, candidate):
+    if shared_basis_matrix[0] is None:
+        return _fit_linear_model_candidate(
+            shared_basis_matrix[1], train_vals, rng_state, candidate)
+
+    from multiprocessing import shared_memory
+    shm_name, shape, dtype = shared_basis_matrix
+    try:
+        shm = shared_memory.SharedMemory(name=shm_name)
+    except Exception as exception:
+        # the fits were cancelled and the memory released
+        return exception
+    try:
+        basis_matrix = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        column_ids, solver_type, linear_solver_options = candidate
+        # copy the columns so no view of the buffer outlives shm
+        basis_matrix = basis_matrix[:, column_ids]
+        return _fit_linear_model_candidate(
+            basis_matrix, train_vals, rng_state,
+            (np.arange(basis_matrix.shape[1]), solver_type,
+             linear_solver_options))
+    finally:
+        shm.close()
+
+
+def iterate_linear_model_fits(basis_matrix, train_vals, candidates,
+                              pool=None):
+    r"""
+    Fit a set of candidate linear models and compute their cross validation
+    scores, yielding the results in the order of the candidates.
+
+    Each candidate is defined by a subset of the columns of a common basis
+    matrix, e.g. the basis of a polynomial of a given degree and hyperbolic
+    cross strength, a solver and the options of that solver, e.g. the
+    regularization parameters. When a pool of processes is provided
+    the candidates are fit in parallel and the processes access
+    the basis matrix through shared memory, so it is not copied to each
+    process.
+
+    Every candidate is fit with the same random state, so the cross
+    validation folds, and thus the results, are the same as if the
+    candidates were fit one after another.
+
+    The fits that have not finished when the generator is closed are
+    abandoned. Terminating the pool, e.g. by exiting its context, cancels
+    them.
+
+    Parameters
+    ----------
+    basis_matrix : np.ndarray (nsamples, nbasis)
+        The basis matrix containing the columns of all candidates
+
+    train_vals : np.ndarray (nsamples, 1)
+        The values of the function at the training samples
+
+    candidates : list
+        List of tuples ``(column_ids, solver_type, linear_solver_options)``
+        defining each candidate. See :func:`fit_linear_model`
+
+    pool : :class:`multiprocessing.pool.Pool`
+        The pool used to fit the candidates. If None the candidates are fit
+        lazily in the current process
+
+    Yields
+    ------
+    result : tuple or Exception
+        The tuple ``(coef, cv_score, reg_param)`` returned by
+        :func:`fit_linear_model` for each candidate. If a candidate cannot
+        be fit, e.g. it has more columns than the folds have samples, the
+        exception raised is returned instead so the other results are not
+        lost
+    """
+    rng_state = np.random.get_state()
+    if pool is None:
+        try:
+            for candidate in candidates:
+                yield _fit_linear_model_candidate(
+                    basis_matrix, train_vals, rng_state, candidate)
+        finally:
+            np.random.set_state(rng_state)
+        return
+
+    shm, shared_basis_matrix = _share_array(basis_matrix)
+    try:
+        async_results = [
+            pool.apply_async(
+                _fit_linear_model_candidate_worker,
+                (shared_basis_matrix, train_vals, rng_state, candidate))
+            for candidate in candidates]
+        for async_result in async_results:
+            yield async_result.get()
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+        np.random.set_state(rng_state)
+
+
+def cross_validate_linear_models(basis_matrix, train_vals, candidates,
+                                 max_eval_concurrency=1):
+    r"""
+    Fit a set of candidate linear models and compute their cross validation
+    scores.
+
+    See :func:`iterate_linear_model_fits`.
+
+    Parameters
+    ----------
+    basis_matrix : np.ndarray (nsamples, nbasis)
+        The basis matrix containing the columns of all candidates
+
+    train_vals : np.ndarray (nsamples, 1)
+        The values of the function at the training samples
+
+    candidates : list
+        List of tuples ``(column_ids, solver_type, linear_solver_options)``
+        defining each candidate. See :func:`fit_linear_model`
+
+    max_eval_concurrency : integer
+        The maximum number of processes used to fit the candidates
+
+    Returns
+    -------
+    results : list
+        The result of each candidate yielded by
+        :func:`iterate_linear_model_fits`
+    """
+    if max_eval_concurrency <= 1 or len(candidates) <= 1:
+        return list(iterate_linear_model_fits(
+            basis_matrix, train_vals, candidates))
+
+    with _get_process_pool(min(max_eval_concurrency, len(candidates))) as pool:
+        return list(iterate_linear_model_fits(
+            basis_matrix, train_vals, candidates, pool))
+
+
 def cross_validate_pce_degree(
         pce, train_samples, train_vals, min_degree=1, max_degree=3,
         hcross_strength=1, solver_type='lasso', verbose=0,
-        linear_solver_options={'cv': 10}):
+        linear_solver_options={'cv': 10}, max_eval_concurrency=1):
     r"""
     Use cross validation to find the polynomial degree which best fits the data.
     A polynomial is constructed for each degree and the degree with the highest
@@ -721,6 +1166,15 @@ def cross_validate_pce_degree(
     verbose : integer
         Controls the amount of information printed to screen
 
+    max_eval_concurrency : integer
+        The number of degrees fit in parallel. Degrees are fit in batches
+        of this size until the cross validation score stops improving,
+        so the result does not depend on this value. The fits of the
+        remaining degrees in a batch are cancelled once the score stops
+        improving. When ``solver_type='lstsq'`` each of the regularization
+        parameters ``linear_solver_options['alphas']`` is also fit in
+        parallel.
+
     Returns
     -------
     result : :class:`pyapprox.approximate.ApproximateResult`
@@ -747,13 +1201,15 @@ def cross_validate_pce_degree(
     indices_dict = dict()
     unique_indices = []
     nqoi = train_vals.shape[1]
+    # the basis of each degree and QoI share columns
+    basis_matrix_cache = BasisMatrixCache(pce, train_samples)
     for ii in range(nqoi):
         if verbose > 1:
             print(f'Approximating QoI: {ii}')
         pce_ii, score_ii, degree_ii, reg_param_ii = _cross_validate_pce_degree(
             pce, train_samples, train_vals[:, ii:ii+1], min_degree,
             max_degree, hcross_strength, linear_solver_options,
-            solver_type, verbose)
+            solver_type, verbose, basis_matrix_cache, max_eval_concurrency)
         coefs.append(pce_ii.get_coefficients())
         scores.append(score_ii)
         indices.append(pce_ii.get_indices())
@@ -781,9 +1237,12 @@ def cross_validate_pce_degree(
 def _cross_validate_pce_degree(
         pce, train_samples, train_vals, min_degree=1, max_degree=3,
         hcross_strength=1, linear_solver_options={'cv': 10},
-        solver_type='lasso', verbose=0):
+        solver_type='lasso', verbose=0, basis_matrix_cache=None,
+        max_eval_concurrency=1):
     assert train_vals.shape[1] == 1
     num_samples = train_samples.shape[1]
+    if basis_matrix_cache is None:
+        basis_matrix_cache = BasisMatrixCache(pce, train_samples)
     if min_degree is None:
         min_degree = 2
     if max_degree is None:
@@ -796,34 +1255,71 @@ def _cross_validate_pce_degree(
     if verbose > 0:
         print("{:<8} {:<10} {:<18}".format('degree', 'num_terms', 'cv score',))
 
-    rng_state = np.random.get_state()
-    for degree in range(min_degree, max_degree+1):
-        indices = compute_hyperbolic_indices(
-            pce.num_vars(), degree, hcross_strength)
-        pce.set_indices(indices)
-        if ((pce.num_terms() > 100000) and
-            (100000-prev_num_terms < pce.num_terms()-100000)):
-            break
-
-        basis_matrix = pce.basis_matrix(train_samples)
-
-        # use the same state (thus cross validation folds) for each degree
-        np.random.set_state(rng_state)
-        coef, cv_score, reg_param = fit_linear_model(
-            basis_matrix, train_vals, solver_type, **linear_solver_options)
-        np.random.set_state(rng_state)
-        pce.set_coefficients(coef)
-        if verbose > 0:
-            print("{:<8} {:<10} {:<18} ".format(
-                degree, pce.num_terms(), cv_score))
-        if ((cv_score >= best_cv_score) and (degree-best_degree > 1)):
-            break
-        if (cv_score < best_cv_score):
-            best_cv_score = cv_score
-            best_coef = coef.copy()
-            best_degree = degree
-            best_reg_param = reg_param
-        prev_num_terms = pce.num_terms()
+    # the regularization parameters of least squares are cross validated
+    # independently so fit each one as a separate candidate
+    if (solver_type == 'lstsq' and
+            len(linear_solver_options.get('alphas', [])) > 1):
+        candidate_options = [
+            dict(linear_solver_options, alphas=[alpha])
+            for alpha in linear_solver_options['alphas']]
+    else:
+        candidate_options = [linear_solver_options]
+
+    pool = None
+    if max_eval_concurrency > 1:
+        pool = _get_process_pool(max_eval_concurrency)
+    try:
+        degree = min_degree
+        converged = False
+        while not converged and degree <= max_degree:
+            # fit a batch of degrees in parallel
+            degrees, num_terms, candidates = [], [], []
+            while len(degrees) < max(max_eval_concurrency, 1) and \
+                    degree <= max_degree:
+                indices = compute_hyperbolic_indices(
+                    pce.num_vars(), degree, hcross_strength)
+                if ((indices.shape[1] > 100000) and
+                        (100000-prev_num_terms < indices.shape[1]-100000)):
+                    converged = True
+                    break
+                degrees.append(degree)
+                num_terms.append(indices.shape[1])
+                column_ids = basis_matrix_cache.get_column_ids(indices)
+                candidates += [(column_ids, solver_type, options)
+                               for options in candidate_options]
+                prev_num_terms = indices.shape[1]
+                degree += 1
+
+            results = iterate_linear_model_fits(
+                basis_matrix_cache.columns[
+                    :, :basis_matrix_cache.num_columns()],
+                train_vals, candidates, pool)
+            for ii in range(len(degrees)):
+                degree_results = []
+                for jj in range(len(candidate_options)):
+                    result = next(results)
+                    if isinstance(result, Exception):
+                        raise result
+                    degree_results.append(result)
+                coef, cv_score, reg_param = degree_results[
+                    np.argmin([r[1] for r in degree_results])]
+                if verbose > 0:
+                    print("{:<8} {:<10} {:<18} ".format(
+                        degrees[ii], num_terms[ii], cv_score))
+                if ((cv_score >= best_cv_score) and
+                        (degrees[ii]-best_degree > 1)):
+                    converged = True
+                    break
+                if (cv_score < best_cv_score):
+                    best_cv_score = cv_score
+                    best_coef = coef.copy()
+                    best_degree = degrees[ii]
+                    best_reg_param = reg_param
+            results.close()
+    finally:
+        if pool is not None:
+            # cancel the fits of the degrees after the stopping point
+            pool.terminate()
 
     pce.set_indices(compute_hyperbolic_indices(
         pce.num_vars(), best_degree, hcross_strength))
@@ -903,6 +1399,7 @@ def expanding_basis_pce(pce, train_samples, train_vals, hcross_strength=1,
         - 'lars'
         - 'lasso_grad'
         - 'omp'
+        - 'lstsq'
 
     verbose : integer
         Controls the amount of information printed to screen
@@ -936,13 +1433,15 @@ def expanding_basis_pce(pce, train_samples, train_vals, hcross_strength=1,
     indices_dict = dict()
     unique_indices = []
     nqoi = train_vals.shape[1]
+    # the bases of successive iterations and of each QoI share columns
+    basis_matrix_cache = BasisMatrixCache(pce, train_samples)
     for ii in range(nqoi):
         if verbose > 1:
             print(f'Approximating QoI: {ii}')
         pce_ii, score_ii, reg_param_ii = _expanding_basis_pce(
             pce, train_samples, train_vals[:, ii:ii+1], hcross_strength,
             verbose, max_num_terms, solver_type, linear_solver_options,
-            restriction_tol)
+            restriction_tol, basis_matrix_cache)
         coefs.append(pce_ii.get_coefficients())
         scores.append(score_ii)
         indices.append(pce_ii.get_indices())
@@ -969,9 +1468,12 @@ def _expanding_basis_pce(pce, train_samples, train_vals, hcross_strength=1,
                              verbose=1, max_num_terms=None,
                              solver_type='lasso',
                              linear_solver_options={'cv': 10},
-                             restriction_tol=np.finfo(float).eps*2):
+                             restriction_tol=np.finfo(float).eps*2,
+                             basis_matrix_cache=None):
     assert train_vals.shape[1] == 1
     num_vars = pce.num_vars()
+    if basis_matrix_cache is None:
+        basis_matrix_cache = BasisMatrixCache(pce, train_samples)
     if max_num_terms is None:
         max_num_terms = 10*train_vals.shape[1]
     degree = 2
@@ -996,10 +1498,36 @@ def _expanding_basis_pce(pce, train_samples, train_vals, hcross_strength=1,
         print(msg)
         
     rng_state = np.random.get_state()
-    basis_matrix = pce.basis_matrix(train_samples)
-    best_coef, best_cv_score, best_reg_param = fit_linear_model(
-        basis_matrix, train_vals, solver_type, **linear_solver_options)
-    np.random.set_state(rng_state) 
+    if (solver_type == 'lstsq' and
+            linear_solver_options.get('cv', False) is not False):
+        # the basis only changes by a few columns each iteration so update
+        # factorizations of the least squares problems instead of
+        # refitting from scratch
+        cv = linear_solver_options['cv']
+        if cv is None:
+            # use the same default as LinearLeastSquaresCV
+            cv = 1
+        fold_sample_indices = \
+            _get_linear_least_squares_cv_fold_sample_indices(
+                train_samples.shape[1], cv,
+                linear_solver_options.get('random_folds', True))
+        np.random.set_state(rng_state)
+        lstsq_solvers = [
+            IncrementalLinearLeastSquares(train_vals, alpha)
+            for alpha in linear_solver_options.get('alphas', [0.])]
+        fit_basis = partial(
+            _fit_incremental_linear_least_squares, lstsq_solvers,
+            basis_matrix_cache, fold_sample_indices)
+    else:
+        def fit_basis(indices):
+            np.random.set_state(rng_state)
+            result = fit_linear_model(
+                basis_matrix_cache(indices), train_vals, solver_type,
+                **linear_solver_options)
+            np.random.set_state(rng_state)
+            return result
+
+    best_coef, best_cv_score, best_reg_param = fit_basis(pce.indices)
     pce.set_coefficients(best_coef)
     best_indices = pce.get_indices()
     if verbose > 0:
@@ -1031,11 +1559,7 @@ def _expanding_basis_pce(pce, train_samples, train_vals, hcross_strength=1,
             # -----------------#
             # Compute solution #
             # -----------------#
-            basis_matrix = pce.basis_matrix(train_samples)
-            np.random.set_state(rng_state) 
-            coef, cv_score, reg_param = fit_linear_model(
-                basis_matrix, train_vals, solver_type, **linear_solver_options)
-            np.random.set_state(rng_state) 
+            coef, cv_score, reg_param = fit_basis(pce.indices)
             pce.set_coefficients(coef)
 
             if verbose > 0:
@@ -1128,9 +1652,10 @@ def approximate_fixed_pce(pce, train_samples, train_vals, indices,
         indices = [indices.copy() for ii in range(nqoi)]
     unique_indices = []
     indices_dict = dict()
+    basis_matrix_cache = BasisMatrixCache(pce, train_samples)
     for ii in range(nqoi):
         pce.set_indices(indices[ii])
-        basis_matrix = pce.basis_matrix(train_samples)
+        basis_matrix = basis_matrix_cache(pce.indices)
         coef_ii, _, reg_param_ii = fit_linear_model(
             basis_matrix, train_vals[:, ii:ii+1], solver_type,
             **linear_solver_options[ii])
@@ -1180,8 +1705,11 @@ def approximate_gaussian_process(train_samples, train_vals, nu=np.inf,
     train_samples : np.ndarray (nvars, nsamples)
         The inputs of the function used to train the approximation
 
-    train_vals : np.ndarray (nvars, 1)
-        The values of the function at ``train_samples``
+    train_vals : np.ndarray (nsamples, nqoi)
+        The values of the function at ``train_samples``. When nqoi > 1
+        all QoI share the same kernel hyper-parameters, which are found by
+        maximizing the sum of the log marginal likelihoods of each QoI.
+        A single Cholesky factorization is then used to fit all QoI.
 
     kernel_nu : string
         The parameter :math:`\nu` of the Matern kernel. When :math:`\nu\to\inf`
@@ -1232,10 +1760,61 @@ def approximate_gaussian_process(train_samples, train_vals, nu=np.inf,
     return ApproximateResult({'approx': gp})
 
 
-from pyapprox.utilities import get_random_k_fold_sample_indices, \
-    leave_many_out_lsq_cross_validation
+def _approximate_fold(train_samples, train_vals, method, options,
+                      fold_sample_indices):
+    ntrain_samples = train_samples.shape[1]
+    K = np.ones(ntrain_samples, dtype=bool)
+    K[fold_sample_indices] = False
+    approx = approximate(
+        train_samples[:, K], train_vals[K, :], method, options).approx
+    residues = approx(train_samples[:, fold_sample_indices]) - \
+        train_vals[fold_sample_indices]
+    return approx, residues
+
+
 def cross_validate_approximation(
-        train_samples, train_vals, options, nfolds, method, random_folds=True):
+        train_samples, train_vals, options, nfolds, method, random_folds=True,
+        max_eval_concurrency=1):
+    """
+    Compute the k-fold cross validation error of an approximation.
+
+    Parameters
+    ----------
+    train_samples : np.ndarray (nvars, nsamples)
+        The inputs of the function used to train the approximation
+
+    train_vals : np.ndarray (nsamples, nqoi)
+        The values of the function at ``train_samples``
+
+    options : dictionary
+        The options passed to :func:`approximate`
+
+    nfolds : integer
+        The number of cross validation folds
+
+    method : string
+        The type of approximation. See :func:`approximate`
+
+    random_folds : boolean or string
+        True - assign samples to folds randomly
+        False - assign samples to folds in order
+        'sklearn' - use the folds of sklearn.model_selection.KFold
+
+    max_eval_concurrency : integer
+        The number of folds approximated in parallel
+
+    Returns
+    -------
+    approx_list : list
+        The approximation built on each fold
+
+    residues_list : list [np.ndarray (nfold_samples, nqoi)]
+        The residuals of each approximation at the samples left out of
+        the fold
+
+    cv_score : np.ndarray (nqoi)
+        The cross validation score
+    """
     ntrain_samples = train_samples.shape[1]
     if random_folds != 'sklearn':
         fold_sample_indices = get_random_k_fold_sample_indices(
@@ -1247,21 +1826,15 @@ def cross_validate_approximation(
         fold_sample_indices = [
             te for tr, te in sklearn_cv.split(train_vals, train_vals)]
 
-    approx_list = []
-    residues_list = []
-    cv_score = 0
-    for kk in range(len(fold_sample_indices)):
-        K = np.ones(ntrain_samples, dtype=bool)
-        K[fold_sample_indices[kk]] = False
-        train_samples_kk = train_samples[:, K]
-        train_vals_kk = train_vals[K, :]
-        test_samples_kk = train_samples[:, fold_sample_indices[kk]]
-        test_vals_kk = train_vals[fold_sample_indices[kk]]
-        approx_kk = approximate(
-            train_samples_kk, train_vals_kk, method, options).approx
-        residues = approx_kk(test_samples_kk) - test_vals_kk
-        approx_list.append(approx_kk)
-        residues_list.append(residues)
-        cv_score += np.sum(residues**2, axis=0)
+    func = partial(
+        _approximate_fold, train_samples, train_vals, method, options)
+    if max_eval_concurrency > 1:
+        with _get_process_pool(min(max_eval_concurrency, nfolds)) as pool:
+            results = pool.map(func, fold_sample_indices)
+    else:
+        results = [func(indices_kk) for indices_kk in fold_sample_indices]
+    approx_list = [r[0] for r in results]
+    residues_list = [r[1] for r in results]
+    cv_score = np.sum([np.sum(r**2, axis=0) for r in residues_list], axis=0)
     cv_score = np.sqrt(cv_score/ntrain_samples)
     return approx_list, residues_list, cv_score
@@ -102,6 +102,19 @@ class APC(PolynomialChaosExpansion):
             samples)
         return self.canonical_basis_matrix(canonical_samples,opts)
 
+    def value(self,samples):
+        # the rotated basis is not a product of univariate polynomials
+        basis_matrix = self.basis_matrix(samples)
+        return np.dot(basis_matrix,self.coefficients)
+
+    def gradients(self,samples):
+        # the rotated expansion is an expansion in the unrotated basis
+        coefficients = self.coefficients
+        if self.R_inv is not None:
+            coefficients = self.R_inv[
+                :self.num_terms(),:self.num_terms()].dot(coefficients)
+        return self._gradients(samples,coefficients)
+
     # def basis_matrix(self,samples):
     #     if self.compute_moment_matrix_function is not None:
     #         return np.dot(self.unrotated_basis_matrix(samples),self.R_inv)
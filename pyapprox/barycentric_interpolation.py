@@ -392,6 +392,49 @@ def univariate_lagrange_polynomial(abscissa, samples):
     return values
 
 
+@njit(cache=True)
+def barycentric_lagrange_basis_1d(abscissa, barycentric_weights, samples):
+    """
+    Evaluate the univariate Lagrange basis associated with a set of abscissa
+    using the second (true) form of the barycentric formula.
+
+    Parameters
+    ----------
+    abscissa : np.ndarray (nabscissa)
+        The interpolation nodes
+
+    barycentric_weights : np.ndarray (nabscissa)
+        The barycentric weights of the nodes
+
+    samples : np.ndarray (nsamples)
+        The samples at which to evaluate the basis
+
+    Returns
+    -------
+    values : np.ndarray (nsamples, nabscissa)
+        The values of each basis function at the samples
+    """
+    nabscissa = abscissa.shape[0]
+    nsamples = samples.shape[0]
+    values = np.zeros((nsamples, nabscissa), dtype=np.double)
+    for ii in range(nsamples):
+        node_idx = -1
+        denom = 0.
+        for jj in range(nabscissa):
+            diff = samples[ii]-abscissa[jj]
+            if diff == 0:
+                node_idx = jj
+                break
+            values[ii, jj] = barycentric_weights[jj]/diff
+            denom += values[ii, jj]
+        if node_idx >= 0:
+            values[ii, :] = 0.
+            values[ii, node_idx] = 1.
+        else:
+            values[ii, :] /= denom
+    return values
+
+
 def precompute_tensor_product_lagrange_polynomial_basis(
         samples, abscissa_1d, active_vars):
 
@@ -11,11 +11,12 @@ from pyapprox.utilities import cartesian_product, outer_product, \
     cholesky_solve_linear_system, update_cholesky_factorization
 from scipy.spatial.distance import cdist
 from functools import partial
-from scipy.linalg import solve_triangular
+from scipy.linalg import solve_triangular, cho_solve
 from pyapprox.low_discrepancy_sequences import transformed_halton_sequence
 from pyapprox.utilities import pivoted_cholesky_decomposition, \
     continue_pivoted_cholesky_decomposition
 from scipy.special import kv, gamma
+from numba import njit, prange
 from pyapprox.variables import IndependentMultivariateRandomVariable
 from pyapprox.variable_transformations import AffineRandomVariableTransformation
 from pyapprox.indexing import argsort_indices_leixographically
@@ -53,6 +54,60 @@ class GaussianProcess(GaussianProcessRegressor):
         canonical_train_samples = self.map_to_canonical_space(train_samples)
         return super().fit(canonical_train_samples.T, train_values)
 
+    def log_marginal_likelihood(self, theta=None, eval_gradient=False,
+                                clone_kernel=True):
+        r"""
+        Compute the log marginal likelihood summed over all QoI. The QoI
+        share the kernel hyper-parameters so one Cholesky factorization is
+        used for all QoI. Unlike the sklearn implementation the gradient
+        never forms a (nsamples, nsamples, nqoi) array, because
+
+        .. math:: \sum_{k=1}^{Q}\alpha_k\alpha_k^T = \alpha\alpha^T
+
+        so the cost of the gradient does not grow with the number of QoI.
+        """
+        if theta is None:
+            return super().log_marginal_likelihood(
+                theta, eval_gradient, clone_kernel)
+
+        if clone_kernel:
+            kernel = self.kernel_.clone_with_theta(theta)
+        else:
+            kernel = self.kernel_
+            kernel.theta = theta
+
+        if eval_gradient:
+            K, K_gradient = kernel(self.X_train_, eval_gradient=True)
+        else:
+            K = kernel(self.X_train_)
+
+        K[np.diag_indices_from(K)] += self.alpha
+        try:
+            L = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            return (-np.inf, np.zeros_like(theta)) \
+                if eval_gradient else -np.inf
+
+        y_train = self.y_train_
+        if y_train.ndim == 1:
+            y_train = y_train[:, np.newaxis]
+        nqoi = y_train.shape[1]
+
+        alpha = cho_solve((L, True), y_train)
+        log_likelihood = -0.5*np.sum(y_train*alpha)
+        log_likelihood -= nqoi*np.log(np.diag(L)).sum()
+        log_likelihood -= nqoi*K.shape[0]/2*np.log(2*np.pi)
+
+        if not eval_gradient:
+            return log_likelihood
+
+        tmp = alpha.dot(alpha.T)
+        tmp -= nqoi*cho_solve((L, True), np.eye(K.shape[0]))
+        # Compute "0.5 * trace(tmp.dot(K_gradient))" without
+        # constructing the full matrix tmp.dot(K_gradient)
+        log_likelihood_gradient = 0.5*np.einsum("ij,jil->l", tmp, K_gradient)
+        return log_likelihood, log_likelihood_gradient
+
     def __call__(self, samples, return_std=False, return_cov=False):
         r"""
         A light weight wrapper of sklearn GaussianProcessRegressor.predict
@@ -65,9 +120,28 @@ class GaussianProcess(GaussianProcessRegressor):
         samples : np.ndarray (nvars,nsamples)
             Samples at which to evaluate the GP. Sklearn requires the
             transpose of this matrix, i.e a matrix with size (nsamples,nvars)
+
+        Notes
+        -----
+        When the GP was trained with multiple QoI all QoI are predicted
+        with a single evaluation of the kernel. In this case the standard
+        deviation returned has shape (nsamples, nqoi)
         """
         canonical_samples = self.map_to_canonical_space(samples)
-        return self.predict(canonical_samples.T, return_std, return_cov)
+        if (not return_std or return_cov or self.y_train_.ndim == 1 or
+                self.y_train_.shape[1] == 1):
+            return self.predict(canonical_samples.T, return_std, return_cov)
+
+        K_trans = self.kernel_(canonical_samples.T, self.X_train_)
+        mean = K_trans.dot(self.alpha_)*self._y_train_std + \
+            self._y_train_mean
+        tmp = solve_triangular(self.L_, K_trans.T, lower=True)
+        variance = self.kernel_.diag(canonical_samples.T)-np.sum(
+            tmp*tmp, axis=0)
+        variance = np.maximum(variance, 0)
+        std = np.outer(np.sqrt(variance), np.ones(
+            self.y_train_.shape[1])*self._y_train_std)
+        return mean, std
 
     def predict_random_realization(self, samples, rand_noise=1,
                                    truncated_svd=None, keep_normalized=False):
@@ -283,6 +357,174 @@ class RandomGaussianProcessRealizations:
         return vals
 
 
+def sample_random_fourier_feature_frequencies(nvars, nfeatures, nu):
+    r"""
+    Sample the frequencies of random Fourier features from the spectral
+    density of a stationary kernel with unit length scales.
+
+    The spectral density of the squared exponential kernel is a standard
+    Gaussian and the spectral density of the Matern kernel with smoothness
+    :math:`\nu` is a multivariate Student-t distribution with :math:`2\nu`
+    degrees of freedom.
+
+    Parameters
+    ----------
+    nvars : integer
+        The number of variables
+
+    nfeatures : integer
+        The number of random features
+
+    nu : float
+        The smoothness parameter of the Matern kernel. Use np.inf for
+        the squared exponential kernel
+
+    Returns
+    -------
+    frequencies : np.ndarray (nvars, nfeatures)
+        The random frequencies
+    """
+    frequencies = np.random.normal(0, 1, (nvars, nfeatures))
+    if np.isfinite(nu):
+        scales = np.sqrt(2*nu/np.random.chisquare(2*nu, (1, nfeatures)))
+        frequencies *= scales
+    return frequencies
+
+
+class RandomFourierFeatureGaussianProcessRealizations:
+    r"""
+    Evaluate random realizations of the posterior of a Gaussian process
+    using pathwise conditioning.
+
+    A realization of the prior is approximated with random Fourier features
+
+    .. math:: f(x) = \sqrt{2\sigma^2/F}\sum_{j=1}^F \theta_j\cos(w_j^T
+              \Lambda^{-1}x+b_j)
+
+    and is then conditioned on the training data with Matheron's rule
+
+    .. math:: f^\star(x) = f(x) + K(x, X)(K(X, X)+\sigma_n^2 I)^{-1}
+              (y-f(X)-\epsilon), \qquad \epsilon\sim N(0, \sigma_n^2 I)
+
+    Unlike :class:`RandomGaussianProcessRealizations` no covariance matrix
+    between prediction samples is ever formed. The Cholesky factor computed
+    when fitting the Gaussian process is reused so the cost of evaluating
+    ``nrealizations`` at ``M`` samples is
+    :math:`O(M(F+N)\times\text{nrealizations})`.
+
+    As with :class:`RandomGaussianProcessRealizations` the last realization
+    is the mean of the Gaussian process.
+
+    Parameters
+    ----------
+    gp : :class:`pyapprox.gaussian_process.GaussianProcess`
+        A Gaussian process that has already been fit. Its kernel must be
+        the product of a ConstantKernel and a RBF or Matern kernel,
+        optionally plus a WhiteKernel.
+
+    nfeatures : integer
+        The number of random Fourier features used to approximate
+        realizations of the prior
+
+    max_nsamples_per_chunk : integer
+        The maximum number of samples at which the realizations are
+        evaluated at once. Limits the memory used by __call__.
+    """
+    def __init__(self, gp, nfeatures=1000, max_nsamples_per_chunk=10000):
+        self.gp = gp
+        self.nfeatures = nfeatures
+        self.max_nsamples_per_chunk = max_nsamples_per_chunk
+        kernel_types = [RBF, Matern]
+        self.kernel = extract_covariance_kernel(gp.kernel_, kernel_types)
+        if self.kernel is None:
+            msg = f'GP Kernel type: {type(gp.kernel_)} '
+            msg += 'Only RBF and Matern kernels supported'
+            raise Exception(msg)
+        self.nu = getattr(self.kernel, 'nu', np.inf)
+        self.length_scale = self.kernel.length_scale
+        self.kernel_var = 1
+        constant_kernel = extract_covariance_kernel(
+            gp.kernel_, [ConstantKernel])
+        if constant_kernel is not None:
+            self.kernel_var = constant_kernel.constant_value
+            self.kernel = constant_kernel*self.kernel
+        # alpha is either a scalar or the noise variance of each training
+        # sample
+        self.noise_var = np.asarray(gp.alpha, dtype=float)
+        if self.noise_var.ndim > 1:
+            raise Exception('gp.alpha must be a scalar or a 1D array')
+        white_kernel = extract_covariance_kernel(gp.kernel_, [WhiteKernel])
+        if white_kernel is not None:
+            self.noise_var += white_kernel.noise_level
+
+    def _prior_features(self, canonical_samples):
+        nvars = canonical_samples.shape[0]
+        length_scale = np.atleast_1d(self.length_scale)
+        if length_scale.shape[0] == 1:
+            length_scale = np.full(nvars, length_scale[0])
+        phase = self.frequencies.T.dot(
+            canonical_samples/length_scale[:, np.newaxis])
+        phase += self.offsets[:, np.newaxis]
+        return np.sqrt(2*self.kernel_var/self.nfeatures)*np.cos(phase).T
+
+    def fit(self, nrealizations, rand_noise=None):
+        """
+        Draw the random prior realizations and compute the coefficients
+        used to condition each of them on the training data.
+
+        Parameters
+        ----------
+        nrealizations : integer
+            The number of random realizations
+
+        rand_noise : np.ndarray (nfeatures+ntrain_samples, nrealizations)
+            Standard normal random variables. The first nfeatures rows
+            are the weights of the random features and the remaining rows
+            are used to perturb the training data with observation noise.
+            If None the values are generated internally.
+        """
+        canonical_train_samples = self.gp.X_train_.T
+        nvars, ntrain_samples = canonical_train_samples.shape
+        self.frequencies = sample_random_fourier_feature_frequencies(
+            nvars, self.nfeatures, self.nu)
+        self.offsets = np.random.uniform(0, 2*np.pi, self.nfeatures)
+        if rand_noise is None:
+            rand_noise = np.random.normal(
+                0, 1, (nrealizations, self.nfeatures+ntrain_samples)).T
+        assert rand_noise.shape == (
+            self.nfeatures+ntrain_samples, nrealizations)
+        self.weights = rand_noise[:self.nfeatures].copy()
+        if self.noise_var.ndim == 1 and \
+                self.noise_var.shape[0] != ntrain_samples:
+            raise Exception('gp.alpha must have an entry for each sample')
+        noise_std = np.sqrt(
+            np.broadcast_to(self.noise_var, (ntrain_samples,)))
+        noise = noise_std[:, np.newaxis]*rand_noise[self.nfeatures:]
+        # make last sample mean of gaussian process
+        self.weights[:, -1] = 0
+        noise[:, -1] = 0
+
+        prior_train_vals = self._prior_features(
+            canonical_train_samples).dot(self.weights)
+        # gp.alpha_ = K^{-1}y so only the correction for the prior
+        # realizations needs to be computed
+        self.alpha_ = self.gp.alpha_ - cho_solve(
+            (self.gp.L_, True), prior_train_vals+noise)
+
+    def __call__(self, samples):
+        canonical_samples = self.gp.map_to_canonical_space(samples)
+        nsamples = canonical_samples.shape[1]
+        vals = np.empty((nsamples, self.weights.shape[1]))
+        for lb in range(0, nsamples, self.max_nsamples_per_chunk):
+            ub = min(lb+self.max_nsamples_per_chunk, nsamples)
+            chunk = canonical_samples[:, lb:ub]
+            vals[lb:ub] = self._prior_features(chunk).dot(self.weights)
+            vals[lb:ub] += self.kernel(chunk.T, self.gp.X_train_).dot(
+                self.alpha_)
+        vals = self.gp._y_train_std*vals + self.gp._y_train_mean
+        return vals
+
+
 class AdaptiveGaussianProcess(GaussianProcess):
     def setup(self, func, sampler):
         self.func = func
@@ -1091,6 +1333,87 @@ def gaussian_process_pointwise_variance(kernel, pred_samples, train_samples,
     return variance
 
 
+@njit(cache=True, parallel=True)
+def _matern_kernel_and_gradient_wrt_samples(nu_index, samples1, samples2,
+                                            length_scale):
+    nvars, nsamples1 = samples1.shape
+    nsamples2 = samples2.shape[1]
+    K = np.empty((nsamples1, nsamples2), dtype=np.double)
+    grad = np.empty((nsamples1, nsamples2, nvars), dtype=np.double)
+    inv_lscale_sq = 1/length_scale**2
+    for ii in prange(nsamples1):
+        diffs = np.empty(nvars, dtype=np.double)
+        for jj in range(nsamples2):
+            dist_sq = 0.
+            for kk in range(nvars):
+                diffs[kk] = (samples1[kk, ii]-samples2[kk, jj])*inv_lscale_sq[kk]
+                dist_sq += diffs[kk]*(samples1[kk, ii]-samples2[kk, jj])
+            if nu_index == 0:
+                # nu = np.inf
+                K[ii, jj] = np.exp(-.5*dist_sq)
+                factor = -K[ii, jj]
+            elif nu_index == 1:
+                # nu = 3/2
+                tmp = np.sqrt(3*dist_sq)
+                exp_tmp = np.exp(-tmp)
+                K[ii, jj] = (1+tmp)*exp_tmp
+                factor = -3*exp_tmp
+            else:
+                # nu = 5/2
+                tmp = np.sqrt(5*dist_sq)
+                exp_tmp = np.exp(-tmp)
+                K[ii, jj] = (1+tmp+tmp**2/3)*exp_tmp
+                factor = -5/3*exp_tmp*(1+tmp)
+            for kk in range(nvars):
+                grad[ii, jj, kk] = factor*diffs[kk]
+    return K, grad
+
+
+def matern_kernel_and_gradient_wrt_samples(nu, samples1, samples2,
+                                           length_scale):
+    r"""
+    Evaluate the Matern kernel (with unit variance) and its gradient with
+    respect to the first set of samples for all pairs of samples in one
+    pass. The distances between samples are computed once and shared
+    between the kernel and its gradient.
+
+    Parameters
+    ----------
+    nu : float
+        The smoothness of the Matern kernel. Must be one of
+        [3/2, 5/2, np.inf]. The squared exponential kernel is obtained with
+        nu=np.inf
+
+    samples1 : np.ndarray (nvars, nsamples1)
+        The samples :math:`x`
+
+    samples2 : np.ndarray (nvars, nsamples2)
+        The samples :math:`y`
+
+    length_scale : float or np.ndarray (nvars)
+        The length scales `l` in each dimension
+
+    Returns
+    -------
+    K : np.ndarray (nsamples1, nsamples2)
+        The kernel :math:`K(x^{(i)}, y^{(j)})`
+
+    grad : np.ndarray (nsamples1, nsamples2, nvars)
+        The gradient :math:`\frac{\partial}{\partial x^{(i)}}K(x^{(i)},
+        y^{(j)})`
+    """
+    nu_indices = {np.inf: 0, 3/2: 1, 5/2: 2}
+    if nu not in nu_indices:
+        raise Exception(f'Matern gradient with nu={nu} not supported')
+    nvars = samples1.shape[0]
+    length_scale = np.atleast_1d(np.asarray(length_scale, dtype=float))
+    if length_scale.shape[0] == 1:
+        length_scale = np.full(nvars, length_scale[0])
+    return _matern_kernel_and_gradient_wrt_samples(
+        nu_indices[nu], np.asarray(samples1, dtype=float),
+        np.asarray(samples2, dtype=float), length_scale)
+
+
 def RBF_gradient_wrt_samples(query_sample, other_samples, length_scale):
     r"""
     Gradient of the squared exponential kernel
@@ -1134,13 +1457,8 @@ def RBF_gradient_wrt_samples(query_sample, other_samples, length_scale):
     grad : np.ndarray (nother_samples, nvars)
         The gradient of the kernel
     """
-    dists = cdist(query_sample.T/length_scale, other_samples.T/length_scale,
-                  metric='sqeuclidean')
-    K = np.exp(-.5 * dists)
-    grad = -K.T*(
-        np.tile(query_sample.T, (other_samples.shape[1], 1))-other_samples.T)/(
-            np.asarray(length_scale)**2)
-    return grad
+    return matern_kernel_and_gradient_wrt_samples(
+        np.inf, query_sample, other_samples, length_scale)[1][0]
 
 
 def RBF_integrated_posterior_variance_gradient_wrt_samples(
@@ -1152,39 +1470,33 @@ def RBF_integrated_posterior_variance_gradient_wrt_samples(
     length_scale = kernel.length_scale
     if np.isscalar(length_scale):
         length_scale = np.array([length_scale]*nvars)
-    K_train = kernel(train_samples.T)
+    K_train, K_train_grad = matern_kernel_and_gradient_wrt_samples(
+        np.inf, train_samples, train_samples, length_scale)
     # add small number to diagonal to ensure covariance matrix is
     # positive definite
-    ntrain_samples = train_samples.shape[1]
     K_train[np.arange(ntrain_samples), np.arange(ntrain_samples)] += nugget
     A_inv = np.linalg.inv(K_train)
     grad_P, P = integrate_grad_P(
         quad_x, quad_w, train_samples, length_scale)
     AinvPAinv = (A_inv.dot(P).dot(A_inv))
 
-    noptimized_train_samples = ntrain_samples-new_samples_index
-    jac = np.zeros((nvars*noptimized_train_samples))
-    cnt = 0
-    for kk in range(new_samples_index, ntrain_samples):
-        K_train_grad_all_train_points_kk = \
-            RBF_gradient_wrt_samples(
-                train_samples[:, kk:kk+1], train_samples, length_scale)
-        # Use the follow properties for tmp3 and tmp4
-        # Do sparse matrix element wise product
-        # 0 a 0   D00 D01 D02
-        # a b c x D10 D11 D12
-        # 0 c 0   D20 D21 D22
-        # =2*(a*D01 b*D11 + c*D21)-b*D11
-        #
-        # Trace [RCRP] = Trace[RPRC] for symmetric matrices
-        tmp3 = -2*np.sum(K_train_grad_all_train_points_kk.T*AinvPAinv[:, kk],
-                         axis=1)
-        tmp3 -= -K_train_grad_all_train_points_kk[kk, :]*AinvPAinv[kk, kk]
-        jac[cnt*nvars:(cnt+1)*nvars] = -tmp3
-        tmp4 = 2*np.sum(grad_P[kk*nvars:(kk+1)*nvars]*A_inv[:, kk], axis=1)
-        tmp4 -= grad_P[kk*nvars:(kk+1)*nvars, kk]*A_inv[kk, kk]
-        jac[cnt*nvars:(cnt+1)*nvars] -= tmp4
-        cnt += 1
+    # Use the follow properties for tmp3 and tmp4
+    # Do sparse matrix element wise product
+    # 0 a 0   D00 D01 D02
+    # a b c x D10 D11 D12
+    # 0 c 0   D20 D21 D22
+    # =2*(a*D01 b*D11 + c*D21)-b*D11
+    #
+    # Trace [RCRP] = Trace[RPRC] for symmetric matrices
+    # The diagonal of K_train_grad is zero so the correction for b*D11
+    # is not needed for tmp3
+    idx = np.arange(new_samples_index, ntrain_samples)
+    tmp3 = -2*np.einsum(
+        'kjd,jk->kd', K_train_grad[idx], AinvPAinv[:, idx])
+    grad_P = grad_P.reshape(ntrain_samples, nvars, ntrain_samples)[idx]
+    tmp4 = 2*np.einsum('kdj,jk->kd', grad_P, A_inv[:, idx])
+    tmp4 -= grad_P[np.arange(idx.shape[0]), :, idx]*A_inv[idx, idx][:, None]
+    jac = (-tmp3-tmp4).flatten()
     return jac
 
 
@@ -1250,56 +1562,26 @@ def RBF_posterior_variance_jacobian_wrt_samples(
     nvars, npred_samples = pred_samples.shape
     ntrain_samples = train_samples.shape[1]
     noptimized_train_samples = ntrain_samples-new_samples_index
-    k_pred_grad_all_train_points = np.zeros(
-        (noptimized_train_samples, npred_samples, nvars))
-    ii = 0
-    for jj in range(new_samples_index, ntrain_samples):
-        k_pred_grad_all_train_points[ii, :, :] = \
-            RBF_gradient_wrt_samples(
-            train_samples[:, jj:jj+1], pred_samples, length_scale)
-        ii += 1
-
-    K_train = kernel(train_samples.T)
+    k_pred, k_pred_grad = matern_kernel_and_gradient_wrt_samples(
+        np.inf, train_samples, pred_samples, length_scale)
+    K_train, K_train_grad = matern_kernel_and_gradient_wrt_samples(
+        np.inf, train_samples, train_samples, length_scale)
     # add small number to diagonal to ensure covariance matrix is
     # positive definite
-    ntrain_samples = train_samples.shape[1]
     K_train[np.arange(ntrain_samples), np.arange(ntrain_samples)] += nugget
 
     K_inv = np.linalg.inv(K_train)
-    k_pred = kernel(train_samples.T, pred_samples.T)
-    jac = np.zeros((npred_samples, nvars*noptimized_train_samples))
     tau = k_pred.T.dot(K_inv)
-    #K_train_grad = np.zeros((ntrain_samples, ntrain_samples))
-    ii = 0
-    for jj in range(new_samples_index, ntrain_samples):
-        K_train_grad_all_train_points_jj = \
-            RBF_gradient_wrt_samples(
-                train_samples[:, jj:jj+1], train_samples, length_scale)
-        jac[:, ii*nvars:(ii+1)*nvars] += \
-            2*tau[:, jj:jj+1]*k_pred_grad_all_train_points[ii, :, :]
-        tmp1 = K_train_grad_all_train_points_jj.T[:, np.newaxis, :] *\
-            np.tile(tau[:, jj:jj+1], (2, 1, ntrain_samples))
-        tmp1[:, :, jj] = K_train_grad_all_train_points_jj.T.dot(tau.T)
-        tmp2 = np.sum(tau*tmp1, axis=(2))
-        jac[:, ii*nvars:(ii+1)*nvars] -= tmp2.T  # check if -= is needed over =
-        # leave the following for loop to show how sparsity is taken advantage
-        # of above. Above is abstract and hard to see what is being done
-        # for kk in range(nvars):
-        #     # K_train_grad[jj, :] = K_train_grad_all_train_points_jj[:, kk]
-        #     # K_train_grad[:, jj] = K_train_grad[jj, :]
-        #     # The following takes advantage of sparsity of
-        #     # tmp = tau.dot(K_train_grad)
-        #     # Reset to zero
-        #     # K_train_grad[jj, :] = 0
-        #     # K_train_grad[:, jj] = 0
-        #     tmp = K_train_grad_all_train_points_jj[:, kk:kk+1].T *\
-        #         np.tile(tau[:, jj:jj+1], (1, ntrain_samples))
-        #     tmp[:, jj] = tau.dot(K_train_grad_all_train_points_jj[:, kk])
-        #     assert np.allclose(tmp[:,jj], tmp1[kk,:,jj])
-        #     assert np.allclose(tmp,tmp1[kk,:,:])
-        #     jac[:, ii*nvars+kk] -= np.sum(tmp*tau, axis=1)
-        ii += 1
-    jac *= -1
+    idx = np.arange(new_samples_index, ntrain_samples)
+    # The derivative of K_train with respect to the jth training sample
+    # is only nonzero in the jth row and column so
+    # tau.dot(dK_train).dot(tau.T) reduces to
+    # 2*tau[:, j]*tau.dot(K_train_grad[j]). The diagonal of K_train_grad
+    # is zero
+    tmp = np.einsum('jmd,pm->pjd', K_train_grad[idx], tau)
+    jac = 2*tau[:, idx, np.newaxis]*(
+        k_pred_grad[idx].transpose(1, 0, 2)-tmp)
+    jac = -jac.reshape(npred_samples, nvars*noptimized_train_samples)
     return jac
 
 
@@ -1351,16 +1633,14 @@ def integrate_grad_P(xx, ww, xtr, lscale):
         P[nn] = K[-1].T.dot(ww_1d[:, np.newaxis]*K[-1])
         diffs.append(-(xtr[nn:nn+1, :].T-xx_1d)/lscale_nn**2)
 
-    # TODO replace loop over train samples with numpy operations
-    for ii in range(ntrain_samples):
-        for nn in range(nvars):
-            diff = diffs[nn][ii]
-            grad_P[nvars*ii+nn, :] = ww_1d.dot(
-                (diff*K[nn][:, ii])[:, np.newaxis]*K[nn])
-            grad_P[nvars*ii+nn, :] *= np.prod(P[:nn, ii, :], axis=0)
-            grad_P[nvars*ii+nn, :] *= np.prod(P[nn+1:, ii, :], axis=0)
-            grad_P[nvars*ii+nn, ii] *= 2
-    return grad_P, np.prod(P, axis=0)
+    grad_P = grad_P.reshape(ntrain_samples, nvars, ntrain_samples)
+    for nn in range(nvars):
+        grad_P[:, nn, :] = (diffs[nn]*K[nn].T*ww[nn]).dot(K[nn])
+        grad_P[:, nn, :] *= np.prod(P[:nn], axis=0)
+        grad_P[:, nn, :] *= np.prod(P[nn+1:], axis=0)
+    grad_P[np.arange(ntrain_samples), :, np.arange(ntrain_samples)] *= 2
+    return grad_P.reshape(nvars*ntrain_samples, ntrain_samples), \
+        np.prod(P, axis=0)
 
 
 class IVARSampler(object):
@@ -2016,32 +2296,8 @@ class GreedyVarianceOfMeanSampler(object):
 
 
 def matern_gradient_wrt_samples(nu, query_sample, other_samples, length_scale):
-    length_scale = np.asarray(length_scale)
-    dists = cdist(query_sample.T/length_scale, other_samples.T/length_scale,
-                  metric='euclidean')
-    if nu == 3/2:
-        tmp1 = np.sqrt(3)*dists
-        tmp2 = (np.tile(
-            query_sample.T, (other_samples.shape[1], 1))-other_samples.T)/(
-                length_scale**2)
-        K = np.exp(-tmp1)
-        grad = -3*K.T*tmp2
-    elif nu == 5/2:
-        tmp1 = np.sqrt(5)*dists
-        K = np.exp(-tmp1)
-        tmp2 = (np.tile(
-            query_sample.T, (other_samples.shape[1], 1))-other_samples.T)/(
-                length_scale**2)
-        grad = -5/3*K.T*tmp2*(np.sqrt(5)*dists+1)
-    elif nu == np.inf:
-        tmp2 = (np.tile(
-            query_sample.T, (other_samples.shape[1], 1))-other_samples.T)/(
-                length_scale**2)
-        K = np.exp(-.5 * dists**2)
-        grad = -K.T*tmp2
-    else:
-        raise Exception(f'Matern gradient with nu={nu} not supported')
-    return grad
+    return matern_kernel_and_gradient_wrt_samples(
+        nu, query_sample, other_samples, length_scale)[1][0]
 
 
 class GreedyIntegratedVarianceSampler(GreedyVarianceOfMeanSampler):
@@ -2467,7 +2723,19 @@ def _compute_expected_sobol_indices(
 
 def generate_gp_realizations(gp, ngp_realizations, ninterpolation_samples, 
                              nvalidation_samples, ncandidate_samples,
-                             variable, use_cholesky=True, alpha=0):
+                             variable, use_cholesky=True, alpha=0,
+                             nrandom_features=None):
+    """
+    If nrandom_features is not None then realizations are evaluated with
+    pathwise conditioning of random Fourier features and the arguments
+    related to interpolating realizations are ignored.
+    """
+    if nrandom_features is not None:
+        gp_realizations = RandomFourierFeatureGaussianProcessRealizations(
+            gp, nrandom_features)
+        gp_realizations.fit(ngp_realizations)
+        return gp_realizations
+
     rand_noise = np.random.normal(
         0, 1, (ngp_realizations, ninterpolation_samples+nvalidation_samples)).T
     gp_realizations = RandomGaussianProcessRealizations(gp, use_cholesky,
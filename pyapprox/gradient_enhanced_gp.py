@@ -103,105 +103,221 @@ def kernel_fd(XX1,XX2,length_scale,var_num):
     
     return K
 
-def function_values_kernel(X1,X2,length_scale,X3=None):
+def derivative_kernel_blocks(XX1,XX2,length_scale,active_vars=None):
+    r"""
+    Evaluate the Gaussian kernel and its first and mixed second derivatives
+    for all pairs of samples and all directions in one pass, reusing the
+    differences between samples for all blocks.
+
+    Parameters
+    ----------
+    XX1 : np.ndarray (nsamples_x,nvars)
+        Samples x
+
+    XX2 : np.ndarray (nsamples_y,nvars)
+        Samples x^*
+
+    length_scale : double
+        w = 1/length_scale**2
+
+    active_vars : np.ndarray (nactive_vars)
+        The directions i,j of the derivatives. If None all directions
+        are used
+
+    Returns
+    -------
+    K_ff : np.ndarray (nsamples_x,nsamples_y)
+        The kernel K(x,x^*)
+
+    K_fd : np.ndarray (nsamples_x,nsamples_y,nactive_vars)
+        The derivatives d/dx_i K(x,x^*), i.e. kernel_fd
+
+    K_dd : np.ndarray (nsamples_x,nsamples_y,nactive_vars,nactive_vars)
+        The derivatives d/dx_i d/dx_j K(x,x^*), i.e. kernel_dd
+    """
+    nvars = XX1.shape[1]
+    length_scale = np.atleast_1d(length_scale)
+    if length_scale.shape[0]==1:
+        length_scale = np.full(nvars,length_scale[0])
+    if active_vars is None:
+        active_vars = np.arange(nvars)
+    w = 1./length_scale[active_vars]**2
+    K_ff = kernel_ff(XX1,XX2,length_scale)
+    wdiffs = w*(XX1[:,np.newaxis,active_vars]-XX2[np.newaxis,:,active_vars])
+    K_fd = -wdiffs*K_ff[:,:,np.newaxis]
+    K_dd = -wdiffs[:,:,:,np.newaxis]*wdiffs[:,:,np.newaxis,:]
+    idx = np.arange(w.shape[0])
+    K_dd[:,:,idx,idx] += w
+    K_dd *= K_ff[:,:,np.newaxis,np.newaxis]
+    return K_ff,K_fd,K_dd
+
+def _active_vars(num_vars,active_vars):
+    if active_vars is None:
+        return np.arange(num_vars)
+    return np.asarray(active_vars)
+
+def function_values_kernel(X1,X2,length_scale,X3=None,active_vars=None):
     r"""
     Evaluate kernel used to compute function values from GP
     """
     num_vars = X1.shape[1]
-    assert X2.shape[0]%num_vars==0
-    num_deriv_samples = X2.shape[0]//num_vars
+    active_vars = _active_vars(num_vars,active_vars)
+    num_active_vars = active_vars.shape[0]
+    assert X2.shape[0]%num_active_vars==0
+    num_deriv_samples = X2.shape[0]//num_active_vars
     
     if X3 is None:
         XA=X1; XB=X1; XC=X2
     else:
         XA=X3; XB=X1; XC=X2
-    
-    K=kernel_ff(XA,XB,length_scale)
-    for ii in range(num_vars):
-        idx1 = num_deriv_samples*ii
-        idx2 = num_deriv_samples*(ii+1)
-        K = np.hstack((K,-kernel_fd(XA,XC[idx1:idx2,:],length_scale,ii)))
+
+    # indexing assumes derivatives in each direction are at the same
+    # set of points in XC
+    K_fd = derivative_kernel_blocks(
+        XA,XC[:num_deriv_samples],length_scale,active_vars)[1]
+    K_fd = K_fd.transpose(0,2,1).reshape(
+        XA.shape[0],num_active_vars*num_deriv_samples)
+    K=np.hstack((kernel_ff(XA,XB,length_scale),-K_fd))
     return K
 
-def combine_kernel_dd(X1,X2,length_scale,X3=None):
-    num_vars = X1.shape[1]
-    assert X1.shape[0]%num_vars==0
+def _stacked_derivs_kernel(XA,XB,length_scale,active_vars,return_fd,
+                           return_dd):
+    r"""
+    Rows are the derivatives in each active direction at the samples
+    in the corresponding block of XA. Columns are the values at XB
+    (return_fd) and the derivatives at the first block of XB (return_dd).
+
+    The kernel and the differences between samples are computed once for
+    all blocks of XA and the block of every direction is formed from them
+    in one broadcasted pass.
+    """
+    num_vars = XA.shape[1]
+    active_vars = _active_vars(num_vars,active_vars)
+    num_active_vars = active_vars.shape[0]
+    assert XA.shape[0]%num_active_vars==0
+    num_XA_deriv = XA.shape[0]//num_active_vars
+    num_XB_deriv = XB.shape[0]//num_active_vars
+    length_scale = np.atleast_1d(length_scale)
+    if length_scale.shape[0]==1:
+        length_scale = np.full(num_vars,length_scale[0])
+    w = 1./length_scale[active_vars]**2
+    # XA_active[ii] are the active coordinates of the ii-th block of XA
+    XA_active = XA[:,active_vars].reshape(
+        num_active_vars,num_XA_deriv,num_active_vars)
+    idx = np.arange(num_active_vars)
+    K_fd, K_dd = None, None
+    if return_fd:
+        K = kernel_ff(XA,XB,length_scale).reshape(
+            num_active_vars,num_XA_deriv,XB.shape[0])
+        # the difference in direction ii between block ii of XA and XB
+        diffs = XA_active[idx,:,idx][:,:,np.newaxis]-\
+            XB[:,active_vars].T[:,np.newaxis,:]
+        K_fd = (-w[:,np.newaxis,np.newaxis]*diffs*K).reshape(
+            XA.shape[0],XB.shape[0])
+    if return_dd:
+        # indexing assumes derivatives in each direction are at the same
+        # set of points in XB
+        XB_deriv = XB[:num_XB_deriv]
+        K = kernel_ff(XA,XB_deriv,length_scale).reshape(
+            num_active_vars,num_XA_deriv,num_XB_deriv)
+        wdiffs = w*(XA_active[:,:,np.newaxis,:]-
+                    XB_deriv[:,active_vars][np.newaxis,np.newaxis,:,:])
+        # K_dd[ii,:,:,jj] = d/dx_i d/dx_j K for block ii of XA
+        K_dd = -wdiffs[idx,:,:,idx][:,:,:,np.newaxis]*wdiffs
+        K_dd[idx,:,:,idx] += w[:,np.newaxis,np.newaxis]
+        K_dd *= K[:,:,:,np.newaxis]
+        K_dd = K_dd.transpose(0,1,3,2).reshape(
+            XA.shape[0],num_active_vars*num_XB_deriv)
+    return K_fd,K_dd
+
+def combine_kernel_dd(X1,X2,length_scale,X3=None,active_vars=None):
     if X3 is None:
-        XA=X1; XB=X1; XC=X2
+        XA=X1; XB=X1
     else:
-        XA=X3; XB=X1; XC=X2
-    num_XA_deriv = XA.shape[0]//num_vars
-    num_XB_deriv = XB.shape[0]//num_vars
-        
-    for ii in range(num_vars):
-        #indexing assumes derivatives in each direction are at the same
-        #set of points in X<letter>
-        idxA1 = num_XA_deriv*ii; idxA2 = num_XA_deriv*(ii+1)
-        idxB1 = num_XB_deriv*ii; idxB2 = num_XB_deriv*(ii+1)
-        K_dd_ii = kernel_dd(XA[idxA1:idxA2],XB[idxB1:idxB2],length_scale,ii,0)
-        for jj in range(1,num_vars):
-            K_dd_ii = np.hstack(
-                (K_dd_ii,kernel_dd(XA[idxA1:idxA2],XB[idxB1:idxB2],
-                                   length_scale,ii,jj)))
-        if ii==0:
-            K_dd = K_dd_ii
-        else:
-            K_dd = np.vstack((K_dd,K_dd_ii))
-
-    return K_dd
+        XA=X3; XB=X1
+    return _stacked_derivs_kernel(
+        XA,XB,length_scale,active_vars,False,True)[1]
 
-def combine_kernel_fd(X1,X2,length_scale,X3=None):
+def combine_kernel_fd(X1,X2,length_scale,X3=None,active_vars=None):
     if X3 is None:
         XA=X1; XC=X2
     else:
         XA=X3; XC=X2
-    num_vars = XA.shape[1]
-    assert XA.shape[0]%num_vars==0
-    num_XA_deriv = XA.shape[0]//num_vars
-    
-    idxA1 = 0; idxA2 = num_XA_deriv
-    K_fd = kernel_fd(XA[idxA1:idxA2],XC,length_scale,0)
-    for ii in range(1,num_vars):
-        idxA1 = num_XA_deriv*ii; idxA2 = num_XA_deriv*(ii+1)
-        K_fd=np.vstack((K_fd,kernel_fd(XA[idxA1:idxA2],XC,length_scale,ii)))
-
-    return K_fd
+    return _stacked_derivs_kernel(
+        XA,XC,length_scale,active_vars,True,False)[0]
 
         
-def gradients_kernel(X1,X2,length_scale,X3=None):
+def gradients_kernel(X1,X2,length_scale,X3=None,active_vars=None):
     r"""
     Evaluate kernel used to compute function values from GP
     """
-    K_dd = combine_kernel_dd(X1,X2,length_scale,X3)
-    K_fd = combine_kernel_fd(X1,X2,length_scale,X3)
+    if X3 is None:
+        XA=X1
+    else:
+        XA=X3
+    K_fd = _stacked_derivs_kernel(
+        XA,X2,length_scale,active_vars,True,False)[0]
+    K_dd = _stacked_derivs_kernel(
+        XA,X1,length_scale,active_vars,False,True)[1]
     K = np.hstack((K_fd,K_dd))
     return K
 
-def full_kernel(XX1,length_scale,n_XX_func,XX2=None,return_code='full'):
+def _full_training_kernel(XX1,length_scale,n_XX_func,active_vars):
+    r"""
+    Assemble the joint covariance of the training values and derivatives
+    from a single evaluation of the derivative kernel blocks.
+    """
+    num_vars = XX1.shape[1]
+    active_vars = _active_vars(num_vars,active_vars)
+    num_active_vars = active_vars.shape[0]
+    XX_func  = XX1[:n_XX_func]
+    num_deriv_samples = (XX1.shape[0]-n_XX_func)//num_active_vars
+    # derivatives in each direction are at the same set of points
+    XX_deriv = XX1[n_XX_func:n_XX_func+num_deriv_samples]
+    nderivs = num_active_vars*num_deriv_samples
+
+    K = np.empty((n_XX_func+nderivs,n_XX_func+nderivs))
+    K[:n_XX_func,:n_XX_func] = kernel_ff(XX_func,XX_func,length_scale)
+    K_fd = derivative_kernel_blocks(
+        XX_func,XX_deriv,length_scale,active_vars)[1]
+    K[:n_XX_func,n_XX_func:] = -K_fd.transpose(0,2,1).reshape(
+        n_XX_func,nderivs)
+    K[n_XX_func:,:n_XX_func] = K[:n_XX_func,n_XX_func:].T
+    K_dd = derivative_kernel_blocks(
+        XX_deriv,XX_deriv,length_scale,active_vars)[2]
+    K[n_XX_func:,n_XX_func:] = K_dd.transpose(2,0,3,1).reshape(
+        nderivs,nderivs)
+    return K
+
+def full_kernel(XX1,length_scale,n_XX_func,XX2=None,return_code='full',
+                active_vars=None):
     r"""
     return_code : string
         'full'   return full covariance matrix
         'values' return values covariance matrix
         'derivs' return derivs covariance matrix
+
+    active_vars : np.ndarray (nactive_vars)
+        The directions of the derivatives in the training data. If None
+        derivatives in all directions are used
     """
     if XX2 is None:
         if return_code=='values':
             return kernel_ff(XX1,XX1,length_scale)
         elif return_code=='derivs':
-            return combine_kernel_dd(XX1,XX1,length_scale)
-        XX_func  = XX1[:n_XX_func] # samples at which function values are known
-        XX_deriv = XX1[n_XX_func:] # samples at which derivatives are known
-        K1 = function_values_kernel(XX_func,XX_deriv,length_scale)
-        K2 = gradients_kernel(XX_deriv,XX_func,length_scale)
-        K = np.vstack((K1,K2))
+            return combine_kernel_dd(
+                XX1,XX1,length_scale,active_vars=active_vars)
+        return _full_training_kernel(XX1,length_scale,n_XX_func,active_vars)
     else:
         XX_func  = XX2[:n_XX_func] # samples at which function values are known
         XX_deriv = XX2[n_XX_func:] # samples at which derivatives are known
         if return_code!='derivs':
-            K1 = function_values_kernel(XX_func,XX_deriv,length_scale,XX1)
+            K1 = function_values_kernel(
+                XX_func,XX_deriv,length_scale,XX1,active_vars)
             if return_code=='values':
                 return K1
-        K2 = gradients_kernel(XX_deriv,XX_func,length_scale,XX1)
+        K2 = gradients_kernel(
+            XX_deriv,XX_func,length_scale,XX1,active_vars)
         if return_code=='derivs':
             return K2
         K = np.vstack((K1,K2))
@@ -209,17 +325,22 @@ def full_kernel(XX1,length_scale,n_XX_func,XX2=None,return_code='full'):
 
 class DerivGPKernel(StationaryKernelMixin, NormalizedKernelMixin, Kernel):
     def __init__(self, n_XX_func, length_scale=[1.0],
-                 length_scale_bounds=(1e-5, 1e5)):
+                 length_scale_bounds=(1e-5, 1e5), active_derivs=None):
         r"""
         Parameters
         ----------
         n_XX_func : integer
             The number of training points at which function values are known
+
+        active_derivs : np.ndarray (nactive_derivs)
+            The directions of the derivatives used to train the GP. If None
+            the derivatives in all directions are used
         """
         self.length_scale = length_scale
         self.length_scale = np.atleast_1d(self.length_scale)
         self.length_scale_bounds = length_scale_bounds
         self.n_XX_func=n_XX_func
+        self.active_derivs=active_derivs
         self.return_code='full'
 
     def __call__(self, XX1, XX2=None, eval_gradient=False):
@@ -252,14 +373,14 @@ class DerivGPKernel(StationaryKernelMixin, NormalizedKernelMixin, Kernel):
         length_scale = _check_length_scale(XX1, self.length_scale)
         if XX2 is None:
             K = full_kernel(XX1,length_scale,self.n_XX_func,
-                            return_code=self.return_code)
+                            return_code=self.return_code,
+                            active_vars=self.active_derivs)
         else:
             if eval_gradient:
                 raise ValueError(
                     "Gradient can only be evaluated when XX2 is None.")
             K = full_kernel(XX1,length_scale,self.n_XX_func,XX2,
-                            self.return_code)
-        print(K.shape,'KK')
+                            self.return_code,self.active_derivs)
         if not eval_gradient:
             return K
             
@@ -270,7 +391,8 @@ class DerivGPKernel(StationaryKernelMixin, NormalizedKernelMixin, Kernel):
             # approximate gradient numerically
             def f(gamma):  # helper function
                 return full_kernel(XX1,gamma,self.n_XX_func,
-                                   return_code=self.return_code)
+                                   return_code=self.return_code,
+                                   active_vars=self.active_derivs)
             length_scale = np.atleast_1d(length_scale)
             length_scale_gradient = _approx_fprime(length_scale, f, 1e-8)
         return K, length_scale_gradient
@@ -352,9 +474,10 @@ class GradientEnhancedGP(GaussianProcessRegressor):
                  normalize_y, copy_X_train, random_state)
         self.num_training_values=0
         
-    def stack_XX_derivs(self,XX_derivs):
-        num_vars = XX_derivs.shape[1]
-        return np.tile(XX_derivs,(num_vars,1))
+    def stack_XX_derivs(self,XX_derivs,num_derivs=None):
+        if num_derivs is None:
+            num_derivs = XX_derivs.shape[1]
+        return np.tile(XX_derivs,(num_derivs,1))
 
     def fit(self,XX_train_values,YY_train_values,
             XX_train_derivs,YY_train_derivs):
@@ -368,15 +491,19 @@ class GradientEnhancedGP(GaussianProcessRegressor):
         YY_train_values : np.ndarray (num_XX_train_values,1)
             The function values at each point in XX_train_derivs
 
-        YY_train_derivs : np.ndarray (num_XX_train_derivs,num_vars)
-            The derivatives at each point in XX_train_derivs
+        YY_train_derivs : np.ndarray (num_XX_train_derivs,num_derivs)
+            The derivatives at each point in XX_train_derivs. If the
+            kernel has active_derivs, num_derivs=len(active_derivs) and the
+            columns are the derivatives in those directions. Otherwise 
+            num_derivs=num_vars
         """
         assert YY_train_values.shape[0]==XX_train_values.shape[0]
         assert YY_train_derivs.shape[0]==XX_train_derivs.shape[0]
-        num_vars = YY_train_derivs.shape[1]
+        num_derivs = YY_train_derivs.shape[1]
 
         XX_train = np.vstack(
-            (XX_train_values,self.stack_XX_derivs(XX_train_derivs)))
+            (XX_train_values,self.stack_XX_derivs(
+                XX_train_derivs,num_derivs)))
         self.num_training_values = XX_train_values.shape[0]
 
         YY_train = np.hstack(
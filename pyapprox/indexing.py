@@ -1,7 +1,8 @@
 #from scipy.special import comb as scipy_comb
 from scipy.special.cython_special import binom
 import numpy as np
-from pyapprox.utilities import cartesian_product, hash_array
+from pyapprox.utilities import cartesian_product, hash_array, \
+    hash_array_columns
 from numba import njit
 
 
@@ -275,17 +276,25 @@ def argsort_indices_lexiographically_by_row(indices):
     return np.asarray(sorted_idx)
 
 
+def argsort_indices_lexiographically(indices):
+    r"""
+    Return the permutation that sorts the indices by level then
+    lexiographically. See :func:`sort_indices_lexiographically`
+    """
+    index_tuple = (indices[0, :],)
+    for ii in range(1, indices.shape[0]):
+        index_tuple = index_tuple+(indices[ii, :],)
+    index_tuple = index_tuple+(indices.sum(axis=0),)
+    return np.lexsort(index_tuple)
+
+
 def sort_indices_lexiographically(indices):
     r""" 
     Sort by level then lexiographically
     The last key in the sequence is used for the primary sort order,
     the second-to-last key for the secondary sort order, and so on
     """
-    index_tuple = (indices[0, :],)
-    for ii in range(1, indices.shape[0]):
-        index_tuple = index_tuple+(indices[ii, :],)
-    index_tuple = index_tuple+(indices.sum(axis=0),)
-    I = np.lexsort(index_tuple)
+    I = argsort_indices_lexiographically(indices)
     return indices[:, I]
 
 
@@ -334,6 +343,143 @@ def get_forward_neighbor(subspace_index, var_num):
     return neighbor
 
 
+def get_forward_neighbors(subspace_index):
+    """
+    Return the forward neighbors of an index in every direction.
+
+    Parameters
+    ----------
+    subspace_index : np.ndarray (num_vars)
+        The index
+
+    Returns
+    -------
+    neighbors : np.ndarray (num_vars, num_vars)
+        The forward neighbors. The ith column is the neighbor in the ith
+        direction
+    """
+    neighbors = np.tile(subspace_index[:, np.newaxis],
+                        (1, subspace_index.shape[0]))
+    neighbors[np.diag_indices(subspace_index.shape[0])] += 1
+    return neighbors
+
+
+def get_backward_neighbors(indices):
+    """
+    Return the backward neighbors of a set of indices in every direction
+    in which the neighbors exist.
+
+    Parameters
+    ----------
+    indices : np.ndarray (num_vars, num_indices)
+        The indices
+
+    Returns
+    -------
+    neighbors : np.ndarray (num_vars, num_neighbors)
+        The backward neighbors of all the indices
+
+    index_ids : np.ndarray (num_neighbors)
+        The column of indices associated with each neighbor
+    """
+    index_ids, var_ids = np.nonzero(indices.T)
+    neighbors = indices[:, index_ids]
+    neighbors[var_ids, np.arange(index_ids.shape[0])] -= 1
+    return neighbors, index_ids
+
+
+def get_index_prefix_tree(indices):
+    """
+    Arrange a set of indices in a tree in which the parent of each index
+    is the index with its last non-zero entry set to zero. Ancestors
+    missing from the set are added so any set of indices is supported.
+    No nodes are added to a downward closed set. Repeated indices are
+    mapped to the same node.
+
+    The nodes are sorted by level then lexiographically so every node
+    appears after its parent.
+
+    Parameters
+    ----------
+    indices : np.ndarray (num_vars, num_indices)
+        The indices
+
+    Returns
+    -------
+    nodes : np.ndarray (num_vars, num_nodes)
+        The indices and their ancestors. The first node is the zero index
+
+    parent_ids : np.ndarray (num_nodes)
+        The column of nodes containing the parent of each node. The zero
+        index has no parent and is assigned -1
+
+    active_vars : np.ndarray (num_nodes)
+        The variable in which each node differs from its parent. The zero
+        index is assigned -1
+
+    index_ids : np.ndarray (num_indices)
+        The column of nodes containing each index
+    """
+    node_ids = dict()
+    index_ids = np.array(
+        [node_ids.setdefault(key, len(node_ids))
+         for key in hash_array_columns(indices)], dtype=np.int64)
+    num_unique_indices = len(node_ids)
+    if num_unique_indices < indices.shape[1]:
+        # keep the first of each repeated index
+        first_ids = np.empty(num_unique_indices, dtype=np.int64)
+        first_ids[index_ids[::-1]] = np.arange(indices.shape[1])[::-1]
+        indices = indices[:, first_ids]
+    nodes, parent_ids, child_vars = [indices], [], []
+    frontier_ids, frontier = np.arange(num_unique_indices), indices
+    while frontier.shape[1] > 0:
+        nonzero = frontier.any(axis=0)
+        child_ids, frontier = frontier_ids[nonzero], frontier[:, nonzero]
+        parents, last_vars = _zero_last_nonzero_entries(frontier)
+        new_ids = []
+        for jj, key in enumerate(hash_array_columns(parents)):
+            if key not in node_ids:
+                node_ids[key] = len(node_ids)
+                new_ids.append(jj)
+            parent_ids.append(node_ids[key])
+        child_vars.append(np.vstack([child_ids, last_vars]))
+        frontier = parents[:, new_ids]
+        frontier_ids = np.arange(
+            len(node_ids)-len(new_ids), len(node_ids))
+        nodes.append(frontier)
+    nodes = np.hstack(nodes)
+    num_nodes = nodes.shape[1]
+
+    unsorted_parent_ids = np.full(num_nodes, -1, dtype=np.int64)
+    unsorted_active_vars = np.full(num_nodes, -1, dtype=np.int64)
+    if len(child_vars) > 0:
+        child_ids, last_vars = np.hstack(child_vars)
+        unsorted_parent_ids[child_ids] = parent_ids
+        unsorted_active_vars[child_ids] = last_vars
+
+    # parents have a lower level than their children so sorting
+    # places parents first
+    II = argsort_indices_lexiographically(nodes)
+    inv_II = np.empty(num_nodes, dtype=np.int64)
+    inv_II[II] = np.arange(num_nodes)
+    parent_ids = unsorted_parent_ids[II]
+    parent_ids[parent_ids >= 0] = inv_II[parent_ids[parent_ids >= 0]]
+    return (nodes[:, II], parent_ids, unsorted_active_vars[II],
+            inv_II[index_ids])
+
+
+def _zero_last_nonzero_entries(indices):
+    """
+    Set the last non-zero entry of each index, which must not be the zero
+    index, to zero.
+    """
+    num_vars, num_indices = indices.shape
+    last_vars = num_vars-1-np.argmax(indices[::-1] != 0, axis=0)
+    parents = indices.copy()
+    parents[last_vars, np.arange(num_indices)] = 0
+    return parents, last_vars
+
+
 def compute_downward_closed_indices(num_vars, admissibility_criteria):
     indices = np.zeros((num_vars, 0), dtype=np.int64)
     active_indices = np.zeros((num_vars, 1), dtype=np.int64)
@@ -384,6 +530,342 @@ def compute_anisotropic_indices(num_vars, level, anisotropic_weights):
     return subspace_indices
 
 
+@njit(cache=True)
+def compute_variable_combinations(num_vars, num_active_vars):
+    """
+    Return all subsets of a fixed number of variables in lexiographical
+    order.
+
+    Parameters
+    ----------
+    num_vars : integer
+        The number of variables
+
+    num_active_vars : integer
+        The size of each subset
+
+    Returns
+    -------
+    combinations : np.ndarray (num_combinations, num_active_vars)
+        The increasing variable ids of each subset
+    """
+    num_combinations = nchoosek(num_vars, num_active_vars)
+    combinations = np.empty(
+        (num_combinations, num_active_vars), dtype=np.int64)
+    comb = np.arange(num_active_vars)
+    for ii in range(num_combinations):
+        combinations[ii] = comb
+        # find the right-most entry that can be incremented
+        jj = num_active_vars-1
+        while jj >= 0 and comb[jj] == num_vars-num_active_vars+jj:
+            jj -= 1
+        if jj < 0:
+            break
+        comb[jj] += 1
+        for kk in range(jj+1, num_active_vars):
+            comb[kk] = comb[kk-1]+1
+    return combinations
+
+
+class SparseIndexSet(object):
+    """
+    A set of multivariate indices which only stores the non-zero entries
+    of each index.
+
+    Row ii of ``active_vars`` contains the increasing ids of the variables
+    with non-zero degree in the ith index and the same row of
+    ``active_levels`` contains the degrees of those variables. Rows are
+    padded with zero levels so both arrays have shape
+    (num_indices, max_num_active_vars). The smallest unsigned integer type
+    that can represent the entries is used, e.g. uint8 levels, so the
+    memory required is often orders of magnitude less than the dense
+    (num_vars, num_indices) int64 array.
+
+    Because each index has a unique representation every row is also a
+    packed key of the index, so membership, union and difference queries
+    only require sorting and a binary search.
+    """
+
+    def __init__(self, num_vars, active_vars, active_levels):
+        """
+        Parameters
+        ----------
+        num_vars : integer
+            The number of variables
+
+        active_vars : np.ndarray (num_indices, max_num_active_vars)
+            The ids of the non-zero entries of each index. Entries with
+            zero level are ignored
+
+        active_levels : np.ndarray (num_indices, max_num_active_vars)
+            The degrees of the variables in active_vars
+        """
+        assert active_vars.ndim == 2
+        assert active_vars.shape == active_levels.shape
+        self.num_vars = num_vars
+        # sort the entries of each index by variable and place padding
+        # last so each index has exactly one representation
+        is_active = active_levels > 0
+        order = np.argsort(
+            np.where(is_active, active_vars, num_vars), axis=1, kind='stable')
+        active_vars = np.take_along_axis(active_vars, order, axis=1)
+        active_levels = np.take_along_axis(active_levels, order, axis=1)
+        active_vars[active_levels == 0] = 0
+        width = is_active.sum(axis=1).max() if active_vars.shape[0] > 0 else 0
+        max_level = active_levels.max() if active_levels.size > 0 else 0
+        self.active_vars = active_vars[:, :width].astype(
+            np.min_scalar_type(max(num_vars-1, 0)))
+        self.active_levels = active_levels[:, :width].astype(
+            np.min_scalar_type(max_level))
+        self._sorted_keys = None
+
+    @classmethod
+    def from_dense(cls, indices):
+        """
+        Create a set from dense indices. Repeated indices are removed.
+
+        Parameters
+        ----------
+        indices : np.ndarray (num_vars, num_indices)
+            The non-negative multivariate indices
+
+        Returns
+        -------
+        index_set : SparseIndexSet
+            The set of unique indices
+        """
+        return cls(indices.shape[0], *_sparsify_indices(indices)).unique()
+
+    @property
+    def num_indices(self):
+        return self.active_vars.shape[0]
+
+    def __len__(self):
+        return self.num_indices
+
+    def __repr__(self):
+        return "{0}(num_vars={1}, num_indices={2})".format(
+            self.__class__.__name__, self.num_vars, self.num_indices)
+
+    def nbytes(self):
+        """Return the number of bytes used to store the indices."""
+        return self.active_vars.nbytes + self.active_levels.nbytes
+
+    def to_dense(self, dtype=np.int64):
+        """
+        Return the dense indices used by the rest of pyapprox.
+
+        Returns
+        -------
+        indices : np.ndarray (num_vars, num_indices)
+            The multivariate indices
+        """
+        indices = np.zeros((self.num_vars, self.num_indices), dtype=dtype)
+        index_ids, positions = np.nonzero(self.active_levels)
+        indices[self.active_vars[index_ids, positions], index_ids] = \
+            self.active_levels[index_ids, positions]
+        return indices
+
+    def select(self, index_ids):
+        """Return the indices with the specified ids."""
+        return self.__class__(
+            self.num_vars, self.active_vars[index_ids],
+            self.active_levels[index_ids])
+
+    def unique(self):
+        """Remove repeated indices keeping the first occurence."""
+        keys = self._get_keys(*_get_sparse_index_key_format([self]))
+        return self.select(np.sort(np.unique(keys, return_index=True)[1]))
+
+    def _get_keys(self, width, dtype):
+        """
+        Return a scalar key for each index that can be compared with the
+        keys of other sets constructed with the same width and dtype.
+        """
+        # the zero index has no active variables so pad it to ensure
+        # keys are not empty
+        width = max(width, 1)
+        keys = np.zeros((self.num_indices, 2*width), dtype=dtype)
+        keys[:, :self.active_vars.shape[1]] = self.active_vars
+        keys[:, width:width+self.active_levels.shape[1]] = self.active_levels
+        return keys.view(
+            np.dtype((np.void, keys.dtype.itemsize*2*width))).ravel()
+
+    def _get_sorted_keys(self, width, dtype):
+        if (self._sorted_keys is None or
+                self._sorted_keys[:2] != (width, dtype)):
+            self._sorted_keys = (
+                width, dtype, np.sort(self._get_keys(width, dtype)))
+        return self._sorted_keys[2]
+
+    def contains(self, indices):
+        """
+        Determine which indices are members of the set.
+
+        Parameters
+        ----------
+        indices : np.ndarray (num_vars, num_indices) or SparseIndexSet
+            The indices to query
+
+        Returns
+        -------
+        is_member : np.ndarray (num_indices)
+            True if the corresponding index is in the set
+        """
+        if not isinstance(indices, SparseIndexSet):
+            indices = SparseIndexSet(
+                indices.shape[0], *_sparsify_indices(indices))
+        assert indices.num_vars == self.num_vars
+        if self.num_indices == 0:
+            return np.zeros(indices.num_indices, dtype=bool)
+        width, dtype = _get_sparse_index_key_format([self, indices])
+        sorted_keys = self._get_sorted_keys(width, dtype)
+        keys = indices._get_keys(width, dtype)
+        pos = np.searchsorted(sorted_keys, keys)
+        pos[pos == sorted_keys.shape[0]] = 0
+        return sorted_keys[pos] == keys
+
+    def union(self, other):
+        """
+        Return the indices in this set followed by the indices of another
+        set which are not in this set.
+        """
+        return concatenate_sparse_index_sets([self, other]).unique()
+
+    def difference(self, other):
+        """Return the indices in this set which are not in another set."""
+        return self.select(np.where(~other.contains(self))[0])
+
+    def get_forward_neighbors(self):
+        """
+        Return the forward neighbors, in every direction, of the indices
+        which are not in the set.
+        """
+        is_active = self.active_levels > 0
+        neighbors = []
+        for dd in range(self.num_vars):
+            # increment the level of indices in which dd is active and
+            # append dd with level one to all other indices
+            is_dd = is_active & (self.active_vars == dd)
+            has_dd = is_dd.any(axis=1)
+            active_vars = np.hstack([
+                self.active_vars, np.full((self.num_indices, 1), dd)])
+            active_levels = np.hstack([
+                self.active_levels.astype(np.int64)+is_dd,
+                (~has_dd)[:, None]])
+            neighbors.append(
+                self.__class__(self.num_vars, active_vars, active_levels))
+        return concatenate_sparse_index_sets(
+            neighbors).unique().difference(self)
+
+    def is_downward_closed(self):
+        """
+        Return True if all backward neighbors of every index are in the set.
+        """
+        index_ids, positions = np.nonzero(self.active_levels)
+        active_levels = self.active_levels[index_ids].astype(np.int64)
+        active_levels[np.arange(index_ids.shape[0]), positions] -= 1
+        neighbors = self.__class__(
+            self.num_vars, self.active_vars[index_ids], active_levels)
+        return np.all(self.contains(neighbors))
+
+
+def _sparsify_indices(indices):
+    """
+    Return the active variables and levels of a set of dense indices.
+    """
+    assert np.all(indices >= 0)
+    num_indices = indices.shape[1]
+    num_active_vars = np.count_nonzero(indices, axis=0)
+    width = num_active_vars.max() if num_indices > 0 else 0
+    active_vars = np.zeros((num_indices, width), dtype=np.int64)
+    active_levels = np.zeros((num_indices, width), dtype=np.int64)
+    index_ids, var_ids = np.nonzero(indices.T)
+    # position of each non-zero entry within its index
+    positions = np.arange(index_ids.shape[0])-np.repeat(
+        np.cumsum(num_active_vars)-num_active_vars, num_active_vars)
+    active_vars[index_ids, positions] = var_ids
+    active_levels[index_ids, positions] = indices[var_ids, index_ids]
+    return active_vars, active_levels
+
+
+def _get_sparse_index_key_format(index_sets):
+    """
+    Return the width and dtype of keys that can be compared across sets.
+    """
+    width = max([s.active_vars.shape[1] for s in index_sets])
+    dtype = np.result_type(*(
+        [s.active_vars for s in index_sets] +
+        [s.active_levels for s in index_sets]))
+    return width, dtype
+
+
+def concatenate_sparse_index_sets(index_sets):
+    """
+    Concatenate the indices of multiple sets without removing repeated
+    indices.
+    """
+    num_vars = index_sets[0].num_vars
+    assert all([s.num_vars == num_vars for s in index_sets])
+    width = max([s.active_vars.shape[1] for s in index_sets])
+    active_vars, active_levels = [], []
+    for s in index_sets:
+        pad = ((0, 0), (0, width-s.active_vars.shape[1]))
+        active_vars.append(np.pad(s.active_vars.astype(np.int64), pad))
+        active_levels.append(np.pad(s.active_levels.astype(np.int64), pad))
+    return SparseIndexSet(
+        num_vars, np.vstack(active_vars), np.vstack(active_levels))
+
+
+def compute_hyperbolic_indices_sparse(num_vars, level, p=1):
+    """
+    Compute the same hyperbolic cross indices as
+    :func:`compute_hyperbolic_indices` directly in the sparse format.
+
+    Indices with the same number of non-zero entries are formed from
+    the product of the subsets of variables of that size and the
+    levels of the non-zero entries, so the cost is proportional to the
+    number of indices and the dense indices are never formed.
+
+    Parameters
+    ----------
+    num_vars : integer
+        The number of variables
+
+    level : integer
+        The maximum p-norm of the indices
+
+    p : float
+        The p-norm of the indices. p=1 gives total degree indices
+
+    Returns
+    -------
+    index_set : SparseIndexSet
+        The indices ordered by their number of non-zero entries
+    """
+    assert level >= 0
+    active_vars = [np.zeros((1, 0), dtype=np.int64)]
+    active_levels = [np.zeros((1, 0), dtype=np.int64)]
+    for num_active_vars in range(1, min(level, num_vars)+1):
+        levels = [compute_hyperbolic_level_subdim_indices(
+            num_vars, ll, num_active_vars, p)
+                  for ll in range(num_active_vars, level+1)]
+        levels = np.hstack(levels).T
+        if levels.shape[0] == 0:
+            break
+        combinations = compute_variable_combinations(
+            num_vars, num_active_vars)
+        active_vars.append(np.repeat(combinations, levels.shape[0], axis=0))
+        active_levels.append(np.tile(levels, (combinations.shape[0], 1)))
+    width = len(active_vars)-1
+    for ii in range(len(active_vars)):
+        pad = ((0, 0), (0, width-active_vars[ii].shape[1]))
+        active_vars[ii] = np.pad(active_vars[ii], pad)
+        active_levels[ii] = np.pad(active_levels[ii], pad)
+    return SparseIndexSet(
+        num_vars, np.vstack(active_vars), np.vstack(active_levels))
+
+
 def get_upper_triangular_matrix_scalar_index(ii, jj, nn):
     r"""
     Get the scalar index kk of the (ii,jj) etnry of an upper triangular matrix 
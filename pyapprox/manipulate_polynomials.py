@@ -5,27 +5,120 @@ from pyapprox.indexing import compute_hyperbolic_level_indices
 from numba import njit
 
 
-@njit(cache=True)
-def multiply_multivariate_polynomials(indices1, coeffs1, indices2, coeffs2):
+def get_packed_index_radices(max_degrees):
     """
-    TODO: instead of using dictionary to colect terms consider using
+    Return the radix of each variable used to pack multivariate indices
+    into a single integer key.
 
-    unique_indices, repeated_idx = np.unique(
-        indices[active_idx,:], axis=1, return_inverse=True)
+    Parameters
+    ----------
+    max_degrees : np.ndarray (num_vars)
+        The largest degree of each variable that will be packed
 
-    as is done in 
-    multivariate_polynomials.conditional_moments_of_polynomial_chaos_expansion. 
-    Choose which one is faster
+    Returns
+    -------
+    radices : np.ndarray (num_vars)
+        The radix max_degrees[dd]+1 of each variable. None is returned
+        if the packed keys would overflow a 64-bit integer
+    """
+    radices = np.asarray(max_degrees, dtype=np.int64)+1
+    if np.sum(np.log2(radices.astype(np.double))) >= 62:
+        return None
+    return radices
 
 
+def pack_indices(indices, radices):
+    """
+    Pack each multivariate index into a single integer key. The first
+    variable is the most significant digit so sorting the keys sorts the
+    indices lexiographically, i.e. in the same order as
+    np.unique(indices, axis=1).
+
     Parameters
     ----------
-    index : multidimensional index
-        multidimensional index specifying the polynomial degree in each
-        dimension
+    indices : np.ndarray (num_vars, num_indices)
+        The non-negative multivariate indices
+
+    radices : np.ndarray (num_vars)
+        The radix of each variable returned by get_packed_index_radices
+
+    Returns
+    -------
+    keys : np.ndarray (num_indices)
+        The integer key of each index
+    """
+    keys = np.zeros(indices.shape[1], dtype=np.int64)
+    for dd in range(indices.shape[0]):
+        keys *= radices[dd]
+        keys += indices[dd].astype(np.int64)
+    return keys
+
+
+def unpack_indices(keys, radices):
+    """
+    Recover the multivariate indices packed by pack_indices.
+
+    Parameters
+    ----------
+    keys : np.ndarray (num_indices)
+        The integer key of each index
+
+    radices : np.ndarray (num_vars)
+        The radix of each variable used to pack the keys
+
+    Returns
+    -------
+    indices : np.ndarray (num_vars, num_indices)
+        The multivariate indices
+    """
+    num_vars = radices.shape[0]
+    indices = np.empty((num_vars, keys.shape[0]), dtype=np.int64)
+    keys = keys.copy()
+    for dd in range(num_vars-1, -1, -1):
+        indices[dd] = keys % radices[dd]
+        keys //= radices[dd]
+    return indices
+
+
+def _sum_like_terms(coeffs, repeated_idx, num_unique_indices):
+    unique_coeff = np.empty(
+        (num_unique_indices, coeffs.shape[1]), dtype=np.double)
+    for qq in range(coeffs.shape[1]):
+        unique_coeff[:, qq] = np.bincount(
+            repeated_idx, weights=coeffs[:, qq], minlength=num_unique_indices)
+    return unique_coeff
+
+
+def multiply_multivariate_polynomials(indices1, coeffs1, indices2, coeffs2):
+    """
+    Multiply two multivariate monomial expansions.
+
+    The degrees of each product term are represented by the sum of the
+    packed integer keys of the two factors, which is exact because the
+    radix of each variable exceeds the largest degree of the product.
+    Like terms are then collected with a single sort of the keys.
+
+    Parameters
+    ----------
+    indices1 : np.ndarray (num_vars, num_indices1)
+        The indices of the first polynomial
+
+    coeffs1 : np.ndarray (num_indices1, nqoi)
+        The coefficients of the first polynomial
+
+    indices2 : np.ndarray (num_vars, num_indices2)
+        The indices of the second polynomial
+
+    coeffs2 : np.ndarray (num_indices2, nqoi)
+        The coefficients of the second polynomial
 
     Returns
     -------
+    indices : np.ndarray (num_vars, num_indices)
+        The unique indices of the product
+
+    coeffs : np.ndarray (num_indices, nqoi)
+        The coefficients of the product
     """
     num_vars = indices1.shape[0]
     num_indices1 = indices1.shape[1]
@@ -36,46 +129,32 @@ def multiply_multivariate_polynomials(indices1, coeffs1, indices2, coeffs2):
     assert num_vars == indices2.shape[0]
     assert nqoi == coeffs2.shape[1]
 
-    # using np.unique inside group like terms is much more expensive
-    # than using dictionary
-    # max_num_indices = num_indices1*num_indices2
-    # indices = []
-    # coeffs = []
-    # for ii in range(num_indices1):
-    #     index1 = indices1[:, ii]
-    #     coeff1 = coeffs1[ii, :]
-    #     for jj in range(num_indices2):
-    #         indices.append(index1 + indices2[:, jj])
-    #         coeffs.append(coeff1*coeffs2[jj, :])
-
-    # return group_like_terms(np.array(coeffs), np.array(indices).T)
-
-    indices_dict = dict()
-    max_num_indices = num_indices1*num_indices2
-    indices = np.empty((num_vars, max_num_indices), dtype=np.int64)
-    coeffs = np.empty((max_num_indices, nqoi), dtype=np.double)
-    kk = 0
-    for ii in range(num_indices1):
-        index1 = indices1[:, ii]
-        coeff1 = coeffs1[ii]
-        for jj in range(num_indices2):
-            index = index1+indices2[:, jj]
-            # hash_array does not work with jit
-            # key = hash_array(index)
-            # so use a polynomial hash
-            key = 0
-            for dd in range(index.shape[0]):
-                key = 31*key + int(index[dd])
-            coeff = coeff1*coeffs2[jj]
-            if key in indices_dict:
-                coeffs[indices_dict[key]] += coeff
-            else:
-                indices_dict[key] = kk
-                indices[:, kk] = index
-                coeffs[kk] = coeff
-                kk += 1
-    indices = indices[:, :kk]
-    coeffs = coeffs[:kk]
+    radices = None
+    if (num_indices1 > 0 and num_indices2 > 0 and indices1.min() >= 0 and
+            indices2.min() >= 0):
+        radices = get_packed_index_radices(
+            indices1.max(axis=1)+indices2.max(axis=1))
+    if radices is None:
+        indices = (indices1[:, :, None]+indices2[:, None, :]).reshape(
+            num_vars, num_indices1*num_indices2)
+        coeffs = (coeffs1[:, None, :]*coeffs2[None, :, :]).reshape(
+            num_indices1*num_indices2, nqoi)
+        indices, coeffs = group_like_terms(coeffs, indices)
+        return indices.astype(np.int64), coeffs
+
+    keys = (pack_indices(indices1, radices)[:, None] +
+            pack_indices(indices2, radices)[None, :]).ravel()
+    unique_keys, unique_idx, repeated_idx = np.unique(
+        keys, return_index=True, return_inverse=True)
+    # return the terms in the order they first appear in the product
+    order = np.argsort(unique_idx)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.shape[0])
+    indices = unpack_indices(unique_keys[order], radices)
+    coeffs = _sum_like_terms(
+        (coeffs1[:, None, :]*coeffs2[None, :, :]).reshape(
+            num_indices1*num_indices2, nqoi), rank[repeated_idx],
+        unique_keys.shape[0])
     return indices, coeffs
 
 
@@ -126,7 +205,7 @@ def precompute_polynomial_powers(max_pow, indices, coefs, var_idx,
 
     # store input indices in global_var_idx
     assert indices.shape[0] == global_var_idx.shape[0]
-    ind = np.zeros((num_global_vars, indices.shape[1]))
+    ind = np.zeros((num_global_vars, indices.shape[1]), dtype=np.int64)
     ind[global_var_idx, :] = indices
 
     polys = [coeffs_of_power_of_monomial(ind, coefs, 0)]
@@ -194,29 +273,30 @@ def substitute_polynomials_for_variables_in_another_polynomial(
     mask2 = np.ones(indices.shape[0], dtype=bool)
     mask2[np.unique(var_idx)] = False
 
+    # terms sharing the degrees of the substituted variables share the
+    # same product of input polynomial powers so only compute it once
     num_vars, num_terms = indices.shape
+    unique_sub_degrees, group_idx = np.unique(
+        indices[var_idx, :], axis=1, return_inverse=True)
+    sorted_idx = np.argsort(group_idx, kind='stable')
+    group_terms = np.split(
+        sorted_idx, np.cumsum(np.bincount(group_idx))[:-1])
     new_indices = []
     new_coeffs = []
-    for ii in range(num_terms):
-        basis_index = indices[:, ii:ii+1]
-        # The following is more memory efficient but does not reuse information
-        # computed multiple times
-        # ind, cf = substitute_polynomials_for_variables_in_single_basis_term(
-        #   indices_in, coeffs_in, basis_index, coeffs[ii], var_idx,
-        #   global_var_idx)
-
-        degree = basis_index[var_idx[0], 0]
-        ind, cf = input_poly_powers[0][degree]
+    for kk in range(unique_sub_degrees.shape[1]):
+        degrees = unique_sub_degrees[:, kk]
+        ind, cf = input_poly_powers[0][degrees[0]]
         for jj in range(1, num_inputs):
-            degree = basis_index[var_idx[jj], 0]
-            ind2, cf2 = input_poly_powers[jj][degree]
+            ind2, cf2 = input_poly_powers[jj][degrees[jj]]
             ind, cf = multiply_multivariate_polynomials(ind, cf, ind2, cf2)
 
         # multiply all terms by these remaining variables
-        ind[mask, :] += basis_index[mask2]
-        cf *= coeffs[ii]
-        new_indices.append(ind)
-        new_coeffs.append(cf)
+        terms = group_terms[kk]
+        ind = np.repeat(ind[:, None, :], terms.shape[0], axis=1)
+        ind[mask] += indices[mask2][:, terms][:, :, None]
+        cf = coeffs[terms][:, None, :]*cf[None, :, :]
+        new_indices.append(ind.reshape(num_global_vars, -1))
+        new_coeffs.append(cf.reshape(-1, cf.shape[2]))
 
     new_indices = np.hstack(new_indices)
     new_coeffs = np.vstack(new_coeffs)
@@ -304,12 +384,14 @@ def substitute_polynomials_for_variables_in_single_basis_term(
     return ind1, c1
 
 
-@njit(cache=True)
 def coeffs_of_power_of_monomial(indices, coeffs, degree):
     """
     Compute the monomial (coefficients and indices) obtained by raising
     a multivariate polynomial to some power.
 
+    Like terms are not grouped. Use group_like_terms on the output
+    if needed.
+
     TODO: Deprecate coeffs_of_power_of_nd_linear_monomial as that function
     can be obtained as a special case of this function
 
@@ -333,32 +415,54 @@ def coeffs_of_power_of_monomial(indices, coeffs, degree):
     assert indices.shape[1] == coeffs.shape[0]
     multinomial_coeffs, multinomial_indices = \
         multinomial_coeffs_of_power_of_nd_linear_monomial(num_terms, degree)
-    new_indices = np.zeros((num_vars, multinomial_indices.shape[1]))
-    # new_coeffs = np.tile(multinomial_coeffs[:, np.newaxis], coeffs.shape[1])
-    # numba does not support tile so replicate with repeat and reshape
-    new_coeffs = multinomial_coeffs.repeat(coeffs.shape[1]).reshape(
-        (-1, coeffs.shape[1]))
-    for ii in range(multinomial_indices.shape[1]):
-        multinomial_index = multinomial_indices[:, ii]
-        for dd in range(num_terms):
-            deg = multinomial_index[dd]
-            new_coeffs[ii] *= coeffs[dd]**deg
-            new_indices[:, ii] += indices[:, dd]*deg
+    new_indices = np.dot(indices, multinomial_indices)
+    new_coeffs = np.tile(multinomial_coeffs[:, np.newaxis], coeffs.shape[1])
+    for dd in range(num_terms):
+        new_coeffs *= coeffs[dd]**multinomial_indices[dd][:, np.newaxis]
     return new_indices, new_coeffs
 
 
 def group_like_terms(coeffs, indices):
+    """
+    Sum the coefficients of the terms of a polynomial with the same index.
+
+    Non-negative indices are packed into a single integer key so only one
+    sort of a 1D array is required. If the packed keys would overflow the
+    columns of the indices are sorted directly.
+
+    Parameters
+    ----------
+    coeffs : np.ndarray (num_indices, nqoi)
+        The coefficients of each term
+
+    indices : np.ndarray (num_vars, num_indices)
+        The indices of each term
+
+    Returns
+    -------
+    unique_indices : np.ndarray (num_vars, num_unique_indices)
+        The unique indices sorted lexiographically
+
+    unique_coeff : np.ndarray (num_unique_indices, nqoi)
+        The sum of the coefficients of each unique index
+    """
     if coeffs.ndim == 1:
         coeffs = coeffs[:, np.newaxis]
 
-    unique_indices, repeated_idx = np.unique(
-        indices, axis=1, return_inverse=True)
-
-    nunique_indices = unique_indices.shape[1]
-    unique_coeff = np.zeros(
-        (nunique_indices, coeffs.shape[1]), dtype=np.double)
-    for ii in range(repeated_idx.shape[0]):
-        unique_coeff[repeated_idx[ii]] += coeffs[ii]
+    radices = None
+    if indices.shape[1] > 0 and indices.min() >= 0:
+        radices = get_packed_index_radices(indices.max(axis=1))
+    if radices is None:
+        unique_indices, repeated_idx = np.unique(
+            indices, axis=1, return_inverse=True)
+    else:
+        unique_keys, unique_idx, repeated_idx = np.unique(
+            pack_indices(indices, radices), return_index=True,
+            return_inverse=True)
+        unique_indices = indices[:, unique_idx]
+
+    unique_coeff = _sum_like_terms(
+        coeffs, repeated_idx, unique_indices.shape[1])
     return unique_indices, unique_coeff
 
     # num_vars, num_indices = indices.shape
@@ -543,7 +647,6 @@ def add_polynomials(indices_list, coeffs_list):
     # return indices, coeff
 
 
-@njit(cache=True)
 def get_indices_double_set(indices):
     """
     Given muultivariate indices 
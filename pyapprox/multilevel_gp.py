@@ -4,6 +4,8 @@ from pyapprox.gradient_enhanced_gp import plot_gp_1d, kernel_ff, \
     get_gp_samples_kernel
 
 from sklearn.gaussian_process.kernels import StationaryKernelMixin,NormalizedKernelMixin, Kernel, Hyperparameter, _approx_fprime, ConstantKernel, WhiteKernel
+from sklearn.base import clone
+from scipy.linalg import cho_solve
 
 def multilevel_diagonal_covariance_block(XX1,XX2,hyperparams,mm):
     """
@@ -215,7 +217,35 @@ class MultilevelGPKernel(StationaryKernelMixin, NormalizedKernelMixin, Kernel):
                 self.__class__.__name__, ", ".join(map("{0:.3g}".format,
                                                    self.length_scale)))
 
-    
+
+def check_multilevel_data(samples,values):
+    """
+    Check the training data of each model of a multilevel GP.
+
+    Returns
+    -------
+    values : list
+        The values of each model squeezed to 1D arrays. The entries of the
+        list passed in are overwritten
+
+    nvars : integer
+        The number of variables
+    """
+    nmodels = len(samples)
+    assert len(values)==nmodels
+    assert samples[0].ndim==2
+    values[0] = values[0].squeeze()
+    assert values[0].ndim==1
+    nvars = samples[0].shape[0]
+    for ii in range(1,nmodels):
+        assert samples[ii].ndim==2
+        assert samples[ii].shape[0]==nvars
+        values[ii] = values[ii].squeeze()
+        assert values[ii].ndim==1
+        assert values[ii].shape[0]==samples[ii].shape[1]
+    return values, nvars
+
+
 class MultilevelGP(GaussianProcessRegressor):
     def __init__(self, kernel, alpha=1e-10,
                  optimizer="fmin_l_bfgs_b", n_restarts_optimizer=0,
@@ -227,19 +257,8 @@ class MultilevelGP(GaussianProcessRegressor):
 
     def set_data(self,samples,values):
         self.nmodels = len(samples)
-        assert len(values)==self.nmodels
-        self.samples=samples
-        self.values=values
-        assert samples[0].ndim==2
-        self.values[0] = self.values[0].squeeze()
-        assert self.values[0].ndim==1
-        self.nvars = samples[0].shape[0]
-        for ii in range(1,self.nmodels):
-            assert samples[ii].ndim==2
-            assert samples[ii].shape[0]==self.nvars
-            self.values[ii] = self.values[ii].squeeze()
-            assert self.values[ii].ndim==1
-            assert self.values[ii].shape[0]==samples[ii].shape[1]
+        self.samples = samples
+        self.values, self.nvars = check_multilevel_data(samples, values)
 
     def fit(self):
         XX_train = np.hstack(self.samples).T
@@ -268,5 +287,120 @@ class MultilevelGP(GaussianProcessRegressor):
         plot_gp_1d(
             axs,self.predict,num_XX_test,bounds,XX_train,YY_train,
             num_stdev,function,gp_label=gp_label,function_label=function_label)
-    
 
+
+class RecursiveMultilevelGP(object):
+    r"""
+    Multilevel Gaussian process using the recursive formulation of the
+    autoregressive model of Kennedy and O'Hagan
+
+    .. math:: f_{m}(x) = \rho_{m-1}f_{m-1}(x) + \delta_m(x)
+
+    Models are assumed to be ordered by increasing fidelity. Instead of
+    factorizing the covariance of the training data of all models, the
+    discrepancy :math:`\delta_m` of each level is fit separately to the
+    data :math:`y_m-\rho_{m-1}\mu_{m-1}(X_m)`, where :math:`\mu_{m-1}` is
+    the posterior mean of the previous level. Consequently the cost of
+    fitting scales with the number of samples of each model. Predictions
+    are composed level by level
+
+    .. math:: \mu_m(x) = \rho_{m-1}\mu_{m-1}(x) + \mu_{\delta_m}(x),
+              \qquad \sigma_m^2(x) = \rho_{m-1}^2\sigma_{m-1}^2(x) +
+              \sigma_{\delta_m}^2(x)
+
+    When the samples of each model are a subset of the samples of the model
+    with the next lowest fidelity and the kernel hyper-parameters are
+    the same, the predictions are identical to those of :class:`MultilevelGP`.
+
+    Parameters
+    ----------
+    kernels : list (nmodels)
+        The sklearn kernel of each discrepancy. The first kernel is the
+        kernel of the lowest fidelity model
+
+    rho : np.ndarray (nmodels-1)
+        The correlation between consecutive models. If None then rho is
+        estimated using generalized least squares
+    """
+    def __init__(self, kernels, rho=None, alpha=1e-10,
+                 optimizer="fmin_l_bfgs_b", n_restarts_optimizer=0):
+        self.kernels = kernels
+        self.nmodels = len(kernels)
+        self.rho_init = rho
+        if rho is not None:
+            assert len(rho) == self.nmodels-1
+        self.alpha = alpha
+        self.optimizer = optimizer
+        self.n_restarts_optimizer = n_restarts_optimizer
+
+    def set_data(self, samples, values):
+        assert len(samples) == self.nmodels
+        self.samples = samples
+        self.values, self.nvars = check_multilevel_data(samples, values)
+
+    def _fit_level(self, kernel, samples, values, optimizer):
+        gp = GaussianProcessRegressor(
+            kernel=kernel, alpha=self.alpha, optimizer=optimizer,
+            n_restarts_optimizer=self.n_restarts_optimizer)
+        return gp.fit(samples.T, values)
+
+    def fit(self):
+        self.gps, self.rho = [], []
+        self.gps.append(self._fit_level(
+            self.kernels[0], self.samples[0], self.values[0], self.optimizer))
+        for ii in range(1, self.nmodels):
+            prev_vals = self._predict(self.samples[ii].T, ii)
+            if self.rho_init is not None:
+                rho = self.rho_init[ii-1]
+                gp = self._fit_level(
+                    self.kernels[ii], self.samples[ii],
+                    self.values[ii]-rho*prev_vals, self.optimizer)
+            else:
+                # initial guess of rho from ordinary least squares
+                rho = prev_vals.dot(self.values[ii])/prev_vals.dot(prev_vals)
+                gp = self._fit_level(
+                    self.kernels[ii], self.samples[ii],
+                    self.values[ii]-rho*prev_vals, self.optimizer)
+                # update rho with generalized least squares using the
+                # covariance of the discrepancy and refit with the
+                # optimized hyper-parameters
+                tmp = cho_solve((gp.L_, True), prev_vals)
+                rho = tmp.dot(self.values[ii])/tmp.dot(prev_vals)
+                gp = self._fit_level(
+                    clone(gp.kernel_), self.samples[ii],
+                    self.values[ii]-rho*prev_vals, None)
+            self.rho.append(rho)
+            self.gps.append(gp)
+        self.rho = np.array(self.rho)
+
+    def _predict(self, XX_test, nlevels, return_std=False):
+        if not return_std:
+            mean = self.gps[0].predict(XX_test)
+            for ii in range(1, nlevels):
+                mean = self.rho[ii-1]*mean + self.gps[ii].predict(XX_test)
+            return mean
+
+        mean, std = self.gps[0].predict(XX_test, return_std=True)
+        variance = std**2
+        for ii in range(1, nlevels):
+            mean_ii, std_ii = self.gps[ii].predict(XX_test, return_std=True)
+            mean = self.rho[ii-1]*mean + mean_ii
+            variance = self.rho[ii-1]**2*variance + std_ii**2
+        return mean, np.sqrt(variance)
+
+    def predict(self, XX_test, return_std=False, model_id=None):
+        """
+        Predict the values of a model
+
+        Parameters
+        ----------
+        XX_test : np.ndarray (nsamples, nvars)
+            The samples at which to predict the model
+
+        model_id : integer
+            The id of the model to predict. If None predict the highest
+            fidelity model
+        """
+        if model_id is None:
+            model_id = self.nmodels-1
+        return self._predict(XX_test, model_id+1, return_std)
@@ -10,7 +10,7 @@ from pyapprox.orthonormal_polynomials_1d import gauss_quadrature
 from functools import partial
 import numpy as np
 from pyapprox.indexing import \
-    compute_hyperbolic_indices
+    compute_hyperbolic_indices, get_index_prefix_tree
 from pyapprox.utilities import cartesian_product, outer_product
 from pyapprox.orthonormal_polynomials_1d import \
     jacobi_recurrence, evaluate_orthonormal_polynomial_deriv_1d, \
@@ -18,10 +18,11 @@ from pyapprox.orthonormal_polynomials_1d import \
     discrete_chebyshev_recurrence, evaluate_orthonormal_polynomial_1d
 from pyapprox.monomial import monomial_basis_matrix
 from pyapprox.utilities import \
-    flattened_rectangular_lower_triangular_matrix_index
+    flattened_rectangular_lower_triangular_matrix_index, hash_array_columns
 from pyapprox.probability_measure_sampling import \
     generate_independent_random_samples
 from pyapprox.manipulate_polynomials import add_polynomials
+from numba import njit, prange
 
 
 def make_2D_array(lis):
@@ -86,6 +87,80 @@ def evaluate_multivariate_orthonormal_polynomial_values(
     return values
 
 
+@njit(cache=True, parallel=True)
+def _evaluate_multivariate_orthonormal_polynomial_values_prefix_tree(
+        parent_ids, active_vars, active_degrees, basis_vals_1d, root_val):
+    num_samples = basis_vals_1d.shape[2]
+    num_nodes = parent_ids.shape[0]
+    values = np.empty((num_samples, num_nodes), dtype=np.double)
+    for ii in prange(num_samples):
+        values[ii, 0] = root_val
+        for kk in range(1, num_nodes):
+            values[ii, kk] = values[ii, parent_ids[kk]]*basis_vals_1d[
+                active_vars[kk], active_degrees[kk], ii]
+    return values
+
+
+def _use_index_prefix_tree(num_vars, deriv_order):
+    # the cost of building the prefix tree is only recovered when
+    # each term has many univariate factors
+    return deriv_order == 0 and num_vars > 3
+
+
+def evaluate_multivariate_orthonormal_polynomial_values_prefix_tree(
+        indices, basis_vals_1d, num_samples, prefix_tree=None):
+    """
+    Evaluate multivariate orthonormal polynomials using a prefix tree of
+    their indices.
+
+    Each index differs from its parent in the tree, obtained with
+    :func:`pyapprox.indexing.get_index_prefix_tree`, in only one variable.
+    Dividing the univariate basis values by the constant degree zero
+    polynomials means the value of each term is computed with one
+    multiplication of its parent's value, instead of num_vars
+    multiplications.
+
+    Parameters
+    ----------
+    indices : np.ndarray (num_vars, num_indices)
+        The degrees of each polynomial term
+
+    basis_vals_1d : np.ndarray (num_vars, max_degree+1, num_samples)
+        The univariate basis values returned by
+        :func:`precompute_multivariate_orthonormal_polynomial_univariate_values`
+
+    num_samples : integer
+        The number of samples
+
+    prefix_tree : tuple
+        The prefix tree of the indices returned by
+        :func:`pyapprox.indexing.get_index_prefix_tree`. If None it is
+        computed
+
+    Returns
+    -------
+    values : np.ndarray (num_samples, num_indices)
+        The values of the polynomials at the samples
+    """
+    if prefix_tree is None:
+        prefix_tree = get_index_prefix_tree(indices)
+    nodes, parent_ids, active_vars, index_ids = prefix_tree
+    active_degrees = nodes[active_vars, np.arange(nodes.shape[1])].astype(
+        np.int64)
+    const_vals = basis_vals_1d[:, 0, 0].copy()
+    # only scale the initialized entries of basis_vals_1d
+    max_level_1d = indices.max(axis=1)
+    ratios = np.empty(
+        (indices.shape[0], max_level_1d.max()+1, num_samples))
+    for dd in range(indices.shape[0]):
+        ratios[dd, :max_level_1d[dd]+1] = basis_vals_1d[
+            dd, :max_level_1d[dd]+1, :num_samples]/const_vals[dd]
+    values = _evaluate_multivariate_orthonormal_polynomial_values_prefix_tree(
+        parent_ids, active_vars, active_degrees, ratios,
+        np.prod(const_vals))
+    return values[:, index_ids]
+
+
 def evaluate_multivariate_orthonormal_polynomial_derivs(
         indices, max_level_1d, basis_vals_1d, num_samples, deriv_order):
     # TODO Consider combining
@@ -174,7 +249,7 @@ def evaluate_multivariate_orthonormal_polynomial_derivs_deprecated(indices, max_
 
 def evaluate_multivariate_orthonormal_polynomial(
         samples, indices, recursion_coeffs, deriv_order=0,
-        basis_type_index_map=None):
+        basis_type_index_map=None, prefix_tree=None):
     """
     Evaluate a multivaiate orthonormal polynomial and its s-derivatives 
     (s=1,...,num_derivs) using a three-term recurrence coefficients.
@@ -194,6 +269,11 @@ def evaluate_multivariate_orthonormal_polynomial(
     deriv_order : integer in [0,1]
        The maximum order of the derivatives to evaluate.
 
+    prefix_tree : tuple
+        The prefix tree of the indices, which is only used when evaluating
+        the values of polynomials with more than three variables. See
+        :func:`evaluate_multivariate_orthonormal_polynomial_values_prefix_tree`
+
     Return
     ------
     values : np.ndarray (1+deriv_order*num_samples,num_indices)
@@ -232,6 +312,9 @@ def evaluate_multivariate_orthonormal_polynomial(
         samples, indices, recursion_coeffs, deriv_order, basis_type_index_map)
 
     num_samples = samples.shape[1]
+    if _use_index_prefix_tree(num_vars, deriv_order):
+        return evaluate_multivariate_orthonormal_polynomial_values_prefix_tree(
+            indices, basis_vals_1d, num_samples, prefix_tree)
     values = compute_values(indices, basis_vals_1d, num_samples)
 
     if deriv_order == 0:
@@ -244,6 +327,204 @@ def evaluate_multivariate_orthonormal_polynomial(
     return values
 
 
+def get_sparse_indices(indices):
+    """
+    Store the non-zero entries of a set of multivariate indices in
+    compressed sparse column format.
+
+    Returns
+    -------
+    active_vars : np.ndarray (num_nonzeros)
+        The variables with non-zero degree of each index stored consecutively
+
+    active_degrees : np.ndarray (num_nonzeros)
+        The non-zero degrees of each index stored consecutively
+
+    offsets : np.ndarray (num_indices+1)
+        The entries of active_vars of the ith index are
+        active_vars[offsets[ii]:offsets[ii+1]]
+    """
+    index_ids, active_vars = np.nonzero(indices.T)
+    active_degrees = indices[active_vars, index_ids]
+    offsets = np.zeros(indices.shape[1]+1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(index_ids, minlength=indices.shape[1]))
+    return active_vars.astype(np.int64), active_degrees.astype(np.int64), \
+        offsets
+
+
+@njit(cache=True, parallel=True)
+def _evaluate_multivariate_orthonormal_polynomial_expansion(
+        active_vars, active_degrees, offsets, basis_vals_1d, const_vals,
+        coefficients):
+    num_samples = basis_vals_1d.shape[0]
+    num_indices, num_qoi = coefficients.shape
+    values = np.zeros((num_samples, num_qoi), dtype=np.double)
+    for ii in prange(num_samples):
+        for kk in range(num_indices):
+            basis_val = 1.
+            for jj in range(offsets[kk], offsets[kk+1]):
+                basis_val *= basis_vals_1d[
+                    ii, active_vars[jj], active_degrees[jj]]/const_vals[
+                        active_vars[jj]]
+            for qq in range(num_qoi):
+                values[ii, qq] += basis_val*coefficients[kk, qq]
+    return values
+
+
+def evaluate_multivariate_orthonormal_polynomial_expansion(
+        samples, indices, recursion_coeffs, coefficients,
+        basis_type_index_map=None, max_num_samples_per_chunk=1000):
+    """
+    Evaluate a multivariate orthonormal polynomial expansion without
+    forming its basis matrix.
+
+    The univariate basis values of a chunk of samples are computed with
+    :func:`precompute_multivariate_orthonormal_polynomial_univariate_values`
+    and the sum of the coefficients times the product of the univariate
+    basis values of each term is accumulated in a single compiled loop
+    which is parallel over the samples. Only the non-constant factors of
+    each term are multiplied so the cost is proportional to the number of
+    non-zero entries of the indices. The memory required is
+    O(max_num_samples_per_chunk*num_vars*(max_degree+1)).
+
+    Parameters
+    ----------
+    samples : np.ndarray (num_vars, num_samples)
+        Samples at which to evaluate the expansion
+
+    indices : np.ndarray (num_vars, num_indices)
+        The degrees of each polynomial term
+
+    recursion_coeffs : np.ndarray (num_coefs, 2) or list
+        The recursion coefficients of the univariate polynomials. A list
+        must be used with basis_type_index_map
+
+    coefficients : np.ndarray (num_indices, num_qoi)
+        The coefficients of each polynomial term
+
+    max_num_samples_per_chunk : integer
+        The maximum number of samples for which the univariate basis values
+        are stored at any one time
+
+    Returns
+    -------
+    values : np.ndarray (num_samples, num_qoi)
+        The values of the expansion at the samples
+    """
+    num_vars, num_samples = samples.shape
+    assert coefficients.ndim == 2
+    assert coefficients.shape[0] == indices.shape[1]
+    active_vars, active_degrees, offsets = get_sparse_indices(indices)
+    coefficients = np.ascontiguousarray(coefficients, dtype=np.double)
+    values = np.empty((num_samples, coefficients.shape[1]))
+    for lb in range(0, num_samples, max_num_samples_per_chunk):
+        ub = min(lb+max_num_samples_per_chunk, num_samples)
+        basis_vals_1d = \
+            precompute_multivariate_orthonormal_polynomial_univariate_values(
+                samples[:, lb:ub], indices, recursion_coeffs, 0,
+                basis_type_index_map)
+        # the degree zero polynomials are constant so fold their product
+        # into the coefficients and only multiply the ratios of the
+        # non-constant factors
+        const_vals = basis_vals_1d[:, 0, 0].copy()
+        basis_vals_1d = np.ascontiguousarray(basis_vals_1d.transpose(2, 0, 1))
+        values[lb:ub] = _evaluate_multivariate_orthonormal_polynomial_expansion(
+            active_vars, active_degrees, offsets, basis_vals_1d, const_vals,
+            coefficients*np.prod(const_vals))
+    return values
+
+
+@njit(cache=True, parallel=True)
+def _evaluate_multivariate_orthonormal_polynomial_expansion_gradients(
+        active_vars, active_degrees, offsets, basis_vals_1d, deriv_offsets,
+        const_vals, coefficients):
+    num_samples, num_vars = basis_vals_1d.shape[:2]
+    num_indices, num_qoi = coefficients.shape
+    grads = np.zeros((num_samples, num_vars, num_qoi), dtype=np.double)
+    for ii in prange(num_samples):
+        prefix = np.empty(num_vars, dtype=np.double)
+        for kk in range(num_indices):
+            # product of the non-constant factors preceding each factor
+            basis_val = 1.
+            for jj in range(offsets[kk], offsets[kk+1]):
+                prefix[jj-offsets[kk]] = basis_val
+                basis_val *= basis_vals_1d[
+                    ii, active_vars[jj], active_degrees[jj]]/const_vals[
+                        active_vars[jj]]
+            # multiply by the product of the factors following each factor
+            suffix = 1.
+            for jj in range(offsets[kk+1]-1, offsets[kk]-1, -1):
+                dd = active_vars[jj]
+                deriv = prefix[jj-offsets[kk]]*suffix*basis_vals_1d[
+                    ii, dd, deriv_offsets[dd]+active_degrees[jj]]/const_vals[
+                        dd]
+                suffix *= basis_vals_1d[ii, dd, active_degrees[jj]]/const_vals[
+                    dd]
+                for qq in range(num_qoi):
+                    grads[ii, dd, qq] += deriv*coefficients[kk, qq]
+    return grads
+
+
+def evaluate_multivariate_orthonormal_polynomial_expansion_gradients(
+        samples, indices, recursion_coeffs, coefficients,
+        basis_type_index_map=None, max_num_samples_per_chunk=1000):
+    """
+    Evaluate the gradients of a multivariate orthonormal polynomial
+    expansion without forming the derivatives of its basis.
+
+    The derivative of each term with respect to each of its non-constant
+    factors is computed from the products of the preceding and following
+    factors so the cost of each term is proportional to its number of
+    non-zero degrees. The memory required is
+    O(max_num_samples_per_chunk*num_vars*(max_degree+1)).
+
+    Parameters
+    ----------
+    samples : np.ndarray (num_vars, num_samples)
+        Samples at which to evaluate the gradients
+
+    indices : np.ndarray (num_vars, num_indices)
+        The degrees of each polynomial term
+
+    recursion_coeffs : np.ndarray (num_coefs, 2) or list
+        The recursion coefficients of the univariate polynomials. A list
+        must be used with basis_type_index_map
+
+    coefficients : np.ndarray (num_indices, num_qoi)
+        The coefficients of each polynomial term
+
+    max_num_samples_per_chunk : integer
+        The maximum number of samples for which the univariate basis values
+        are stored at any one time
+
+    Returns
+    -------
+    grads : np.ndarray (num_samples, num_vars, num_qoi)
+        The gradients of each quantity of interest at the samples
+    """
+    num_vars, num_samples = samples.shape
+    assert coefficients.ndim == 2
+    assert coefficients.shape[0] == indices.shape[1]
+    active_vars, active_degrees, offsets = get_sparse_indices(indices)
+    coefficients = np.ascontiguousarray(coefficients, dtype=np.double)
+    # derivatives are stored immediately after values in basis_vals_1d
+    deriv_offsets = indices.max(axis=1).astype(np.int64)+1
+    grads = np.empty((num_samples, num_vars, coefficients.shape[1]))
+    for lb in range(0, num_samples, max_num_samples_per_chunk):
+        ub = min(lb+max_num_samples_per_chunk, num_samples)
+        basis_vals_1d = \
+            precompute_multivariate_orthonormal_polynomial_univariate_values(
+                samples[:, lb:ub], indices, recursion_coeffs, 1,
+                basis_type_index_map)
+        const_vals = basis_vals_1d[:, 0, 0].copy()
+        basis_vals_1d = np.ascontiguousarray(basis_vals_1d.transpose(2, 0, 1))
+        grads[lb:ub] = \
+            _evaluate_multivariate_orthonormal_polynomial_expansion_gradients(
+                active_vars, active_degrees, offsets, basis_vals_1d,
+                deriv_offsets, const_vals, coefficients*np.prod(const_vals))
+    return grads
+
+
 class PolynomialChaosExpansion(object):
     """
     Notes
@@ -257,32 +538,24 @@ class PolynomialChaosExpansion(object):
     def __init__(self):
         self.coefficients = None
         self.indices = None
+        self._index_prefix_tree = None
         self.recursion_coeffs = []
         self.basis_type_index_map = None
         self.basis_type_var_indices = []
         self.numerically_generated_poly_accuracy_tolerance = None
 
     def __mul__(self, other):
-        if self.indices.shape[1] > other.indices.shape[1]:
-            poly1 = self
-            poly2 = other
-        else:
-            poly1 = other
-            poly2 = self
-        poly1 = copy.deepcopy(poly1)
-        poly2 = copy.deepcopy(poly2)
-        max_degrees1 = poly1.indices.max(axis=1)
-        max_degrees2 = poly2.indices.max(axis=1)
-        # print('###')
-        # print(max_degrees1,max_degrees2)
-        product_coefs_1d = compute_product_coeffs_1d_for_each_variable(
-            poly1, max_degrees1, max_degrees2)
-        # print(product_coefs_1d)
-
-        indices, coefs = multiply_multivariate_orthonormal_polynomial_expansions(
-            product_coefs_1d, poly1.get_indices(), poly1.get_coefficients(),
-            poly2.get_indices(), poly2.get_coefficients())
-        # get_polynomial_from_variable(self.var_trans.variable)
+        max_degrees = np.maximum(
+            self.indices.max(axis=1), other.indices.max(axis=1))
+        product_tables = compute_orthonormal_basis_product_tables(
+            self, max_degrees)
+        return self._multiply(other, product_tables)
+
+    def _multiply(self, other, product_tables):
+        indices, coefs = \
+            multiply_multivariate_orthonormal_polynomial_expansions_sparse(
+                product_tables, self.get_indices(), self.get_coefficients(),
+                other.get_indices(), other.get_coefficients())
         poly = copy.deepcopy(self)
         poly.set_indices(indices)
         poly.set_coefficients(coefs)
@@ -314,8 +587,11 @@ class PolynomialChaosExpansion(object):
             return poly
 
         poly = copy.deepcopy(self)
+        # compute the univariate products needed by all multiplications once
+        product_tables = compute_orthonormal_basis_product_tables(
+            self, (order-1)*self.indices.max(axis=1))
         for ii in range(2, order+1):
-            poly = poly*self
+            poly = poly._multiply(self, product_tables)
         return poly
 
     # def substitute(self, other):
@@ -386,6 +662,7 @@ class PolynomialChaosExpansion(object):
             indices = indices.reshape((1, indices.shape[0]))
 
         self.indices = indices
+        self._index_prefix_tree = None
         assert indices.shape[0] == self.num_vars()
         max_degree = indices.max(axis=1)
         if np.any(self.max_degree < max_degree):
@@ -405,12 +682,28 @@ class PolynomialChaosExpansion(object):
                 basis_matrix[samples.shape[1]:, :])
         return basis_matrix
 
+    def get_index_prefix_tree(self):
+        """
+        Return the prefix tree of the indices, see
+        :func:`pyapprox.indexing.get_index_prefix_tree`. The tree is only
+        built once for each set of indices.
+        """
+        # the indices may have been assigned without calling set_indices
+        cache = getattr(self, '_index_prefix_tree', None)
+        if cache is None or cache[0] is not self.indices:
+            cache = (self.indices, get_index_prefix_tree(self.indices))
+            self._index_prefix_tree = cache
+        return cache[1]
+
     def canonical_basis_matrix(self, canonical_samples, opts=dict()):
         deriv_order = opts.get('deriv_order', 0)
         if self.recursion_coeffs[0] is not None:
+            prefix_tree = None
+            if _use_index_prefix_tree(self.num_vars(), deriv_order):
+                prefix_tree = self.get_index_prefix_tree()
             basis_matrix = evaluate_multivariate_orthonormal_polynomial(
                 canonical_samples, self.indices, self.recursion_coeffs,
-                deriv_order, self.basis_type_index_map)
+                deriv_order, self.basis_type_index_map, prefix_tree)
         else:
             basis_matrix = monomial_basis_matrix(
                 self.indices, canonical_samples, deriv_order)
@@ -418,10 +711,43 @@ class PolynomialChaosExpansion(object):
 
     def jacobian(self, sample):
         assert sample.shape[1] == 1
-        derivative_matrix = self.basis_matrix(
-            sample, {'deriv_order': 1})[1:]
-        jac = derivative_matrix.dot(self.coefficients).T
-        return jac
+        return self.gradients(sample)[0].T
+
+    def gradients(self, samples):
+        """
+        Evaluate the gradients of the expansion at a set of samples.
+
+        Parameters
+        ----------
+        samples : np.ndarray (num_vars, num_samples)
+            Samples at which to evaluate the gradients
+
+        Returns
+        -------
+        grads : np.ndarray (num_samples, num_vars, num_qoi)
+            The gradients of each quantity of interest at the samples
+        """
+        return self._gradients(samples, self.coefficients)
+
+    def _gradients(self, samples, coefficients):
+        assert samples.ndim == 2
+        assert samples.shape[0] == self.num_vars()
+        num_vars, num_samples = samples.shape
+        if self.recursion_coeffs[0] is None:
+            derivative_matrix = self.basis_matrix(
+                samples, {'deriv_order': 1})[num_samples:]
+            return derivative_matrix.dot(coefficients).reshape(
+                num_vars, num_samples, coefficients.shape[1]).transpose(
+                    1, 0, 2)
+        canonical_samples = self.var_trans.map_to_canonical_space(samples)
+        grads = evaluate_multivariate_orthonormal_polynomial_expansion_gradients(
+            canonical_samples, self.indices, self.recursion_coeffs,
+            coefficients, self.basis_type_index_map)
+        # apply the chain rule using the layout expected by the
+        # variable transformation
+        grads = self.var_trans.map_derivatives_from_canonical_space(
+            grads.transpose(1, 0, 2).reshape(num_vars*num_samples, -1))
+        return grads.reshape(num_vars, num_samples, -1).transpose(1, 0, 2)
 
     def set_coefficients(self, coefficients):
         assert coefficients.ndim == 2
@@ -437,8 +763,15 @@ class PolynomialChaosExpansion(object):
         return self.indices.copy()
 
     def value(self, samples):
-        basis_matrix = self.basis_matrix(samples)
-        return np.dot(basis_matrix, self.coefficients)
+        if self.recursion_coeffs[0] is None:
+            basis_matrix = self.basis_matrix(samples)
+            return np.dot(basis_matrix, self.coefficients)
+        assert samples.ndim == 2
+        assert samples.shape[0] == self.num_vars()
+        canonical_samples = self.var_trans.map_to_canonical_space(samples)
+        return evaluate_multivariate_orthonormal_polynomial_expansion(
+            canonical_samples, self.indices, self.recursion_coeffs,
+            self.coefficients, self.basis_type_index_map)
 
     def num_vars(self):
         return self.var_trans.num_vars()
@@ -489,6 +822,132 @@ class PolynomialChaosExpansion(object):
         return self.indices.shape[1]
 
 
+class BasisMatrixCache(object):
+    """
+    Cache the columns of the basis matrix of a polynomial chaos expansion
+    evaluated at a set of training samples.
+
+    Only the columns of indices that have not been requested previously are
+    evaluated. The basis matrix of any set of indices is assembled by
+    gathering the cached columns, so fitting expansions with overlapping
+    index sets, e.g. when selecting the degree or expanding the basis,
+    only requires evaluating the new columns.
+
+    Parameters
+    ----------
+    pce : :class:`pyapprox.multivariate_polynomials.PolynomialChaosExpansion`
+        The expansion used to evaluate the basis. The indices of the
+        expansion are restored after new columns are evaluated
+
+    samples : np.ndarray (num_vars, num_samples)
+        The training samples
+
+    canonical : boolean
+        True - samples are in the canonical space
+        False - samples are in the user space
+    """
+    def __init__(self, pce, samples, canonical=False):
+        self.pce = pce
+        self.canonical = canonical
+        self.samples = samples.copy()
+        self.indices = np.empty((pce.num_vars(), 0), dtype=np.int64)
+        self.indices_dict = dict()
+        # store columns contiguously and grow geometrically so appending
+        # columns has amortized cost proportional to the new columns
+        self.columns = np.empty((samples.shape[1], 0), order='F')
+
+    def _basis_matrix(self, samples, indices):
+        prev_indices = self.pce.indices
+        self.pce.set_indices(indices)
+        if self.canonical:
+            basis_matrix = self.pce.canonical_basis_matrix(samples)
+        else:
+            basis_matrix = self.pce.basis_matrix(samples)
+        self.pce.indices = prev_indices
+        return basis_matrix
+
+    def num_columns(self):
+        return self.indices.shape[1]
+
+    def add_indices(self, indices):
+        """
+        Evaluate the columns of any indices not already in the cache.
+        """
+        indices = indices.astype(self.indices.dtype, copy=False)
+        new_ids = []
+        for jj, key in enumerate(hash_array_columns(indices)):
+            if key not in self.indices_dict:
+                self.indices_dict[key] = self.num_columns()+len(new_ids)
+                new_ids.append(jj)
+        if len(new_ids) == 0:
+            return
+        new_indices = indices[:, new_ids]
+        num_columns = self.num_columns()+new_indices.shape[1]
+        if num_columns > self.columns.shape[1]:
+            columns = np.empty(
+                (self.samples.shape[1], max(num_columns,
+                                            2*self.columns.shape[1])),
+                order='F')
+            columns[:, :self.num_columns()] = \
+                self.columns[:, :self.num_columns()]
+            self.columns = columns
+        if self.samples.shape[1] > 0:
+            self.columns[:, self.num_columns():num_columns] = \
+                self._basis_matrix(self.samples, new_indices)
+        self.indices = np.hstack([self.indices, new_indices])
+
+    def update_samples(self, samples):
+        """
+        Update the training samples. If the current samples are the first
+        samples in ``samples`` only the rows of the new samples are
+        evaluated, otherwise the cache is cleared.
+        """
+        num_samples = self.samples.shape[1]
+        if (samples.shape[1] < num_samples or
+                not np.array_equal(samples[:, :num_samples], self.samples)):
+            self.__init__(self.pce, samples, self.canonical)
+            return
+        if samples.shape[1] == num_samples:
+            return
+        new_samples = samples[:, num_samples:]
+        columns = np.empty(
+            (samples.shape[1], self.columns.shape[1]), order='F')
+        columns[:num_samples] = self.columns
+        if self.num_columns() > 0:
+            columns[num_samples:, :self.num_columns()] = self._basis_matrix(
+                new_samples, self.indices)
+        self.columns = columns
+        self.samples = samples.copy()
+
+    def __call__(self, indices):
+        """
+        Return the basis matrix of a set of indices at the training samples.
+
+        Parameters
+        ----------
+        indices : np.ndarray (num_vars, num_indices)
+            The indices of the basis
+
+        Returns
+        -------
+        basis_matrix : np.ndarray (num_samples, num_indices)
+            The basis matrix
+        """
+        column_ids = self.get_column_ids(indices)
+        return self.columns[:, column_ids]
+
+    def get_column_ids(self, indices):
+        """
+        Return the columns of the cache that store the basis of a set of
+        indices. Columns are evaluated for indices not already in the cache.
+        """
+        indices = indices.astype(self.indices.dtype, copy=False)
+        self.add_indices(indices)
+        return np.array(
+            [self.indices_dict[key] for key in hash_array_columns(indices)],
+            dtype=np.int64)
+
+
 def get_univariate_quadrature_rules_from_pce(pce, degrees):
     num_vars = pce.num_vars()
     degrees = np.atleast_1d(degrees)
@@ -808,6 +1267,293 @@ def multiply_multivariate_orthonormal_polynomial_expansions(
 
     indices, coefs = add_polynomials(basis_indices, basis_coefs)
     return indices, coefs
+
+
+def compute_univariate_orthonormal_basis_product_table(
+        recursion_coefs, max_degree, tol=1e-12):
+    r"""
+    Compute the coefficients of the expansions, in the orthonormal basis,
+    of the products of all pairs of univariate orthonormal polynomials
+    with degree at most max_degree.
+
+    The coefficient of :math:`\phi_k` in :math:`\phi_i\phi_j` is
+    :math:`\int\phi_i\phi_j\phi_k\,d\mu` which is computed exactly
+    using Gauss quadrature. The coefficient is zero unless
+    :math:`|i-j|\le k\le i+j`. Coefficients smaller than tol times the
+    largest coefficient of the same product are the result of round-off,
+    e.g. products that are zero by symmetry, and are not stored.
+
+    Parameters
+    ----------
+    recursion_coefs : np.ndarray (num_recursion_coeffs, 2)
+        The recursion coefficients. num_recursion_coeffs > 2*max_degree
+
+    max_degree : integer
+        The maximum degree of the polynomials being multiplied
+
+    Returns
+    -------
+    offsets : np.ndarray ((max_degree+1)**2+1)
+        The nonzero coefficients of the product of the degree i and j
+        polynomials are stored in entries
+        offsets[kk]:offsets[kk+1] of degrees and coefs where
+        kk=i*(max_degree+1)+j
+
+    degrees : np.ndarray (num_nonzeros)
+        The degrees of the polynomials in each product expansion
+
+    coefs : np.ndarray (num_nonzeros)
+        The coefficients of the polynomials in each product expansion
+    """
+    num_quad_points = 2*max_degree+1
+    x_quad, w_quad = gauss_quadrature(recursion_coefs, num_quad_points)
+    ortho_basis_matrix = evaluate_orthonormal_polynomial_1d(
+        x_quad, 2*max_degree, recursion_coefs)
+    basis_matrix = ortho_basis_matrix[:, :max_degree+1]
+    table = np.einsum('q,qi,qj,qk->ijk', w_quad, basis_matrix, basis_matrix,
+                      ortho_basis_matrix)
+    degrees_1d = np.arange(max_degree+1)
+    degrees_sum = degrees_1d[:, None]+degrees_1d[None, :]
+    degrees_diff = np.absolute(degrees_1d[:, None]-degrees_1d[None, :])
+    degrees_prod = np.arange(2*max_degree+1)
+    table[(degrees_prod[None, None, :] > degrees_sum[:, :, None]) |
+          (degrees_prod[None, None, :] < degrees_diff[:, :, None])] = 0.
+    table = table.reshape((max_degree+1)**2, 2*max_degree+1)
+    abs_table = np.absolute(table)
+    rows, degrees = np.nonzero(
+        abs_table > tol*abs_table.max(axis=1)[:, None])
+    offsets = np.zeros(table.shape[0]+1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(rows, minlength=table.shape[0]))
+    return offsets, degrees.astype(np.int64), table[rows, degrees]
+
+
+def compute_orthonormal_basis_product_tables(poly, max_degrees):
+    r"""
+    Compute the univariate product tables, see
+    :func:`compute_univariate_orthonormal_basis_product_table`, needed to
+    multiply expansions with the basis of poly. One table is computed
+    for each type of univariate basis.
+
+    Parameters
+    ----------
+    poly : :class:`pyapprox.multivariate_polynomials.PolynomialChaosExpansion`
+        A polynomial chaos expansion with the basis of the factors
+
+    max_degrees : np.ndarray (num_vars)
+        The maximum degree of each variable in the factors
+
+    Returns
+    -------
+    product_tables : tuple
+        The arguments passed to
+        :func:`multiply_multivariate_orthonormal_polynomial_expansions_sparse`
+    """
+    # do not change the recursion coefficients of poly
+    poly = copy.deepcopy(poly)
+    num_vars = poly.num_vars()
+    basis_types = np.unique(poly.basis_type_index_map)
+    max_degrees_per_type = np.zeros(basis_types.max()+1, dtype=np.int64)
+    for dd in range(num_vars):
+        tt = poly.basis_type_index_map[dd]
+        max_degrees_per_type[tt] = max(
+            max_degrees_per_type[tt], max_degrees[dd])
+    poly.update_recursion_coefficients(
+        2*max_degrees_per_type[poly.basis_type_index_map]+1, poly.config_opts)
+
+    table_starts = np.zeros(max_degrees_per_type.shape[0], dtype=np.int64)
+    table_offsets, table_degrees, table_coefs = [np.zeros(1, np.int64)], [], []
+    num_rows, num_nonzeros = 0, 0
+    for tt in basis_types:
+        offsets, degrees, coefs = \
+            compute_univariate_orthonormal_basis_product_table(
+                poly.recursion_coeffs[tt], max_degrees_per_type[tt])
+        table_starts[tt] = num_rows
+        table_offsets.append(offsets[1:]+num_nonzeros)
+        table_degrees.append(degrees)
+        table_coefs.append(coefs)
+        num_rows += offsets.shape[0]-1
+        num_nonzeros += offsets[-1]
+    return (poly.basis_type_index_map.astype(np.int64), table_starts,
+            max_degrees_per_type+1, np.hstack(table_offsets),
+            np.hstack(table_degrees), np.hstack(table_coefs))
+
+
+@njit(cache=True)
+def _hash_index(index):
+    # FNV-1a hash
+    key = np.uint64(14695981039346656037)
+    for dd in range(index.shape[0]):
+        key ^= np.uint64(index[dd])
+        key *= np.uint64(1099511628211)
+    return key
+
+
+@njit(cache=True)
+def _find_index(index, hash_table, indices):
+    """
+    Return the slot of the hash table that contains or will contain the
+    row of indices equal to index and the row, or -1 if not present
+    """
+    mask = hash_table.shape[0]-1
+    slot = np.int64(_hash_index(index) & np.uint64(mask))
+    while True:
+        row = hash_table[slot]
+        if row == -1:
+            return slot, row
+        found = True
+        for dd in range(index.shape[0]):
+            if indices[row, dd] != index[dd]:
+                found = False
+                break
+        if found:
+            return slot, row
+        slot = (slot+1) & mask
+
+
+@njit(cache=True)
+def _multiply_multivariate_orthonormal_polynomial_expansions(
+        indices1, coefs1, indices2, coefs2, basis_type_index_map,
+        table_starts, table_strides, table_offsets, table_degrees,
+        table_coefs, tol):
+    num_vars, num_indices1 = indices1.shape
+    num_indices2 = indices2.shape[1]
+    num_qoi = coefs1.shape[1]
+    # the coefficients of the products of the constant polynomials
+    const_coefs = np.empty(num_vars)
+    for dd in range(num_vars):
+        row = table_starts[basis_type_index_map[dd]]
+        const_coefs[dd] = 0.
+        if table_offsets[row+1] > table_offsets[row]:
+            if table_degrees[table_offsets[row]] == 0:
+                const_coefs[dd] = table_coefs[table_offsets[row]]
+
+    capacity = 64
+    prod_indices = np.zeros((capacity, num_vars), dtype=np.int64)
+    prod_coefs = np.zeros((capacity, num_qoi))
+    hash_table = np.full(2*capacity, -1, dtype=np.int64)
+    num_prod_indices = 0
+
+    active_vars = np.empty(num_vars, dtype=np.int64)
+    lbs = np.empty(num_vars, dtype=np.int64)
+    ubs = np.empty(num_vars, dtype=np.int64)
+    pos = np.empty(num_vars, dtype=np.int64)
+    index = np.zeros(num_vars, dtype=np.int64)
+    for ii in range(num_indices1):
+        for jj in range(num_indices2):
+            num_active_vars = 0
+            const_coef = 1.
+            for dd in range(num_vars):
+                deg1, deg2 = indices1[dd, ii], indices2[dd, jj]
+                if deg1+deg2 == 0:
+                    const_coef *= const_coefs[dd]
+                    continue
+                tt = basis_type_index_map[dd]
+                row = table_starts[tt]+deg1*table_strides[tt]+deg2
+                active_vars[num_active_vars] = dd
+                lbs[num_active_vars] = table_offsets[row]
+                ubs[num_active_vars] = table_offsets[row+1]
+                pos[num_active_vars] = table_offsets[row]
+                num_active_vars += 1
+
+            index[:] = 0
+            # loop over the tensor product of the univariate expansions
+            while True:
+                basis_coef = const_coef
+                for kk in range(num_active_vars):
+                    index[active_vars[kk]] = table_degrees[pos[kk]]
+                    basis_coef *= table_coefs[pos[kk]]
+
+                if abs(basis_coef) > tol:
+                    slot, row = _find_index(index, hash_table, prod_indices)
+                    if row == -1:
+                        if num_prod_indices == capacity:
+                            capacity *= 2
+                            new_prod_indices = np.zeros(
+                                (capacity, num_vars), dtype=np.int64)
+                            new_prod_indices[:num_prod_indices] = prod_indices
+                            prod_indices = new_prod_indices
+                            new_prod_coefs = np.zeros((capacity, num_qoi))
+                            new_prod_coefs[:num_prod_indices] = prod_coefs
+                            prod_coefs = new_prod_coefs
+                            hash_table = np.full(
+                                2*capacity, -1, dtype=np.int64)
+                            for rr in range(num_prod_indices):
+                                hash_table[_find_index(
+                                    prod_indices[rr], hash_table,
+                                    prod_indices)[0]] = rr
+                            slot = _find_index(
+                                index, hash_table, prod_indices)[0]
+                        row = num_prod_indices
+                        prod_indices[row] = index
+                        hash_table[slot] = row
+                        num_prod_indices += 1
+                    for qq in range(num_qoi):
+                        prod_coefs[row, qq] += (
+                            basis_coef*coefs1[ii, qq]*coefs2[jj, qq])
+
+                kk = 0
+                while kk < num_active_vars:
+                    pos[kk] += 1
+                    if pos[kk] < ubs[kk]:
+                        break
+                    pos[kk] = lbs[kk]
+                    kk += 1
+                if kk == num_active_vars:
+                    break
+    return prod_indices[:num_prod_indices].T.copy(), \
+        prod_coefs[:num_prod_indices]
+
+
+def multiply_multivariate_orthonormal_polynomial_expansions_sparse(
+        product_tables, poly_indices1, poly_coefficients1, poly_indices2,
+        poly_coefficients2, tol=2*np.finfo(float).eps):
+    r"""
+    Multiply two multivariate orthonormal polynomial expansions.
+
+    The product of each pair of terms is the tensor product of the
+    univariate product expansions stored in product_tables. The terms of
+    each product are accumulated in a hash table keyed by their indices so
+    the cost is proportional to the number of nonzero terms generated and
+    not the size of a dense index set.
+
+    Parameters
+    ----------
+    product_tables : tuple
+        The univariate product tables returned by
+        :func:`compute_orthonormal_basis_product_tables` for maximum degrees
+        at least as large as the degrees of both expansions
+
+    poly_indices1 : np.ndarray (num_vars, num_indices1)
+        The indices of the first expansion
+
+    poly_coefficients1 : np.ndarray (num_indices1, num_qoi)
+        The coefficients of the first expansion
+
+    poly_indices2 : np.ndarray (num_vars, num_indices2)
+        The indices of the second expansion
+
+    poly_coefficients2 : np.ndarray (num_indices2, num_qoi)
+        The coefficients of the second expansion
+
+    Returns
+    -------
+    indices : np.ndarray (num_vars, num_indices)
+        The indices of the product
+
+    coefs : np.ndarray (num_indices, num_qoi)
+        The coefficients of the product
+    """
+    assert poly_coefficients1.shape[0] == poly_indices1.shape[1]
+    assert poly_coefficients2.shape[0] == poly_indices2.shape[1]
+    assert poly_coefficients1.shape[1] == poly_coefficients2.shape[1]
+    basis_type_index_map, table_starts, table_strides = product_tables[:3]
+    for dd in range(poly_indices1.shape[0]):
+        assert max(poly_indices1[dd].max(), poly_indices2[dd].max()) < \
+            table_strides[basis_type_index_map[dd]]
+    return _multiply_multivariate_orthonormal_polynomial_expansions(
+        poly_indices1.astype(np.int64), poly_coefficients1.astype(float),
+        poly_indices2.astype(np.int64), poly_coefficients2.astype(float),
+        *product_tables, tol)
     
     
     
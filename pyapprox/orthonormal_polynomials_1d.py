@@ -1,8 +1,7 @@
 from pyapprox.manipulate_polynomials import shift_momomial_expansion
 from scipy.sparse import diags as sparse_diags
-from numba import jit, njit
-from numba.extending import get_cython_function_address
-import ctypes
+from numba import njit, prange
+import math
 import numpy as np
 from scipy import special as sp
 from pyapprox.numerically_generate_orthonormal_polynomials_1d import lanczos, \
@@ -299,113 +298,28 @@ def hermite_recurrence(Nterms, rho=0., probability=True):
 
 
 def evaluate_orthonormal_polynomial_1d(x, nmax, ab):
-    try:
-        # necessary when discrete variables are define on integers
-        x = np.asarray(x, dtype=float)
-        from pyapprox.cython.orthonormal_polynomials_1d import \
-            evaluate_orthonormal_polynomial_1d_pyx
-        return evaluate_orthonormal_polynomial_1d_pyx(x, nmax, ab)
-        # from pyapprox.weave import c_evaluate_orthonormal_polynomial
-        # return c_evaluate_orthonormal_polynomial_1d(x, nmax, ab)
-    except Exception as e:
-        print('evaluate_orthornormal_polynomial_1d extension failed')
-    return __evaluate_orthonormal_polynomial_1d(x, nmax, ab)
-
-
-def evaluate_orthonormal_polynomial_deriv_1d(x, nmax, ab, deriv_order):
-    # filter out cython warnings.
-    import warnings
-    warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
-    #warnings.filterwarnings("ignore", message="numpy.dtype size changed")
-    #warnings.filterwarnings("ignore", message="numpy.ndarray size changed")
-
-    x = np.asarray(x, dtype=float)
-    from pyapprox.cython.orthonormal_polynomials_1d import \
-        evaluate_orthonormal_polynomial_deriv_1d_pyx
-    return evaluate_orthonormal_polynomial_deriv_1d_pyx(
-        x, nmax, ab, deriv_order)
-
-    try:
-        # necessary when discrete variables are define on integers
-        x = np.asarray(x, dtype=float)
-        from pyapprox.cython.orthonormal_polynomials_1d import \
-            evaluate_orthonormal_polynomial_deriv_1d_pyx
-        return evaluate_orthonormal_polynomial_deriv_1d_pyx(
-            x, nmax, ab, deriv_order)
-    except:
-        print('evaluate_orthonormal_polynomial_deriv_1d_pyx extension failed')
-    return __evaluate_orthonormal_polynomial_deriv_1d
-
-
-_PTR = ctypes.POINTER
-_dble = ctypes.c_double
-_ptr_dble = _PTR(_dble)
-
-addr = get_cython_function_address("scipy.special.cython_special", "gammaln")
-functype = ctypes.CFUNCTYPE(_dble, _dble)
-gammaln_float64 = functype(addr)
-
-
-@njit
-def numba_gammaln(x):
-    return gammaln_float64(x)
-
-
-@jit(nopython=True)
-def __evaluate_orthonormal_polynomial_1d(x, nmax, ab):
-    r""" 
+    r"""
     Evaluate univariate orthonormal polynomials using their
     three-term recurrence coefficients.
 
-    The the degree-n orthonormal polynomial p_n(x) is associated with
-    the recurrence coefficients a, b (with positive leading coefficient)
-    satisfy the recurrences
-
-    .. math:: b_{n+1} p_{n+1} = (x - a_n) p_n - \sqrt{b_n} p_{n-1}
-
-    This assumes that the orthonormal recursion coefficients satisfy
-
-    .. math:: b_{n+1} = \sqrt{\hat{b}_{n+1}}
-
-    where :math:`\hat{b}_{n+1}` are the orthogonal recursion coefficients.
-
-    Parameters
-    ----------
-    x : np.ndarray (num_samples)
-       The samples at which to evaluate the polynomials
-
-    nmax : integer
-       The maximum degree of the polynomials to be evaluated
-
-    ab : np.ndarray (num_recusion_coeffs,2)
-       The recursion coefficients. num_recusion_coeffs>degree
+    See :func:`evaluate_orthonormal_polynomial_deriv_1d`
 
     Returns
     -------
     p : np.ndarray (num_samples, nmax+1)
        The values of the polynomials
     """
-    assert ab.shape[1] == 2
-    assert nmax < ab.shape[0]
-
-    p = np.zeros((x.shape[0], nmax+1))  # must be initialized to zero
-
-    p[:, 0] = 1/ab[0, 1]
-
-    if nmax > 0:
-        p[:, 1] = 1/ab[1, 1] * ((x - ab[0, 0])*p[:, 0])
+    return evaluate_orthonormal_polynomial_deriv_1d(x, nmax, ab, 0)
 
-    for jj in range(2, nmax+1):
-        p[:, jj] = 1.0/ab[jj, 1]*(
-            (x-ab[jj-1, 0])*p[:, jj-1]-ab[jj-1, 1]*p[:, jj-2])
 
-    return p
+# The minimum number of samples for which the polynomials are evaluated
+# using multiple threads
+MIN_NUM_SAMPLES_PARALLEL_1D = 10000
 
 
-@jit(nopython=True)
-def __evaluate_orthonormal_polynomial_deriv_1d(x, nmax, ab, deriv_order):
-    r""" 
-    Evaluate the univariate orthonormal polynomials and its s-derivatives 
+def evaluate_orthonormal_polynomial_deriv_1d(x, nmax, ab, deriv_order):
+    r"""
+    Evaluate the univariate orthonormal polynomials and its s-derivatives
     (s=1,...,num_derivs) using a three-term recurrence coefficients.
 
     The the degree-n orthonormal polynomial p_n(x) is associated with
@@ -420,6 +334,14 @@ def __evaluate_orthonormal_polynomial_deriv_1d(x, nmax, ab, deriv_order):
 
     where :math:`\hat{b}_{n+1}` are the orthogonal recursion coefficients.
 
+    Differentiating the recurrence s times gives
+
+    .. math:: b_{n+1} p^{(s)}_{n+1} = (x - a_n) p^{(s)}_n - \sqrt{b_n} p^{(s)}_{n-1} + s p^{(s-1)}_n
+
+    which is evaluated for each sample in compiled code. The samples are
+    distributed across threads when there are at least
+    ``MIN_NUM_SAMPLES_PARALLEL_1D`` samples.
+
     Parameters
     ----------
     x : np.ndarray (num_samples)
@@ -429,45 +351,131 @@ def __evaluate_orthonormal_polynomial_deriv_1d(x, nmax, ab, deriv_order):
        The maximum degree of the polynomials to be evaluated
 
     ab : np.ndarray (num_recursion_coeffs,2)
-       The recursion coefficients
+       The recursion coefficients. num_recursion_coeffs>nmax
 
     deriv_order : integer
        The maximum order of the derivatives to evaluate.
 
     Returns
     -------
-    p : np.ndarray (num_samples, (deriv_num+1)*num_indices)
+    p : np.ndarray (num_samples, (deriv_order+1)*(nmax+1))
        The values of the 0th to s-th derivative of the polynomials
     """
-    num_samples = x.shape[0]
+    # necessary when discrete variables are define on integers
+    x = np.asarray(x, dtype=float)
+    assert ab.shape[1] == 2
+    assert nmax < ab.shape[0]
+    assert deriv_order >= 0
+    if x.shape[0] >= MIN_NUM_SAMPLES_PARALLEL_1D:
+        return _evaluate_orthonormal_polynomial_deriv_1d_parallel(
+            x, nmax, ab, deriv_order)
+    return _evaluate_orthonormal_polynomial_deriv_1d_serial(
+        x, nmax, ab, deriv_order)
+
+
+@njit(cache=True)
+def get_orthonormal_polynomial_deriv_1d_initial_values(nmax, ab, deriv_order):
+    r"""
+    Return the s-th derivatives of the degree-s orthonormal polynomials,
+    which are the constants :math:`s!/(b_0\cdots b_s)`, for
+    s=1,...,min(deriv_order, nmax).
+    The first entry is unused.
+    """
+    init_vals = np.zeros(deriv_order+1)
+    log_bsum = np.log(np.absolute(ab[0, 1]))
+    for deriv_num in range(1, min(deriv_order, nmax)+1):
+        log_bsum += np.log(np.absolute(ab[deriv_num, 1]))
+        # use logarithms to avoid overflow
+        init_vals[deriv_num] = np.exp(math.lgamma(deriv_num+1)-log_bsum)
+    return init_vals
+
+
+@njit(cache=True)
+def _evaluate_orthonormal_polynomial_deriv_1d_sample(
+        x, nmax, ab, deriv_order, init_vals, vals):
     num_indices = nmax+1
-    a = ab[:, 0]
-    b = ab[:, 1]
-    result = np.empty((num_samples, num_indices*(deriv_order+1)))
-    p = __evaluate_orthonormal_polynomial_1d(x, nmax, ab)
-    result[:, :num_indices] = p
+    vals[0] = 1/ab[0, 1]
+    if nmax > 0:
+        vals[1] = 1/ab[1, 1]*((x-ab[0, 0])*vals[0])
+    for jj in range(2, num_indices):
+        vals[jj] = 1.0/ab[jj, 1]*(
+            (x-ab[jj-1, 0])*vals[jj-1]-ab[jj-1, 1]*vals[jj-2])
 
     for deriv_num in range(1, deriv_order+1):
-        pd = np.zeros((num_samples, num_indices))
-        for jj in range(deriv_num, num_indices):
-
-            if (jj == deriv_num):
-                # use following expression to avoid overflow issues when
-                # computing oveflow
-                pd[:, jj] = np.exp(
-                    # sp.gammaln(deriv_num+1)-0.5*np.sum(np.log(b[:jj+1]**2)))
-                    numba_gammaln(deriv_num+1)-0.5*np.sum(np.log(b[:jj+1]**2)))
-            else:
-
-                pd[:, jj] =\
-                    (x-a[jj-1])*pd[:, jj-1]-b[jj-1]*pd[:, jj-2] +\
-                    deriv_num*p[:, jj-1]
-                pd[:, jj] *= 1.0/b[jj]
-        p = pd
-        result[:, deriv_num*num_indices:(deriv_num+1)*num_indices] = p
+        lb = deriv_num*num_indices
+        for jj in range(min(deriv_num, num_indices)):
+            vals[lb+jj] = 0.
+        if deriv_num < num_indices:
+            vals[lb+deriv_num] = init_vals[deriv_num]
+        for jj in range(deriv_num+1, num_indices):
+            vals[lb+jj] = 1.0/ab[jj, 1]*(
+                (x-ab[jj-1, 0])*vals[lb+jj-1]-ab[jj-1, 1]*vals[lb+jj-2] +
+                deriv_num*vals[lb-num_indices+jj-1])
+
+
+@njit(cache=True)
+def _evaluate_orthonormal_polynomial_deriv_1d_serial(
+        x, nmax, ab, deriv_order):
+    init_vals = get_orthonormal_polynomial_deriv_1d_initial_values(
+        nmax, ab, deriv_order)
+    num_samples = x.shape[0]
+    result = np.empty((num_samples, (nmax+1)*(deriv_order+1)))
+    for ii in range(num_samples):
+        _evaluate_orthonormal_polynomial_deriv_1d_sample(
+            x[ii], nmax, ab, deriv_order, init_vals, result[ii])
     return result
 
 
+@njit(cache=True, parallel=True)
+def _evaluate_orthonormal_polynomial_deriv_1d_parallel(
+        x, nmax, ab, deriv_order):
+    init_vals = get_orthonormal_polynomial_deriv_1d_initial_values(
+        nmax, ab, deriv_order)
+    num_samples = x.shape[0]
+    result = np.empty((num_samples, (nmax+1)*(deriv_order+1)))
+    for ii in prange(num_samples):
+        _evaluate_orthonormal_polynomial_deriv_1d_sample(
+            x[ii], nmax, ab, deriv_order, init_vals, result[ii])
+    return result
+
+
+def evaluate_orthonormal_polynomial_deriv_1d_vectorized(
+        x, nmax, ab, deriv_order):
+    r"""
+    Evaluate the univariate orthonormal polynomials and its s-derivatives
+    using NumPy operations vectorized over the samples.
+
+    This is a pure python equivalent of
+    :func:`evaluate_orthonormal_polynomial_deriv_1d` which does not
+    require compilation.
+    """
+    x = np.asarray(x, dtype=float)
+    assert nmax < ab.shape[0]
+    num_samples, num_indices = x.shape[0], nmax+1
+    # s!/(b_0...b_s) computed with logarithms to avoid overflow
+    nderivs = min(deriv_order, nmax)
+    init_vals = np.exp(
+        sp.gammaln(np.arange(1, nderivs+1)+1) -
+        np.cumsum(np.log(np.absolute(ab[:nderivs+1, 1])))[1:])
+    result = np.zeros((deriv_order+1, num_indices, num_samples))
+    p = result[0]
+    p[0] = 1/ab[0, 1]
+    if nmax > 0:
+        p[1] = 1/ab[1, 1]*((x-ab[0, 0])*p[0])
+    for jj in range(2, num_indices):
+        p[jj] = 1.0/ab[jj, 1]*((x-ab[jj-1, 0])*p[jj-1]-ab[jj-1, 1]*p[jj-2])
+
+    for deriv_num in range(1, min(deriv_order, nmax)+1):
+        pd = result[deriv_num]
+        pd[deriv_num] = init_vals[deriv_num-1]
+        for jj in range(deriv_num+1, num_indices):
+            pd[jj] = 1.0/ab[jj, 1]*(
+                (x-ab[jj-1, 0])*pd[jj-1]-ab[jj-1, 1]*pd[jj-2] +
+                deriv_num*result[deriv_num-1, jj-1])
+    return result.reshape(
+        (deriv_order+1)*num_indices, num_samples).T.copy()
+
+
 def gauss_quadrature(recursion_coeffs, N):
     r"""Computes Gauss quadrature from recurrence coefficients
 
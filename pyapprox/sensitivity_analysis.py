@@ -932,7 +932,8 @@ def sampling_based_sobol_indices_from_gaussian_process(
         ngp_realizations=1, normalize=True, nsobol_realizations=1,
         stat_functions=(np.mean, np.median, np.min, np.max),
         ninterpolation_samples=500, nvalidation_samples=100,
-        ncandidate_samples=1000, use_cholesky=True, alpha=0):
+        ncandidate_samples=1000, use_cholesky=True, alpha=0,
+        nrandom_features=None):
     """
     Compute sobol indices from Gaussian process using sampling. 
     This function returns the mean and variance of these values with 
@@ -978,6 +979,11 @@ def sampling_based_sobol_indices_from_gaussian_process(
     ncanidate_samples : integer
         The number of candidate samples selected from when building the 
         interpolants of the random realizations
+
+    nrandom_features : integer
+        If not None evaluate the random realizations using pathwise
+        conditioning of this many random Fourier features instead of
+        interpolating realizations evaluated at a discrete set of points
         
     Returns
     -------
@@ -993,10 +999,12 @@ def sampling_based_sobol_indices_from_gaussian_process(
     assert nsobol_realizations > 0
     
     if ngp_realizations > 0:
-        assert ncandidate_samples > ninterpolation_samples
+        assert (nrandom_features is not None or
+                ncandidate_samples > ninterpolation_samples)
         gp_realizations = generate_gp_realizations(
             gp, ngp_realizations, ninterpolation_samples, nvalidation_samples,
-            ncandidate_samples, variables, use_cholesky, alpha)
+            ncandidate_samples, variables, use_cholesky, alpha,
+            nrandom_features)
         fun = gp_realizations
     else:
         fun = gp
@@ -5,7 +5,9 @@ from pyapprox.indexing import nchoosek, compute_hyperbolic_level_indices, \
     argsort_indices_lexiographically_by_row
 from pyapprox.barycentric_interpolation import compute_barycentric_weights_1d,\
      multivariate_barycentric_lagrange_interpolation, \
-     multivariate_hierarchical_barycentric_lagrange_interpolation
+     multivariate_hierarchical_barycentric_lagrange_interpolation, \
+     barycentric_lagrange_basis_1d
+from numba import njit, prange
 
 
 def get_1d_samples_weights(quad_rules, growth_rules,
@@ -122,11 +124,33 @@ def update_1d_samples_weights(quad_rules,growth_rules,
     return samples_1d, weights_1d
 
 
+def univariate_samples_are_nested(samples_1d):
+    """
+    Return True if the samples of the univariate rule of each level of
+    every variable start with the samples of the previous level.
+
+    Parameters
+    ----------
+    samples_1d : list (num_vars)
+        List of the samples np.ndarray (num_samples_ll) of each level ll
+        of the univariate rule of each variable
+    """
+    for samples_dd in samples_1d:
+        for ll in range(1, len(samples_dd)):
+            num_prev_samples = samples_dd[ll-1].shape[0]
+            if (samples_dd[ll].shape[0] < num_prev_samples or
+                    not np.allclose(samples_dd[ll][:num_prev_samples],
+                                    samples_dd[ll-1])):
+                return False
+    return True
+
 def get_hierarchical_sample_indices(subspace_index,poly_indices,
                                     samples_1d,config_variables_idx):
     """
     This function is useful for obtaining the hierarhical function values of 
-    a subspace
+    a subspace. The univariate rules must be nested, see
+    :func:`univariate_samples_are_nested`, otherwise the samples of a
+    subspace are not a superset of the samples of its backward neighbors
 
     Use this function in the following way
 
@@ -140,28 +164,16 @@ def get_hierarchical_sample_indices(subspace_index,poly_indices,
 
     assert len(samples_1d)==config_variables_idx
 
-    active_vars  = np.where(subspace_index>0)[0]
-    hier_indices = np.empty((num_indices),dtype=int)
-    kk=0
-    for ii in range(num_indices):
-        index = poly_indices[:,ii]
-        found = True
-        for jj in range(len(active_vars)):
-            subspace_level = subspace_index[active_vars[jj]]
-            if active_vars[jj]<config_variables_idx:
-                if subspace_level>0:
-                    idx = samples_1d[active_vars[jj]][subspace_level-1].shape[0]
-                else:
-                    idx=0
-            else:
-                idx=0
-            if index[active_vars[jj]]<idx:
-                found=False
-                break
-        if found:
-            hier_indices[kk] = ii
-            kk+=1
-    return hier_indices[:kk]
+    # the hierarchical samples are those not in the univariate rule of the
+    # previous level in every active random variable
+    active_vars = np.where(subspace_index[:config_variables_idx]>0)[0]
+    num_prev_samples_1d = np.array(
+        [samples_1d[dd][subspace_index[dd]-1].shape[0] for dd in active_vars],
+        dtype=int)
+    hier_indices = np.where(np.all(
+        poly_indices[active_vars]>=num_prev_samples_1d[:,np.newaxis],
+        axis=0))[0]
+    return hier_indices
 
         
 def get_subspace_samples(subspace_index,poly_indices,samples_1d,
@@ -321,6 +333,33 @@ def get_sparse_grid_samples(poly_indices,samples_1d,config_variables_idx=None):
                 samples[jj,ii]=index[jj]
     return samples
 
+@njit(cache=True)
+def _get_smolyak_coefficients(sorted_subspace_indices, levels,
+                              level_change_indices):
+    num_vars, num_subspace_indices = sorted_subspace_indices.shape
+    idx = 0
+    smolyak_coeffs = np.zeros((num_subspace_indices), dtype=np.double)
+    for ii in range(num_subspace_indices):
+        if (idx < levels.shape[0] and
+                sorted_subspace_indices[0, ii] > levels[idx]):
+            idx += 1
+        # only indices whose first entry is at most one level larger
+        # can differ by at most one in every dimension
+        for jj in range(ii, level_change_indices[idx]):
+            diff_sum = 0
+            update = True
+            for kk in range(num_vars):
+                diff = (sorted_subspace_indices[kk, jj] -
+                        sorted_subspace_indices[kk, ii])
+                if diff < 0 or diff > 1:
+                    update = False
+                    break
+                diff_sum += diff
+            if update:
+                smolyak_coeffs[ii] += (-1.)**diff_sum
+    return smolyak_coeffs
+
+
 def get_smolyak_coefficients(subspace_indices):
     """
     Given an arbitrary set of downward close indices determine the  
@@ -334,23 +373,9 @@ def get_smolyak_coefficients(subspace_indices):
     level_change_indices = np.append(
         level_change_indices[2:],[num_subspace_indices,num_subspace_indices])
 
-    try:
-        from pyapprox.cython.sparse_grid import get_smolyak_coefficients_pyx
-        return get_smolyak_coefficients_pyx(
-            sorted_subspace_indices,levels,level_change_indices)[I.argsort()]
-    except:
-         print ('get_smolyak_coefficients extention failed')
-    
-    idx = 0
-    smolyak_coeffs = np.zeros((num_subspace_indices),dtype=float)
-    for ii in range(num_subspace_indices):
-        index = sorted_subspace_indices[:,ii]
-        if idx<levels.shape[0] and index[0]>levels[idx]:
-            idx += 1
-        for jj in range(ii,level_change_indices[idx]):
-            diff = sorted_subspace_indices[:,jj]-index
-            if diff.max()<=1 and diff.min()>=0:
-                smolyak_coeffs[ii]+=(-1.)**diff.sum()
+    smolyak_coeffs = _get_smolyak_coefficients(
+        sorted_subspace_indices.astype(np.int64), levels.astype(np.int64),
+        level_change_indices.astype(np.int64))
     return smolyak_coeffs[I.argsort()]
 
     # try:
@@ -535,48 +560,226 @@ def evaluate_sparse_grid_subspace(samples, subspace_index, subspace_values,
         active_sample_vars)
     return poly_vals
     
+def get_sparse_grid_evaluation_data(
+        values, sparse_grid_subspace_indices,
+        sparse_grid_subspace_poly_indices_list, smolyak_coefficients,
+        sparse_grid_subspace_values_indices_list, config_variables_idx=None):
+    """
+    Flatten the tensor-product interpolants of all subspaces with non-zero
+    Smolyak coefficients into arrays that can be evaluated by a single
+    compiled loop.
+
+    Returns
+    -------
+    univariate_levels : list (num_vars)
+        The levels of the univariate interpolants needed in each dimension
+
+    basis_offsets : list (num_vars)
+        Dictionaries mapping each level in univariate_levels[dd]
+        to the first column of its basis in the table of all univariate
+        basis values
+
+    subspace_num_active_vars : np.ndarray (num_subspaces)
+        The number of dimensions with more than one node in each subspace
+
+    subspace_basis_offsets : np.ndarray (num_subspaces, max_num_active_vars)
+        The first column of the univariate basis of each active dimension
+
+    subspace_num_basis : np.ndarray (num_subspaces, max_num_active_vars)
+        The number of univariate basis functions of each active dimension
+
+    subspace_values_offsets : np.ndarray (num_subspaces+1)
+        The first column of subspace_values of each subspace
+
+    subspace_values : np.ndarray (num_qoi, num_subspace_values)
+        The values of each subspace multiplied by its Smolyak coefficient,
+        ordered so that the first active dimension varies fastest
+    """
+    num_vars = sparse_grid_subspace_indices.shape[0]
+    if config_variables_idx is None:
+        config_variables_idx = num_vars
+    idx = np.where(np.absolute(smolyak_coefficients) > np.finfo(float).eps)[0]
+    sample_subspace_indices = sparse_grid_subspace_indices[
+        :config_variables_idx, idx]
+    num_subspaces = idx.shape[0]
+
+    univariate_levels, basis_offsets = [], []
+    num_basis_vals = 0
+    for dd in range(config_variables_idx):
+        levels = np.unique(sample_subspace_indices[dd])
+        levels = levels[levels > 0]
+        univariate_levels.append(levels)
+        basis_offsets.append(dict())
+        for level in levels:
+            basis_offsets[dd][level] = num_basis_vals
+            num_basis_vals += sparse_grid_subspace_poly_indices_list[
+                idx[np.where(sample_subspace_indices[dd] == level)[0][0]]][
+                    dd].max()+1
+
+    max_num_active_vars = max(
+        1, np.count_nonzero(sample_subspace_indices, axis=0).max(initial=0))
+    subspace_num_active_vars = np.zeros(num_subspaces, dtype=np.int64)
+    subspace_basis_offsets = np.zeros(
+        (num_subspaces, max_num_active_vars), dtype=np.int64)
+    subspace_num_basis = np.ones(
+        (num_subspaces, max_num_active_vars), dtype=np.int64)
+    subspace_values_offsets = np.zeros(num_subspaces+1, dtype=np.int64)
+    subspace_values = []
+    for jj, ii in enumerate(idx):
+        subspace_index = sparse_grid_subspace_indices[:config_variables_idx, ii]
+        poly_indices = sparse_grid_subspace_poly_indices_list[ii]
+        active_vars = np.where(subspace_index > 0)[0]
+        num_active_vars = active_vars.shape[0]
+        subspace_num_active_vars[jj] = num_active_vars
+        if num_active_vars == 0:
+            linear_indices = np.zeros(1, dtype=int)
+        else:
+            num_basis = poly_indices[active_vars].max(axis=1)+1
+            subspace_num_basis[jj, :num_active_vars] = num_basis
+            subspace_basis_offsets[jj, :num_active_vars] = [
+                basis_offsets[dd][subspace_index[dd]] for dd in active_vars]
+            # order values so that the first active dimension varies fastest
+            strides = np.concatenate([[1], np.cumprod(num_basis[:-1])])
+            linear_indices = strides.dot(poly_indices[active_vars])
+            assert linear_indices.shape[0] == np.prod(num_basis)
+        ordered_values = np.empty(
+            (linear_indices.shape[0], values.shape[1]), dtype=float)
+        ordered_values[linear_indices] = smolyak_coefficients[ii]*\
+            get_subspace_values(
+                values, sparse_grid_subspace_values_indices_list[ii])
+        subspace_values.append(ordered_values)
+        subspace_values_offsets[jj+1] = subspace_values_offsets[jj]+\
+            ordered_values.shape[0]
+
+    if num_subspaces == 0:
+        subspace_values = np.zeros((values.shape[1], 0))
+    else:
+        subspace_values = np.vstack(subspace_values).T.copy()
+    return univariate_levels, basis_offsets, subspace_num_active_vars, \
+        subspace_basis_offsets, subspace_num_basis, subspace_values_offsets, \
+        subspace_values
+
+
+@njit(cache=True, parallel=True)
+def _evaluate_sparse_grid_subspaces(
+        basis_vals, subspace_num_active_vars, subspace_basis_offsets,
+        subspace_num_basis, subspace_values_offsets, subspace_values,
+        max_num_samples_per_block=64):
+    num_samples = basis_vals.shape[0]
+    num_subspaces = subspace_num_active_vars.shape[0]
+    num_qoi = subspace_values.shape[0]
+    max_num_subspace_values = 1
+    for ss in range(num_subspaces):
+        max_num_subspace_values = max(
+            max_num_subspace_values,
+            subspace_values_offsets[ss+1]-subspace_values_offsets[ss])
+    approx_values = np.zeros((num_samples, num_qoi), dtype=np.double)
+    num_blocks = (num_samples+max_num_samples_per_block-1) //\
+        max_num_samples_per_block
+    for bb in prange(num_blocks):
+        work = np.empty(
+            (num_qoi, max_num_subspace_values//subspace_num_basis.min()+1),
+            dtype=np.double)
+        lb = bb*max_num_samples_per_block
+        ub = min(lb+max_num_samples_per_block, num_samples)
+        for ii in range(lb, ub):
+            for ss in range(num_subspaces):
+                start = subspace_values_offsets[ss]
+                num_active_vars = subspace_num_active_vars[ss]
+                if num_active_vars == 0:
+                    for qq in range(num_qoi):
+                        approx_values[ii, qq] += subspace_values[qq, start]
+                    continue
+                # contract the first active dimension of the stored values
+                size = subspace_values_offsets[ss+1]-start
+                nbasis = subspace_num_basis[ss, 0]
+                offset = subspace_basis_offsets[ss, 0]
+                size = size//nbasis
+                for qq in range(num_qoi):
+                    for mm in range(size):
+                        val = 0.
+                        kk = start+mm*nbasis
+                        for jj in range(nbasis):
+                            val += basis_vals[ii, offset+jj]*subspace_values[
+                                qq, kk+jj]
+                        work[qq, mm] = val
+                # contract the remaining active dimensions in place
+                for kk in range(1, num_active_vars):
+                    nbasis = subspace_num_basis[ss, kk]
+                    offset = subspace_basis_offsets[ss, kk]
+                    size = size//nbasis
+                    for qq in range(num_qoi):
+                        for mm in range(size):
+                            val = 0.
+                            for jj in range(nbasis):
+                                val += basis_vals[ii, offset+jj]*work[
+                                    qq, mm*nbasis+jj]
+                            work[qq, mm] = val
+                for qq in range(num_qoi):
+                    approx_values[ii, qq] += work[qq, 0]
+    return approx_values
+
+
 def evaluate_sparse_grid(samples, values,
                          poly_indices_dict,# not needed with new implementation
                          sparse_grid_subspace_indices,
                          sparse_grid_subspace_poly_indices_list,
                          smolyak_coefficients, samples_1d,
                          sparse_grid_subspace_values_indices_list,
-                         config_variables_idx=None, output=False):
+                         config_variables_idx=None, output=False,
+                         max_num_samples_per_chunk=1000):
+    """
+    Evaluate a combination sparse grid.
+
+    The univariate Lagrange basis of each level used by the grid is
+    evaluated once per chunk of samples and all subspaces are then
+    accumulated in a single compiled loop which is parallel over the samples.
 
+    Parameters
+    ----------
+    max_num_samples_per_chunk : integer
+        The maximum number of samples for which the univariate basis values
+        are stored at any one time.
+    """
     num_vars, num_samples = samples.shape
     assert values.ndim == 2
     assert values.shape[0] == len(poly_indices_dict)
     assert sparse_grid_subspace_indices.shape[1] == \
         smolyak_coefficients.shape[0]
 
-    #max_level_samples_1d_min = [
-    #    samples_1d[dd][-1].min() for dd in range(len(samples_1d))]
-    #max_level_samples_1d_max = [
-    #    samples_1d[dd][-1].max() for dd in range(len(samples_1d))]
-    # if (np.any(samples.min(axis=1)<max_level_samples_1d_min) or
-    #     np.any(samples.max(axis=1)>max_level_samples_1d_max)):
-    #     print ('warning extrapolating outside abscissa')
-    #     print(samples.min(axis=1),max_level_samples_1d_min)
-    #     print(samples.max(axis=1),max_level_samples_1d_max)
-    #     # this can be true for univariate quadrature rules that are not closed
-    #     # i.e on bounded domain and with samples on both boundaries
-    #     # need to make this check better
-    
-    num_qoi = values.shape[1]
-    #must initialize to zero
-    approx_values = np.zeros((num_samples, num_qoi), dtype=float)
-    for ii in range(sparse_grid_subspace_indices.shape[1]):
-        if (abs(smolyak_coefficients[ii]) > np.finfo(float).eps):
-            subspace_index = sparse_grid_subspace_indices[:, ii]
-            subspace_poly_indices = sparse_grid_subspace_poly_indices_list[ii]
-            #subspace_values = get_subspace_values_using_dictionary(
-            #    values,subspace_poly_indices,poly_indices_dict)
-            subspace_values = get_subspace_values(
-                values, sparse_grid_subspace_values_indices_list[ii])
-            subspace_approx_vals = evaluate_sparse_grid_subspace(
-                samples, subspace_index, subspace_values,
-                samples_1d, config_variables_idx, output)
-            approx_values += smolyak_coefficients[ii]*subspace_approx_vals
+    univariate_levels, basis_offsets, subspace_num_active_vars, \
+        subspace_basis_offsets, subspace_num_basis, subspace_values_offsets, \
+        subspace_values = get_sparse_grid_evaluation_data(
+            values, sparse_grid_subspace_indices,
+            sparse_grid_subspace_poly_indices_list, smolyak_coefficients,
+            sparse_grid_subspace_values_indices_list, config_variables_idx)
+
+    abscissa_and_weights_1d = []
+    num_basis_vals = 0
+    for dd in range(len(univariate_levels)):
+        for level in univariate_levels[dd]:
+            abscissa = samples_1d[dd][level]
+            interval_length = 2
+            if abscissa.shape[0] > 1:
+                interval_length = abscissa.max()-abscissa.min()
+            abscissa_and_weights_1d.append(
+                (dd, basis_offsets[dd][level], abscissa,
+                 compute_barycentric_weights_1d(
+                     abscissa, interval_length=interval_length)))
+            num_basis_vals = max(
+                num_basis_vals, basis_offsets[dd][level]+abscissa.shape[0])
+
+    approx_values = np.empty((num_samples, values.shape[1]), dtype=float)
+    for lb in range(0, num_samples, max_num_samples_per_chunk):
+        ub = min(lb+max_num_samples_per_chunk, num_samples)
+        basis_vals = np.empty((ub-lb, num_basis_vals), dtype=float)
+        for dd, offset, abscissa, weights in abscissa_and_weights_1d:
+            basis_vals[:, offset:offset+abscissa.shape[0]] = \
+                barycentric_lagrange_basis_1d(
+                    abscissa, weights, samples[dd, lb:ub])
+        approx_values[lb:ub] = _evaluate_sparse_grid_subspaces(
+            basis_vals, subspace_num_active_vars, subspace_basis_offsets,
+            subspace_num_basis, subspace_values_offsets, subspace_values)
     return approx_values
 
 def integrate_sparse_grid_subspace(subspace_index,subspace_values,
@@ -606,11 +809,51 @@ def integrate_sparse_grid(values,
             subspace_index = sparse_grid_subspace_indices[:,ii]
             subspace_values = get_subspace_values(
                 values,sparse_grid_subspace_values_indices_list[ii])
-            subspace_integral_vals = integrate_sparse_grid_subspace(
-                subspace_index,subspace_values,weights_1d,config_variables_idx)
-            integral_values +=smolyak_coefficients[ii]*subspace_integral_vals
+            accumulate_sparse_grid_subspace_moments(
+                integral_values, smolyak_coefficients[ii], subspace_index,
+                subspace_values, weights_1d, config_variables_idx)
     return integral_values
 
+def accumulate_sparse_grid_subspace_moments(
+        moments, smolyak_coefficient, subspace_index, subspace_values,
+        weights_1d, config_variables_idx):
+    """
+    Add the moments of a subspace, multiplied by its smolyak coefficient,
+    to the moments of a sparse grid.
+
+    The coefficient is folded into the quadrature weights and the squared
+    values are never formed so the only temporary arrays have one entry
+    per quantity of interest.
+
+    Parameters
+    ----------
+    moments : np.ndarray (2, num_qoi)
+        The mean and variance of each QoI. Updated in place
+
+    smolyak_coefficient : float
+        The coefficient of the subspace
+
+    subspace_index : np.ndarray (num_vars)
+        The subspace index
+
+    subspace_values : np.ndarray (num_subspace_samples, num_qoi)
+        The values of the function at the samples of the subspace
+
+    Returns
+    -------
+    moments : np.ndarray (2, num_qoi)
+        The updated moments
+    """
+    subspace_weights = smolyak_coefficient*get_subspace_weights(
+        subspace_index, weights_1d, config_variables_idx)
+    # mean = c*E[f], variance = c*E[f**2]-c*E[f]**2
+    mean = subspace_weights.dot(subspace_values)
+    moments[0] += mean
+    moments[1] += np.einsum(
+        'i,ij,ij->j', subspace_weights, subspace_values, subspace_values)
+    moments[1] -= mean**2/smolyak_coefficient
+    return moments
+
 def integrate_sparse_grid_from_subspace_moments(
         sparse_grid_subspace_indices,
         smolyak_coefficients, subspace_moments):
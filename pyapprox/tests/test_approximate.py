@@ -1,6 +1,8 @@
 import unittest
 from scipy import stats
 from pyapprox.approximate import *
+from pyapprox.approximate import _fit_incremental_linear_least_squares
+from pyapprox.utilities import leave_one_out_lsq_cross_validation
 from pyapprox.benchmarks.benchmarks import setup_benchmark
 import pyapprox as pya
 
@@ -123,6 +125,53 @@ class TestApproximate(unittest.TestCase):
                 solver_type_list, solver_options_list):
             self.help_cross_validate_pce_degree(solver_type, solver_options)
 
+    def test_cross_validate_pce_degree_in_parallel(self):
+        num_vars = 2
+        univariate_variables = [stats.uniform(-1, 2)]*num_vars
+        variable = pya.IndependentMultivariateRandomVariable(
+            univariate_variables)
+        var_trans = pya.AffineRandomVariableTransformation(variable)
+        poly = pya.PolynomialChaosExpansion()
+        poly_opts = pya.define_poly_options_from_variable_transformation(
+            var_trans)
+        poly.configure(poly_opts)
+        poly.set_indices(pya.compute_hyperbolic_indices(num_vars, 3, 1.0))
+        poly.set_coefficients(
+            np.random.normal(0, 1, (poly.indices.shape[1], 2)))
+        train_samples = pya.generate_independent_random_samples(
+            variable, poly.num_terms()*3)
+        train_vals = poly(train_samples)
+
+        for solver_type, solver_options in [
+                ('lstsq', {'alphas': [1e-14, 1e-8], 'cv': 5}),
+                ('lasso', {'max_iter': 20, 'cv': 5})]:
+            results = []
+            for max_eval_concurrency in [1, 3]:
+                results.append(cross_validate_pce_degree(
+                    copy.deepcopy(poly), train_samples, train_vals, 1, 6,
+                    solver_type=solver_type,
+                    linear_solver_options=solver_options,
+                    max_eval_concurrency=max_eval_concurrency))
+            assert np.allclose(results[0].degrees, [3, 3])
+            assert np.allclose(results[0].degrees, results[1].degrees)
+            assert np.allclose(results[0].scores, results[1].scores)
+            assert np.allclose(results[0].reg_params, results[1].reg_params)
+            assert np.allclose(results[0].approx.coefficients,
+                               results[1].approx.coefficients)
+
+        options = {'basis_type': 'hyperbolic_cross', 'variable': variable,
+                   'options': {'solver_type': 'lstsq',
+                               'linear_solver_options': {'cv': 5}}}
+        cv_results = []
+        for max_eval_concurrency in [1, 2]:
+            np.random.seed(2)
+            cv_results.append(cross_validate_approximation(
+                train_samples, train_vals, options, 4, 'polynomial_chaos',
+                max_eval_concurrency=max_eval_concurrency))
+        assert np.allclose(cv_results[0][2], cv_results[1][2])
+        for residues0, residues1 in zip(cv_results[0][1], cv_results[1][1]):
+            assert np.allclose(residues0, residues1)
+
     def test_pce_basis_expansion(self):
         num_vars = 2
         univariate_variables = [stats.uniform(-1, 2)]*num_vars
@@ -167,6 +216,122 @@ class TestApproximate(unittest.TestCase):
             poly(validation_samples), true_poly(validation_samples),
             atol=1e-8), error
 
+    def test_incremental_linear_least_squares(self):
+        nsamples, nterms, alpha = 40, 12, 1e-3
+        basis_matrix = np.random.normal(0, 1, (nsamples+5, nterms))
+        values = np.random.normal(0, 1, (nsamples+5, 2))
+        fold_sample_indices = get_random_k_fold_sample_indices(nsamples, 5)
+
+        lstsq = IncrementalLinearLeastSquares(values[:nsamples], alpha)
+        lstsq.add_columns(basis_matrix[:nsamples, :8])
+        lstsq.add_columns(basis_matrix[:nsamples, 8:])
+        lstsq.remove_columns([1, 9])
+        lstsq.set_columns(
+            np.array([0, 2, 3, 11, 10, 1]), lambda ids: basis_matrix[
+                :nsamples, ids])
+        assert np.allclose(lstsq.column_ids, [0, 2, 3, 10, 11, 1])
+        columns = lstsq.column_ids
+        cv_errors, cv_score, coef = leave_many_out_lsq_cross_validation(
+            basis_matrix[:nsamples, columns], values[:nsamples],
+            fold_sample_indices, alpha)
+        assert np.allclose(
+            lstsq.chol_inv_basis_matrix_trans, solve_triangular(
+                lstsq.chol_factor, basis_matrix[:nsamples, columns].T,
+                lower=True))
+        result = lstsq.cross_validate(fold_sample_indices)
+        assert np.allclose(result[0], cv_errors)
+        assert np.allclose(result[1], cv_score)
+        assert np.allclose(result[2], coef)
+
+        lstsq.add_rows(
+            basis_matrix[nsamples:, columns], values[nsamples:])
+        gram_mat = basis_matrix[:, columns].T.dot(basis_matrix[:, columns])
+        assert np.allclose(
+            lstsq.chol_factor.dot(lstsq.chol_factor.T),
+            gram_mat+alpha*np.eye(columns.shape[0]))
+        assert np.allclose(lstsq.solve(), np.linalg.solve(
+            gram_mat+alpha*np.eye(columns.shape[0]),
+            basis_matrix[:, columns].T.dot(values)))
+
+        # leave one out cross validation after adding rows
+        fold_sample_indices = get_random_k_fold_sample_indices(
+            nsamples+5, nsamples+5)
+        cv_errors, cv_score, coef = leave_one_out_lsq_cross_validation(
+            basis_matrix[:, columns], values, alpha)
+        result = lstsq.cross_validate(fold_sample_indices)
+        assert np.allclose(
+            result[0][np.argsort(np.hstack(fold_sample_indices)), 0],
+            cv_errors)
+        assert np.allclose(result[1], cv_score)
+        lstsq.remove_columns([0, 3])
+        lstsq.add_columns(basis_matrix[:, 4:6], np.array([4, 5]))
+        assert np.allclose(
+            lstsq.chol_inv_basis_matrix_trans, solve_triangular(
+                lstsq.chol_factor, lstsq.basis_matrix.T, lower=True))
+        assert np.allclose(
+            lstsq.basis_matrix, basis_matrix[:, lstsq.column_ids])
+
+    def test_linear_least_squares_cv_default_folds(self):
+        nsamples, nterms = 20, 3
+        basis_matrix = np.random.normal(0, 1, (nsamples, nterms))
+        values = np.random.normal(0, 1, (nsamples, 1))
+        solver = LinearLeastSquaresCV(cv=None).fit(basis_matrix, values)
+        assert np.allclose(
+            solver.cv_score_, leave_one_out_lsq_cross_validation(
+                basis_matrix, values)[1])
+
+    def test_pce_basis_expansion_lstsq(self):
+        num_vars = 2
+        univariate_variables = [stats.uniform(-1, 2)]*num_vars
+        variable = pya.IndependentMultivariateRandomVariable(
+            univariate_variables)
+        var_trans = pya.AffineRandomVariableTransformation(variable)
+        poly = pya.PolynomialChaosExpansion()
+        poly_opts = pya.define_poly_options_from_variable_transformation(
+            var_trans)
+        poly.configure(poly_opts)
+        poly.set_indices(pya.compute_hyperbolic_indices(num_vars, 4, 1.0))
+        poly.set_coefficients(
+            np.random.normal(0, 1, (poly.indices.shape[1], 1)))
+        train_samples = pya.generate_independent_random_samples(
+            variable, poly.num_terms()*4)
+        train_vals = poly(train_samples)
+        true_poly = copy.deepcopy(poly)
+
+        linear_solver_options = {'cv': 10, 'alphas': [1e-14, 1e-8]}
+        basis_matrix_cache = BasisMatrixCache(poly, train_samples)
+        fold_sample_indices = get_random_k_fold_sample_indices(
+            train_samples.shape[1], linear_solver_options['cv'])
+        lstsq_solvers = [
+            IncrementalLinearLeastSquares(train_vals, alpha)
+            for alpha in linear_solver_options['alphas']]
+        for degree in [2, 3, 4, 3, 5]:
+            indices = pya.compute_hyperbolic_indices(num_vars, degree, 1.0)
+            indices = indices[:, np.random.permutation(indices.shape[1])]
+            coef, cv_score, alpha = _fit_incremental_linear_least_squares(
+                lstsq_solvers, basis_matrix_cache, fold_sample_indices,
+                indices)
+            cv_scores = [leave_many_out_lsq_cross_validation(
+                basis_matrix_cache(indices), train_vals, fold_sample_indices,
+                alpha_ii)[1][0] for alpha_ii in linear_solver_options['alphas']]
+            assert np.allclose(cv_score, min(cv_scores))
+            assert np.allclose(
+                coef, np.linalg.lstsq(
+                    basis_matrix_cache(indices), train_vals, rcond=None)[0])
+
+        validation_samples = pya.generate_independent_random_samples(
+            variable, 100)
+        for linear_solver_options in [
+                linear_solver_options, {'cv': None}]:
+            poly = approximate(
+                train_samples, train_vals, 'polynomial_chaos',
+                {'basis_type': 'expanding_basis', 'variable': variable,
+                 'options': {'solver_type': 'lstsq', 'verbose': 0,
+                             'linear_solver_options': linear_solver_options}}
+            ).approx
+            assert np.allclose(
+                poly(validation_samples), true_poly(validation_samples))
+
     def test_approximate_gaussian_process(self):
         from sklearn.gaussian_process.kernels import Matern
         num_vars = 1
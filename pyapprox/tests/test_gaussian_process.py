@@ -166,6 +166,108 @@ class TestGaussianProcess(unittest.TestCase):
             interp_random_gp_vals,
             random_gp_vals[:gp_realizations.selected_canonical_samples.shape[1]])
 
+    def check_random_fourier_feature_realizations(self, nu):
+        nvars = 2
+        lb, ub = 0, 1
+        ntrain_samples = 10
+        def func(x): return np.sum(x**2, axis=0)[:, np.newaxis]
+
+        train_samples = np.random.uniform(lb, ub, (nvars, ntrain_samples))
+        train_vals = func(train_samples)
+
+        kernel = Matern(0.4, length_scale_bounds='fixed', nu=nu)
+        kernel = ConstantKernel(
+            constant_value=2., constant_value_bounds='fixed')*kernel
+        kernel += WhiteKernel(noise_level=1e-6, noise_level_bounds='fixed')
+        gp = GaussianProcess(kernel)
+        gp.fit(train_samples, train_vals)
+
+        ngp_realizations, nfeatures = 10000, 4000
+        gp_realizations = RandomFourierFeatureGaussianProcessRealizations(
+            gp, nfeatures, max_nsamples_per_chunk=7)
+        gp_realizations.fit(ngp_realizations)
+
+        samples = np.random.uniform(lb, ub, (nvars, 20))
+        mean_vals, std = gp(samples, return_std=True)
+        realization_vals = gp_realizations(samples)
+        assert realization_vals.shape == (samples.shape[1], ngp_realizations)
+        # last realization is the mean of the gp
+        assert np.allclose(realization_vals[:, -1], mean_vals[:, 0])
+        assert np.allclose(
+            realization_vals.mean(axis=1), mean_vals[:, 0], atol=3e-2)
+        std_error = np.linalg.norm(
+            std-realization_vals.std(axis=1))/np.linalg.norm(std)
+        assert std_error < 5e-2, std_error
+
+        # realizations interpolate the training data
+        train_realization_vals = gp_realizations(train_samples)
+        assert np.allclose(
+            train_realization_vals, train_vals, atol=1e-2)
+
+    def test_random_fourier_feature_realizations(self):
+        self.check_random_fourier_feature_realizations(np.inf)
+        self.check_random_fourier_feature_realizations(5/2)
+
+    def test_random_fourier_feature_realizations_per_sample_noise(self):
+        nvars, ntrain_samples = 2, 10
+        train_samples = np.random.uniform(0, 1, (nvars, ntrain_samples))
+        train_vals = np.sum(train_samples**2, axis=0)[:, np.newaxis]
+        alpha = np.linspace(1e-8, 1e-2, ntrain_samples)
+        gp = GaussianProcess(
+            Matern(0.4, length_scale_bounds='fixed', nu=np.inf), alpha=alpha)
+        gp.fit(train_samples, train_vals)
+
+        gp_realizations = RandomFourierFeatureGaussianProcessRealizations(
+            gp, 100)
+        assert np.allclose(gp_realizations.noise_var, alpha)
+        rand_noise = np.random.normal(0, 1, (100+ntrain_samples, 3))
+        gp_realizations.fit(3, rand_noise)
+        # the training data of each realization is perturbed by noise with
+        # the variance of each sample
+        prior_train_vals = gp_realizations._prior_features(
+            gp.X_train_.T).dot(gp_realizations.weights)
+        noise = np.sqrt(alpha)[:, np.newaxis]*rand_noise[100:]
+        noise[:, -1] = 0
+        assert np.allclose(
+            gp.L_.dot(gp.L_.T).dot(gp.alpha_-gp_realizations.alpha_),
+            prior_train_vals+noise)
+
+    def test_multiple_qoi_gaussian_process(self):
+        nvars = 2
+        ntrain_samples = 20
+        def func(x): return np.array(
+            [np.sum(x**2, axis=0), np.cos(x[0]), x[0]*x[1]]).T
+
+        train_samples = np.random.uniform(0, 1, (nvars, ntrain_samples))
+        train_vals = func(train_samples)
+
+        kernel = Matern([0.4, 0.3], length_scale_bounds=(1e-1, 1e1), nu=2.5)
+        gp = GaussianProcess(kernel, normalize_y=True)
+        gp.fit(train_samples, train_vals)
+
+        # check gradient of log likelihood summed over QoI
+        theta = gp.kernel_.theta
+        ll, ll_grad = gp.log_marginal_likelihood(theta, eval_gradient=True)
+        sklearn_ll, sklearn_ll_grad = \
+            GaussianProcessRegressor.log_marginal_likelihood(
+                gp, theta, eval_gradient=True)
+        assert np.allclose(ll, sklearn_ll)
+        assert np.allclose(ll_grad, sklearn_ll_grad)
+
+        # check the predictions of the tied GP match those of GPs
+        # fit to each QoI with the same hyper-parameters
+        samples = np.random.uniform(0, 1, (nvars, 10))
+        mean, std = gp(samples, return_std=True)
+        assert mean.shape == std.shape == (samples.shape[1], 3)
+        for ii in range(train_vals.shape[1]):
+            gp_ii = GaussianProcess(
+                gp.kernel_.clone_with_theta(theta), optimizer=None,
+                normalize_y=True)
+            gp_ii.fit(train_samples, train_vals[:, ii:ii+1])
+            mean_ii, std_ii = gp_ii(samples, return_std=True)
+            assert np.allclose(mean[:, ii], mean_ii[:, 0])
+            assert np.allclose(std[:, ii], std_ii)
+
     def test_gaussian_process_pointwise_variance(self):
         nvars = 1
         lb, ub = 0, 1
@@ -1215,6 +1317,21 @@ class TestSamplers(unittest.TestCase):
         self.check_matern_gradient_wrt_samples(5/2)
         self.check_matern_gradient_wrt_samples(np.inf)
 
+    def test_matern_kernel_and_gradient_wrt_samples(self):
+        nvars = 2
+        length_scale = [0.1, 0.2]
+        samples1 = np.random.uniform(0, 1, (nvars, 4))
+        samples2 = np.random.uniform(0, 1, (nvars, 3))
+        for nu in [3/2, 5/2, np.inf]:
+            kernel = Matern(length_scale, length_scale_bounds='fixed', nu=nu)
+            K, grad = matern_kernel_and_gradient_wrt_samples(
+                nu, samples1, samples2, length_scale)
+            assert np.allclose(K, kernel(samples1.T, samples2.T))
+            assert grad.shape == (samples1.shape[1], samples2.shape[1], nvars)
+            for ii in range(samples1.shape[1]):
+                assert np.allclose(grad[ii], matern_gradient_wrt_samples(
+                    nu, samples1[:, ii:ii+1], samples2, length_scale))
+
     def test_RBF_posterior_variance_gradient_wrt_samples_subset(
             self):
         nvars = 2
@@ -215,6 +215,49 @@ class TestGradientEnhancedGP(unittest.TestCase):
         # plt.legend()
         # plt.show()
 
+    def test_full_kernel(self):
+        num_vars, num_XX_func, num_XX_deriv = 3, 4, 5
+        length_scale = np.array([0.5,1,2])
+        XX_func = np.random.uniform(-1,1,(num_XX_func,num_vars))
+        XX_deriv = np.random.uniform(-1,1,(num_XX_deriv,num_vars))
+        XX_test = np.random.uniform(-1,1,(2,num_vars))
+        for active_vars in [None,np.array([0,2])]:
+            dirs = np.arange(num_vars) if active_vars is None else active_vars
+            XX_train = np.vstack(
+                (XX_func,np.tile(XX_deriv,(dirs.shape[0],1))))
+            K = full_kernel(XX_train,length_scale,num_XX_func,
+                            active_vars=active_vars)
+            K_ff = kernel_ff(XX_func,XX_func,length_scale)
+            K_fd = np.hstack([-kernel_fd(XX_func,XX_deriv,length_scale,ii)
+                              for ii in dirs])
+            K_dd = np.vstack([np.hstack(
+                [kernel_dd(XX_deriv,XX_deriv,length_scale,ii,jj)
+                 for jj in dirs]) for ii in dirs])
+            K_true = np.vstack((np.hstack((K_ff,K_fd)),
+                                np.hstack((K_fd.T,K_dd))))
+            assert np.allclose(K,K_true)
+
+            K_test = full_kernel(
+                XX_test,length_scale,num_XX_func,XX_train,'values',
+                active_vars)
+            K_test_true = np.hstack(
+                (kernel_ff(XX_test,XX_func,length_scale),
+                 np.hstack([-kernel_fd(XX_test,XX_deriv,length_scale,ii)
+                            for ii in dirs])))
+            assert np.allclose(K_test,K_test_true)
+
+            XX_test_derivs = np.tile(XX_test,(dirs.shape[0],1))
+            K_test = full_kernel(
+                XX_test_derivs,length_scale,num_XX_func,XX_train,'derivs',
+                active_vars)
+            K_test_true = np.hstack((
+                np.vstack([kernel_fd(XX_test,XX_func,length_scale,ii)
+                           for ii in dirs]),
+                np.vstack([np.hstack(
+                    [kernel_dd(XX_test,XX_deriv,length_scale,ii,jj)
+                     for jj in dirs]) for ii in dirs])))
+            assert np.allclose(K_test,K_test_true)
+
     def test_gradient_of_gp(self):
         gradient_enhanced_gp_example(1)
         #plt.show()
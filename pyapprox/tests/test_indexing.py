@@ -122,6 +122,95 @@ class TestIndexing(unittest.TestCase):
         ii, jj = get_upper_triangular_matrix_indices(kk, nn)
         assert (ii, jj) == (1, 2)
 
+    def test_get_neighbors(self):
+        index = np.array([2, 0, 1])
+        forward_neighbors = get_forward_neighbors(index)
+        for ii in range(index.shape[0]):
+            assert np.allclose(forward_neighbors[:, ii],
+                               get_forward_neighbor(index, ii))
+
+        indices = np.array([[2, 0, 1], [0, 0, 0], [1, 1, 0]]).T
+        backward_neighbors, index_ids = get_backward_neighbors(indices)
+        true_backward_neighbors = np.array(
+            [[1, 0, 1], [2, 0, 0], [0, 1, 0], [1, 0, 0]]).T
+        assert np.allclose(backward_neighbors, true_backward_neighbors)
+        assert np.allclose(index_ids, [0, 0, 2, 2])
+
+    def test_get_index_prefix_tree(self):
+        indices = compute_hyperbolic_indices(3, 3, 1.0)
+        indices = indices[:, np.random.permutation(indices.shape[1])]
+        nodes, parent_ids, active_vars, index_ids = get_index_prefix_tree(
+            indices)
+        # no nodes are added to a downward closed set
+        assert nodes.shape[1] == indices.shape[1]
+        assert np.allclose(nodes[:, index_ids], indices)
+        assert np.allclose(nodes[:, 0], 0)
+        assert parent_ids[0] == -1
+        for kk in range(1, nodes.shape[1]):
+            assert parent_ids[kk] < kk
+            diff = nodes[:, kk]-nodes[:, parent_ids[kk]]
+            assert np.count_nonzero(diff) == 1
+            assert diff[active_vars[kk]] == nodes[active_vars[kk], kk]
+            assert np.all(nodes[active_vars[kk]+1:, kk] == 0)
+
+        # the ancestors of indices that are not downward closed are added
+        indices = np.array([[0, 2, 1], [1, 0, 2]]).T
+        nodes, parent_ids, active_vars, index_ids = get_index_prefix_tree(
+            indices)
+        true_nodes = np.array(
+            [[0, 0, 0], [1, 0, 0], [0, 2, 0], [0, 2, 1], [1, 0, 2]]).T
+        assert np.allclose(nodes, true_nodes)
+        assert np.allclose(parent_ids, [-1, 0, 0, 2, 1])
+        assert np.allclose(active_vars, [-1, 0, 1, 2, 2])
+        assert np.allclose(index_ids, [3, 4])
+
+        # repeated indices are mapped to the same node
+        indices = np.array([[0, 2, 1], [1, 0, 2], [0, 2, 1]]).T
+        nodes, parent_ids, active_vars, index_ids = get_index_prefix_tree(
+            indices)
+        assert np.allclose(nodes, true_nodes)
+        assert np.allclose(index_ids, [3, 4, 3])
+
+    def test_sparse_index_set(self):
+        for num_vars, level, p in [(5, 4, 1), (4, 6, 0.5), (3, 0, 1)]:
+            indices = compute_hyperbolic_indices(num_vars, level, p)
+            index_set = compute_hyperbolic_indices_sparse(num_vars, level, p)
+            assert index_set.active_levels.dtype == np.uint8
+            assert len(index_set) == indices.shape[1]
+            assert np.all(index_set.contains(indices))
+            assert index_set.is_downward_closed()
+            dense_indices = index_set.to_dense()
+            assert set_difference(indices, dense_indices).shape[1] == 0
+
+            # repeated indices are removed
+            assert len(SparseIndexSet.from_dense(
+                np.hstack([indices, indices]))) == indices.shape[1]
+
+            forward_neighbors = index_set.get_forward_neighbors().to_dense()
+            true_forward_neighbors = set()
+            for ii in range(indices.shape[1]):
+                neighbors = get_forward_neighbors(indices[:, ii])
+                for jj in range(num_vars):
+                    true_forward_neighbors.add(hash_array(neighbors[:, jj]))
+            true_forward_neighbors -= set(
+                [hash_array(index) for index in indices.T])
+            assert forward_neighbors.shape[1] == len(true_forward_neighbors)
+            for index in forward_neighbors.T:
+                assert hash_array(index) in true_forward_neighbors
+
+        indices1 = compute_hyperbolic_indices(3, 3, 1)
+        indices2 = compute_hyperbolic_indices(3, 4, 1)
+        set1 = SparseIndexSet.from_dense(indices1)
+        set2 = SparseIndexSet.from_dense(indices2[:, ::-1])
+        union = set1.union(set2)
+        assert len(union) == indices2.shape[1]
+        assert np.allclose(union.to_dense()[:, :len(set1)], indices1)
+        difference = set2.difference(set1)
+        assert np.allclose(
+            difference.to_dense(), set_difference(indices1, indices2[:, ::-1]))
+        assert not SparseIndexSet.from_dense(
+            np.array([[0, 0], [0, 2]]).T).is_downward_closed()
+
 
 if __name__ == '__main__':
     indexing_test_suite = unittest.TestLoader().loadTestsFromTestCase(
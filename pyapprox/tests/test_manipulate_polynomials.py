@@ -115,6 +115,39 @@ class TestManipulatePolynomials(unittest.TestCase):
         true_coeffs = [1, 5, 9, 6, 7, 8]
         assert np.allclose(coeffs[sorted_idx][:, 0], true_coeffs)
 
+    def test_group_like_terms_packed_indices(self):
+        num_vars, degree = 3, 4
+        indices1 = compute_hyperbolic_indices(num_vars, degree, 1.0)
+        indices2 = compute_hyperbolic_indices(num_vars, degree-1, 1.0)
+        coeffs1 = np.random.normal(0, 1, (indices1.shape[1], 2))
+        coeffs2 = np.random.normal(0, 1, (indices2.shape[1], 2))
+        indices, coeffs = multiply_multivariate_polynomials(
+            indices1, coeffs1, indices2, coeffs2)
+
+        true_coeffs = dict()
+        for ii in range(indices1.shape[1]):
+            for jj in range(indices2.shape[1]):
+                key = tuple(indices1[:, ii]+indices2[:, jj])
+                true_coeffs[key] = true_coeffs.get(key, 0) + \
+                    coeffs1[ii]*coeffs2[jj]
+        assert indices.shape[1] == len(true_coeffs)
+        for ii in range(indices.shape[1]):
+            assert np.allclose(coeffs[ii], true_coeffs[tuple(indices[:, ii])])
+
+        # degrees whose packed keys overflow a 64-bit integer must
+        # fall back to sorting the columns of the indices
+        large_indices = np.vstack(
+            [indices+2**20]*4).astype(np.int64)
+        large_indices = np.hstack([large_indices, large_indices])
+        large_coeffs = np.vstack([coeffs, coeffs])
+        assert get_packed_index_radices(large_indices.max(axis=1)) is None
+        grouped_indices, grouped_coeffs = group_like_terms(
+            large_coeffs, large_indices)
+        unique_indices, unique_idx = np.unique(
+            large_indices, axis=1, return_index=True)
+        assert np.allclose(grouped_indices, unique_indices)
+        assert np.allclose(grouped_coeffs, 2*large_coeffs[unique_idx])
+
     def test_add_polynomials(self):
         num_vars = 2
         degree = 2
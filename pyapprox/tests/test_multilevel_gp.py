@@ -77,6 +77,51 @@ class TestMultilevelGP(unittest.TestCase):
             K[:,XX1.shape[0]:],p12**2*kernel1(XX1,XX2)+kernel2(XX1,XX2))
         print(K)
         
+    def test_recursive_multilevel_gp(self):
+        nvars, nmodels = 1, 2
+        true_rho = 2
+        def f1(x):
+            return (((x.T*6-2)**2)*np.sin((x.T*6-2)*2))[:, 0]
+        def f2(x):
+            return true_rho*f1(x)+(x[0]-0.5)*1. - 5
+
+        x1 = np.array([[0.1], [0.2], [0.3], [0.5], [0.7],
+                       [0.8], [0.9], [0.0], [0.4], [0.6], [1.0]]).T
+        x2 = np.array([[0.0], [0.4], [0.6], [1.0]]).T
+        samples = [x1, x2]
+        values = [f(x) for f, x in zip([f1, f2], samples)]
+        nsamples_per_model = [s.shape[1] for s in samples]
+
+        from sklearn.gaussian_process.kernels import RBF
+        length_scales, rho = [0.2, 0.3], [true_rho]
+        kernels = [RBF(length_scale=ll, length_scale_bounds='fixed')
+                   for ll in length_scales]
+        rgp = RecursiveMultilevelGP(kernels, rho=rho)
+        rgp.set_data(samples, values)
+        rgp.fit()
+
+        mlgp_kernel = MultilevelGPKernel(
+            nvars, nsamples_per_model, length_scale=length_scales+rho,
+            length_scale_bounds='fixed')
+        gp = MultilevelGP(mlgp_kernel)
+        gp.set_data(samples, values)
+        gp.fit()
+
+        xx = np.linspace(0, 1, 21)[np.newaxis, :]
+        rgp_mean, rgp_std = rgp.predict(xx.T, return_std=True)
+        gp_mean, gp_std = gp.predict(xx.T, return_std=True)
+        assert np.allclose(rgp_mean, gp_mean)
+        assert np.allclose(rgp_std, gp_std, atol=1e-4)
+        assert np.allclose(rgp.predict(x2.T), values[1], atol=1e-5)
+        assert np.allclose(
+            rgp.predict(x1.T, model_id=0), values[0], atol=1e-5)
+
+        # rho is recovered when the discrepancy is well approximated
+        rgp = RecursiveMultilevelGP(kernels)
+        rgp.set_data(samples, values)
+        rgp.fit()
+        assert np.allclose(rgp.rho, true_rho, rtol=2e-1)
+
     @unittest.skip(reason="capability not complete")
     def test_2_models(self):
         # TODO Add Test which builds gp on two models data separately when
@@ -1,9 +1,11 @@
 import unittest
+import copy
 from scipy import special as sp
 from pyapprox.multivariate_polynomials import *
 from pyapprox.univariate_quadrature import gauss_hermite_pts_wts_1D, \
     gauss_jacobi_pts_wts_1D
-from pyapprox.utilities import get_tensor_product_quadrature_rule, approx_fprime
+from pyapprox.utilities import get_tensor_product_quadrature_rule, approx_fprime, \
+    hash_array
 from pyapprox.variable_transformations import \
     define_iid_random_variable_transformation, IdentityTransformation,\
     AffineRandomVariableTransformation
@@ -437,6 +439,69 @@ class TestMultivariatePolynomials(unittest.TestCase):
         assert np.allclose(poly.covariance()[
                            0, 1], coef[1:, 0].dot(coef[1:, 1]))
 
+    def test_evaluate_multivariate_orthonormal_polynomial_expansion(self):
+        univariate_variables = [
+            uniform(-1, 2), norm(-1, 2), beta(2, 3, 0, 1), uniform(0, 3)]
+        variable = IndependentMultivariateRandomVariable(univariate_variables)
+        var_trans = AffineRandomVariableTransformation(variable)
+        num_vars = len(univariate_variables)
+
+        poly = PolynomialChaosExpansion()
+        poly_opts = define_poly_options_from_variable_transformation(var_trans)
+        poly.configure(poly_opts)
+        indices = compute_hyperbolic_indices(num_vars, 4, 0.8)
+        # make the maximum degree of each variable different
+        indices = indices[:, indices[3, :] < 3]
+        poly.set_indices(indices)
+        coef = np.random.normal(0, 1, (indices.shape[1], 2))
+        poly.set_coefficients(coef)
+
+        samples = generate_independent_random_samples(variable, 101)
+        true_values = poly.basis_matrix(samples).dot(coef)
+        assert np.allclose(poly(samples), true_values)
+
+        canonical_samples = var_trans.map_to_canonical_space(samples)
+        values = evaluate_multivariate_orthonormal_polynomial_expansion(
+            canonical_samples, indices, poly.recursion_coeffs, coef,
+            poly.basis_type_index_map, max_num_samples_per_chunk=10)
+        assert np.allclose(values, true_values)
+
+    def test_evaluate_multivariate_orthonormal_polynomial_prefix_tree(self):
+        num_vars, degree = 6, 4
+        ab = jacobi_recurrence(degree+1, alpha=0, beta=0, probability=True)
+        samples = np.random.uniform(-1, 1, (num_vars, 20))
+        # the prefix tree must support sets that are not downward closed
+        indices = compute_hyperbolic_indices(num_vars, degree, 0.5)
+        indices = indices[:, np.random.permutation(indices.shape[1])[:20]]
+        basis_vals_1d = \
+            precompute_multivariate_orthonormal_polynomial_univariate_values(
+                samples, indices, ab, 0, None)
+        true_values = evaluate_multivariate_orthonormal_polynomial_values(
+            indices, basis_vals_1d, samples.shape[1])
+        values = \
+            evaluate_multivariate_orthonormal_polynomial_values_prefix_tree(
+                indices, basis_vals_1d, samples.shape[1])
+        assert np.allclose(values, true_values)
+
+        # the basis matrix of a PCE with repeated indices
+        univariate_variables = [uniform(-1, 2)]*num_vars
+        variable = IndependentMultivariateRandomVariable(univariate_variables)
+        var_trans = AffineRandomVariableTransformation(variable)
+        poly = PolynomialChaosExpansion()
+        poly.configure(define_poly_options_from_variable_transformation(
+            var_trans))
+        poly.set_indices(np.hstack([indices, indices[:, :3]]))
+        basis_matrix = poly.basis_matrix(samples)
+        assert np.allclose(basis_matrix[:, :indices.shape[1]], true_values)
+        assert np.allclose(
+            basis_matrix[:, indices.shape[1]:], true_values[:, :3])
+        # the prefix tree is only rebuilt when the indices change
+        prefix_tree = poly.get_index_prefix_tree()
+        poly.basis_matrix(samples)
+        assert poly.get_index_prefix_tree() is prefix_tree
+        poly.set_indices(indices)
+        assert poly.get_index_prefix_tree() is not prefix_tree
+
     def test_pce_jacobian(self):
         degree = 2
 
@@ -465,6 +530,85 @@ class TestMultivariatePolynomials(unittest.TestCase):
             lambda x: poly(x[:, np.newaxis])[0, :], sample[:, 0])
         assert np.allclose(jac, fd_jac)
 
+    def test_pce_gradients(self):
+        univariate_variables = [
+            beta(2, 3, 0, 1), norm(-1, 2), uniform(-2, 4), norm(0, 3)]
+        variable = IndependentMultivariateRandomVariable(univariate_variables)
+        var_trans = AffineRandomVariableTransformation(variable)
+        num_vars = len(univariate_variables)
+
+        poly = PolynomialChaosExpansion()
+        poly_opts = define_poly_options_from_variable_transformation(var_trans)
+        poly.configure(poly_opts)
+        indices = compute_hyperbolic_indices(num_vars, 4, 0.8)
+        poly.set_indices(indices)
+        coef = np.random.normal(0, 1, (indices.shape[1], 2))
+        poly.set_coefficients(coef)
+
+        samples = generate_independent_random_samples(variable, 4)
+        grads = poly.gradients(samples)
+        assert grads.shape == (samples.shape[1], num_vars, coef.shape[1])
+        derivative_matrix = poly.basis_matrix(
+            samples, {'deriv_order': 1})[samples.shape[1]:]
+        true_grads = derivative_matrix.dot(coef).reshape(
+            num_vars, samples.shape[1], coef.shape[1]).transpose(1, 0, 2)
+        assert np.allclose(grads, true_grads)
+
+        from pyapprox.optimization import approx_jacobian
+        for ii in range(samples.shape[1]):
+            fd_jac = approx_jacobian(
+                lambda x: poly(x[:, np.newaxis])[0, :], samples[:, ii])
+            assert np.allclose(grads[ii].T, fd_jac, atol=1e-6)
+
+        canonical_samples = var_trans.map_to_canonical_space(samples)
+        canonical_grads = \
+            evaluate_multivariate_orthonormal_polynomial_expansion_gradients(
+                canonical_samples, indices, poly.recursion_coeffs, coef,
+                poly.basis_type_index_map, max_num_samples_per_chunk=3)
+        scales = np.array([0.5, 2, 2, 3])
+        assert np.allclose(
+            canonical_grads/scales[np.newaxis, :, np.newaxis], grads)
+
+    def test_basis_matrix_cache(self):
+        univariate_variables = [uniform(-1, 2), norm(0, 1), uniform(0, 1)]
+        variable = IndependentMultivariateRandomVariable(univariate_variables)
+        var_trans = AffineRandomVariableTransformation(variable)
+        num_vars = len(univariate_variables)
+
+        poly = PolynomialChaosExpansion()
+        poly_opts = define_poly_options_from_variable_transformation(var_trans)
+        poly.configure(poly_opts)
+        samples = generate_independent_random_samples(variable, 20)
+        cache = BasisMatrixCache(poly, samples)
+
+        indices = compute_hyperbolic_indices(num_vars, 2, 1.0)
+        poly.set_indices(indices)
+        assert np.allclose(cache(indices), poly.basis_matrix(samples))
+        assert cache.num_columns() == indices.shape[1]
+
+        # only the columns of the new indices are evaluated
+        new_indices = compute_hyperbolic_indices(num_vars, 3, 1.0)
+        new_indices = new_indices[:, ::-1]
+        basis_matrix = cache(new_indices)
+        assert cache.num_columns() == new_indices.shape[1]
+        assert np.allclose(poly.indices, indices)
+        poly.set_indices(new_indices)
+        assert np.allclose(basis_matrix, poly.basis_matrix(samples))
+
+        # only the rows of new samples are evaluated
+        samples = np.hstack(
+            [samples, generate_independent_random_samples(variable, 5)])
+        cache.update_samples(samples)
+        assert cache.num_columns() == new_indices.shape[1]
+        assert np.allclose(cache(new_indices), poly.basis_matrix(samples))
+
+        # the cache is cleared when the samples change
+        samples = generate_independent_random_samples(variable, 5)
+        cache.update_samples(samples)
+        assert cache.num_columns() == 0
+        poly.set_indices(indices[:, 2:5])
+        assert np.allclose(cache(indices[:, 2:5]), poly.basis_matrix(samples))
+
     def test_hahn_hypergeometric(self):
         degree = 4
         M, n, N = 20, 7, 12
@@ -667,6 +811,53 @@ class TestMultivariatePolynomials(unittest.TestCase):
         # print(poly3(samples),poly1(samples)*poly2(samples))
         assert np.allclose(poly3(samples), poly1(samples)*poly2(samples))
 
+    def test_multiply_multivariate_orthonormal_polynomial_expansions_sparse(
+            self):
+        univariate_variables = [norm(), uniform(), beta(2, 3), uniform()]
+        variable = IndependentMultivariateRandomVariable(
+            univariate_variables)
+        num_vars = variable.num_vars()
+
+        poly1 = get_polynomial_from_variable(variable)
+        poly1.set_indices(compute_hyperbolic_indices(num_vars, 3))
+        poly1.set_coefficients(np.random.normal(
+            0, 1, (poly1.indices.shape[1], 2)))
+        poly2 = get_polynomial_from_variable(variable)
+        # use an index set that is not downward closed
+        poly2.set_indices(compute_hyperbolic_indices(num_vars, 2)[:, 3:])
+        poly2.set_coefficients(np.random.normal(
+            0, 1, (poly2.indices.shape[1], 2)))
+
+        max_degrees = np.maximum(
+            poly1.indices.max(axis=1), poly2.indices.max(axis=1))
+        product_tables = compute_orthonormal_basis_product_tables(
+            poly1, max_degrees)
+        # the variables with the same distribution share a table
+        assert product_tables[1].shape[0] == 3
+        indices, coefs = \
+            multiply_multivariate_orthonormal_polynomial_expansions_sparse(
+                product_tables, poly1.indices, poly1.coefficients,
+                poly2.indices, poly2.coefficients)
+        # indices of the product are unique
+        assert np.unique(indices, axis=1).shape[1] == indices.shape[1]
+
+        product_coefs_1d = compute_product_coeffs_1d_for_each_variable(
+            copy.deepcopy(poly1), poly1.indices.max(axis=1),
+            poly2.indices.max(axis=1))
+        true_indices, true_coefs = \
+            multiply_multivariate_orthonormal_polynomial_expansions(
+                product_coefs_1d, poly1.indices, poly1.coefficients,
+                poly2.indices, poly2.coefficients)
+        assert indices.shape[1] == true_indices.shape[1]
+        indices_dict = dict(
+            (hash_array(index), ii) for ii, index in enumerate(indices.T))
+        II = [indices_dict[hash_array(index)] for index in true_indices.T]
+        assert np.allclose(coefs[II], true_coefs)
+
+        poly3 = poly1**3
+        samples = generate_independent_random_samples(variable, 10)
+        assert np.allclose(poly3(samples), poly1(samples)**3)
+
     def test_multiply_pce(self):
         np.random.seed(1)
         np.set_printoptions(precision=16)
@@ -89,6 +89,39 @@ class TestOrthonormalPolynomials1D(unittest.TestCase):
         # x0 = np.atleast_2d(x[0])
         # check_gradients(fun, jac, x0)
 
+    def test_high_order_derivatives_of_orthonormal_polynomials(self):
+        degree, deriv_order = 6, 4
+        ab = jacobi_recurrence(degree+1, alpha=1, beta=2, probability=True)
+        x = np.linspace(-1, 1, 11)
+        pd = evaluate_orthonormal_polynomial_deriv_1d(
+            x, degree, ab, deriv_order)
+        assert np.allclose(
+            pd, evaluate_orthonormal_polynomial_deriv_1d_vectorized(
+                x, degree, ab, deriv_order))
+
+        # compare with the derivatives of the monomial expansions of the
+        # polynomials
+        monomial_coefs = convert_orthonormal_polynomials_to_monomials_1d(
+            ab, degree)
+        for ii in range(deriv_order+1):
+            for jj in range(degree+1):
+                true_pd = np.polynomial.polynomial.polyval(
+                    x, np.polynomial.polynomial.polyder(
+                        monomial_coefs[jj, :], ii))
+                assert np.allclose(pd[:, ii*(degree+1)+jj], true_pd)
+
+        # check derivatives of order larger than the degree are zero
+        pd = evaluate_orthonormal_polynomial_deriv_1d(x, 1, ab, 3)
+        assert np.allclose(pd[:, 4:], 0)
+
+        # check the samples are evaluated in parallel correctly
+        x = np.random.uniform(-1, 1, MIN_NUM_SAMPLES_PARALLEL_1D)
+        pd = evaluate_orthonormal_polynomial_deriv_1d(
+            x, degree, ab, deriv_order)
+        assert np.allclose(
+            pd, evaluate_orthonormal_polynomial_deriv_1d_vectorized(
+                x, degree, ab, deriv_order))
+
     def test_orthonormality_physicists_hermite_polynomial(self):
         rho = 0.
         degree = 2
@@ -545,6 +545,22 @@ class TestSparseGrid(unittest.TestCase):
             samples_1d, subspace_values_indices)
         assert np.allclose(approx_values, validation_values)
 
+        # check evaluating in chunks is consistent with summing the
+        # interpolants of each subspace
+        subspace_approx_values = 0
+        for ii in range(subspace_indices.shape[1]):
+            subspace_approx_values += smolyak_coefficients[ii]*\
+                evaluate_sparse_grid_subspace(
+                    validation_samples, subspace_indices[:, ii],
+                    get_subspace_values(values, subspace_values_indices[ii]),
+                    samples_1d, None, False)
+        approx_values = evaluate_sparse_grid(
+            validation_samples, values, poly_indices_dict,
+            subspace_indices, subspace_poly_indices, smolyak_coefficients,
+            samples_1d, subspace_values_indices,
+            max_num_samples_per_chunk=7)
+        assert np.allclose(approx_values, subspace_approx_values)
+
         config_variables_idx = None
         moments = integrate_sparse_grid(values, poly_indices_dict,
                                         subspace_indices,
@@ -718,6 +734,51 @@ class TestAdaptiveSparseGrid(unittest.TestCase):
     def setUp(self):
         np.random.seed(1)
 
+    def setup_adaptive_sparse_grid(
+            self, num_vars, max_level, function,
+            refinement_indicator=variance_refinement_indicator,
+            max_num_sparse_grid_samples=None,
+            univariate_quad_rule=clenshaw_curtis_in_polynomial_order,
+            univariate_growth_rule=clenshaw_curtis_rule_growth):
+        """
+        Return an adaptive sparse grid, by default using Clenshaw-Curtis
+        rules, which only refines subspaces with levels at most max_level.
+        """
+        admissibility_function = partial(
+            max_level_admissibility_function, max_level, None,
+            max_num_sparse_grid_samples, None)
+        sparse_grid = CombinationSparseGrid(num_vars)
+        sparse_grid.set_refinement_functions(
+            refinement_indicator, admissibility_function,
+            univariate_growth_rule)
+        sparse_grid.set_univariate_rules(univariate_quad_rule)
+        sparse_grid.set_function(function)
+        return sparse_grid
+
+    def check_isotropic_sparse_grid(self, sparse_grid, max_level):
+        """
+        Check an adaptive sparse grid built without a termination criteria
+        recovers the isotropic sparse grid of level max_level.
+        """
+        __, __, isotropic_data_structures = get_sparse_grid_samples_and_weights(
+            sparse_grid.num_vars, max_level,
+            clenshaw_curtis_in_polynomial_order, clenshaw_curtis_rule_growth)
+        I = np.where(np.abs(sparse_grid.smolyak_coefficients) > 0)[0]
+        J = np.where(np.abs(isotropic_data_structures[3]) > 0)[0]
+        assert I.shape == J.shape
+        assert set_difference(
+            isotropic_data_structures[2][:, J],
+            sparse_grid.subspace_indices[:, I]).shape[1] == 0
+        isotropic_coeffs = dict(
+            [(hash_array(isotropic_data_structures[2][:, jj]),
+              isotropic_data_structures[3][jj]) for jj in J])
+        for ii in I:
+            assert np.allclose(
+                sparse_grid.smolyak_coefficients[ii], isotropic_coeffs[
+                    hash_array(sparse_grid.subspace_indices[:, ii])])
+        assert np.allclose(
+            sparse_grid(sparse_grid.samples), sparse_grid.values)
+
     def test_get_smolyak_coefficients(self):
         num_vars = 2
         level = 2
@@ -848,6 +909,50 @@ class TestAdaptiveSparseGrid(unittest.TestCase):
         assert set_difference(
             smolyak_coeffs_lp1[J], smolyak_coeffs[I]).shape[0] == 0
 
+        # updating with all the new indices at once gives the same result
+        batch_smolyak_coeffs = update_smolyak_coefficients(
+            new_indices, subspace_indices, np.append(
+                smolyak_coeffs_l, np.zeros(new_indices.shape[1])))
+        assert np.allclose(batch_smolyak_coeffs, smolyak_coeffs)
+
+    def test_subspace_indices_are_admissible(self):
+        from pyapprox.indexing import compute_hyperbolic_indices
+        num_vars = 3
+        level = 2
+        __, __, data_structures = get_sparse_grid_samples_and_weights(
+            num_vars, level, clenshaw_curtis_in_polynomial_order,
+            clenshaw_curtis_rule_growth)
+        subspace_indices = data_structures[2]
+        subspace_indices_dict = dict()
+        for ii in range(subspace_indices.shape[1]):
+            subspace_indices_dict[hash_array(subspace_indices[:, ii])] = ii
+
+        candidate_indices = compute_hyperbolic_indices(num_vars, level+2, 1)
+        admissible = subspace_indices_are_admissible(
+            candidate_indices, subspace_indices)
+        for ii in range(candidate_indices.shape[1]):
+            assert admissible[ii] == subspace_index_is_admissible(
+                candidate_indices[:, ii], subspace_indices_dict)
+        assert np.all(candidate_indices[:, admissible].sum(axis=0) == level+1)
+
+        # indices not in the downward closed set, e.g. active subspaces,
+        # are not admissible and are not backward neighbors
+        in_set = ((subspace_indices.sum(axis=0) < level) |
+                  (subspace_indices[0] == level))
+        admissible = subspace_indices_are_admissible(
+            candidate_indices, subspace_indices, in_set)
+        assert np.allclose(
+            candidate_indices[:, admissible], [[level+1], [0], [0]])
+
+        ids = get_index_ids(candidate_indices, subspace_indices)
+        assert np.allclose(
+            subspace_indices[:, ids[ids >= 0]], candidate_indices[:, ids >= 0])
+        assert np.all(candidate_indices[:, ids < 0].sum(axis=0) > level)
+        # indices that cannot be packed into a 64 bit integer
+        large_indices = subspace_indices*2**30
+        assert np.allclose(get_index_ids(
+            candidate_indices*2**30, large_indices), ids)
+
     def test_hierarchical_surplus_equivalence(self):
         num_vars = 2
         max_level = 4
@@ -890,8 +995,63 @@ class TestAdaptiveSparseGrid(unittest.TestCase):
 
                 assert np.allclose(surpluses1, surpluses2)
 
+            if len(items) > 0:
+                active_subspace_indices = sparse_grid.subspace_indices[
+                    :, [item[2] for item in items]]
+                for hierarchical in [True, False]:
+                    surpluses_list = compute_surpluses_batch(
+                        active_subspace_indices, sparse_grid, hierarchical)
+                    for ii in range(len(items)):
+                        surpluses, hier_indices = compute_surpluses(
+                            active_subspace_indices[:, ii], sparse_grid,
+                            hierarchical)
+                        assert np.allclose(surpluses_list[ii][0], surpluses)
+                        assert np.all(surpluses_list[ii][1] == hier_indices)
+
             sparse_grid.refine()
 
+    def test_batch_refinement_indicator(self):
+        num_vars = 3
+        max_level = 4
+
+        # use an anisotropic function with interactions so that no two
+        # subspaces have the same priority
+        def function(x): return np.array(
+            [np.exp(np.array([1, 0.6, 0.3]).dot(x)),
+             2+np.cos(x[0]+x[1]*x[2])]).T
+
+        def gauss_growth_rule(level): return 2*level+1
+
+        def gauss_legendre_rule(level):
+            # the samples of consecutive levels are not nested
+            weights = [gauss_jacobi_pts_wts_1D(gauss_growth_rule(ll), 0, 0)[1]
+                       for ll in range(level+1)]
+            samples = gauss_jacobi_pts_wts_1D(
+                gauss_growth_rule(level), 0, 0)[0]
+            return samples, weights
+
+        for quad_rule, growth_rule in [
+                (clenshaw_curtis_in_polynomial_order,
+                 clenshaw_curtis_rule_growth),
+                (gauss_legendre_rule, gauss_growth_rule)]:
+            sparse_grids = []
+            for batch in [False, True]:
+                sparse_grid = self.setup_adaptive_sparse_grid(
+                    num_vars, max_level, function,
+                    partial(surplus_refinement_indicator, norm_order=1), 200,
+                    quad_rule, growth_rule)
+                if batch:
+                    sparse_grid.set_batch_refinement_indicator(partial(
+                        surplus_refinement_indicator_batch, norm_order=1))
+                sparse_grid.build()
+                sparse_grids.append(sparse_grid)
+
+            assert np.allclose(sparse_grids[0].subspace_indices,
+                               sparse_grids[1].subspace_indices)
+            assert np.allclose(sparse_grids[0].error, sparse_grids[1].error)
+            assert np.allclose(sparse_grids[0].smolyak_coefficients,
+                               sparse_grids[1].smolyak_coefficients)
+
     def test_variable_transformation(self):
         num_vars = 2
         max_level = 4
@@ -1148,6 +1308,164 @@ class TestAdaptiveSparseGrid(unittest.TestCase):
             sparse_grid.smolyak_coefficients)
         assert np.allclose(num_samples, sparse_grid.values.shape[0])
 
+    def test_batch_refinement(self):
+        num_vars = 3
+        max_level = 4
+
+        def function(x): return np.array(
+            [np.cos(np.sum(x, axis=0)), np.sum(x**4, axis=0)]).T
+
+        ncalls = []
+        for batch_size in [1, 4]:
+            def counting_function(x):
+                ncalls[-1] += 1
+                return function(x)
+            ncalls.append(0)
+            sparse_grid = self.setup_adaptive_sparse_grid(
+                num_vars, max_level, counting_function)
+            sparse_grid.set_refinement_batch(batch_size)
+            sparse_grid.build()
+
+            # without a termination criteria both modes must recover the
+            # isotropic sparse grid
+            self.check_isotropic_sparse_grid(sparse_grid, max_level)
+        assert ncalls[1] < ncalls[0]
+
+    def test_build_asynchronously(self):
+        from concurrent.futures import ThreadPoolExecutor
+        num_vars = 3
+        max_level = 4
+
+        def function(x): return np.array(
+            [np.cos(np.sum(x, axis=0)), np.sum(x**4, axis=0)]).T
+
+        sparse_grid = self.setup_adaptive_sparse_grid(
+            num_vars, max_level, function)
+        validation_samples = np.random.uniform(-1, 1, (num_vars, 10))
+        sparse_grid.set_interrogation_samples(validation_samples)
+        with ThreadPoolExecutor(4) as executor:
+            # by default at most as many subspaces as workers are pending
+            sparse_grid.build_asynchronously(executor)
+
+        assert np.allclose(sparse_grid.values, function(sparse_grid.samples))
+        self.check_isotropic_sparse_grid(sparse_grid, max_level)
+        assert np.allclose(sparse_grid.evaluate_at_interrogation_samples(),
+                           sparse_grid(validation_samples))
+        assert np.allclose(
+            sparse_grid.moments(), integrate_sparse_grid(
+                sparse_grid.values, sparse_grid.poly_indices_dict,
+                sparse_grid.subspace_indices,
+                sparse_grid.subspace_poly_indices_list,
+                sparse_grid.smolyak_coefficients, sparse_grid.weights_1d,
+                sparse_grid.subspace_values_indices_list))
+
+    def test_stream_moments(self):
+        num_vars = 3
+        max_level = 4
+
+        def function(x): return np.array(
+            [np.cos(np.sum(x, axis=0)), np.sum(x**4, axis=0),
+             np.exp(x[0])]).T
+
+        sparse_grids = []
+        for stream_moments in [False, True]:
+            sparse_grid = self.setup_adaptive_sparse_grid(
+                num_vars, max_level, function)
+            sparse_grid.set_stream_moments(stream_moments)
+            sparse_grids.append(sparse_grid)
+
+        for sparse_grid in sparse_grids:
+            sparse_grid.refine()
+            sparse_grid.refine()
+            # the moments after adding an active subspace are computed
+            # without storing subspace moments
+            smolyak_coeffs = update_smolyak_coefficients(
+                sparse_grid.subspace_indices[:, -1],
+                sparse_grid.subspace_indices,
+                sparse_grid.smolyak_coefficients)
+            assert np.allclose(
+                sparse_grid.moments_(smolyak_coeffs), integrate_sparse_grid(
+                    sparse_grid.values, sparse_grid.poly_indices_dict,
+                    sparse_grid.subspace_indices,
+                    sparse_grid.subspace_poly_indices_list,
+                    smolyak_coeffs, sparse_grid.weights_1d,
+                    sparse_grid.subspace_values_indices_list))
+            sparse_grid.build()
+        # the order of refinement of subspaces with the same priority can
+        # differ but the final grids are the same
+        assert np.allclose(
+            sparse_grids[0].moments(), sparse_grids[1].moments())
+        assert sparse_grids[1].subspace_moments is None
+        assert np.allclose(
+            sparse_grids[1].moments(), integrate_sparse_grid(
+                sparse_grids[1].values, sparse_grids[1].poly_indices_dict,
+                sparse_grids[1].subspace_indices,
+                sparse_grids[1].subspace_poly_indices_list,
+                sparse_grids[1].smolyak_coefficients,
+                sparse_grids[1].weights_1d,
+                sparse_grids[1].subspace_values_indices_list))
+
+    def test_checkpoint(self):
+        import tempfile
+        num_vars = 3
+        max_level = 4
+
+        def function(x): return np.array(
+            [np.cos(np.sum(x, axis=0)), np.sum(x**4, axis=0)]).T
+
+        setup_sparse_grid = partial(
+            self.setup_adaptive_sparse_grid, num_vars, max_level,
+            function)
+
+        validation_samples = np.random.uniform(-1, 1, (num_vars, 10))
+        sparse_grid = setup_sparse_grid()
+        sparse_grid.set_interrogation_samples(validation_samples)
+        with tempfile.TemporaryDirectory() as dirname:
+            for ii in range(5):
+                sparse_grid.refine()
+                sparse_grid.save_checkpoint(dirname)
+            # chunks only contain the samples added since the last save
+            data = np.load(os.path.join(dirname, 'data-4.npz'))
+            assert data['samples'].shape[1] < sparse_grid.samples.shape[1]
+
+            restarted_sparse_grid = setup_sparse_grid()
+            num_function_evaluations = [0]
+
+            def counting_function(x):
+                num_function_evaluations[0] += x.shape[1]
+                return function(x)
+            restarted_sparse_grid.set_function(counting_function)
+            restarted_sparse_grid.set_interrogation_samples(
+                validation_samples)
+            restarted_sparse_grid.load_checkpoint(dirname)
+        assert num_function_evaluations[0] == 0
+
+        for name in ['samples', 'values', 'subspace_indices',
+                     'smolyak_coefficients', 'all_data_smolyak_coefficients',
+                     'error', 'subspace_moments',
+                     'num_equivalent_function_evaluations',
+                     'active_subspace_queue', 'subspace_indices_dict',
+                     'active_subspace_indices_dict', 'poly_indices_dict']:
+            assert np.all(getattr(sparse_grid, name) ==
+                          getattr(restarted_sparse_grid, name)), name
+        # the interrogation values are accumulated in a different order
+        for name in ['interrogation_values', 'all_data_interrogation_values']:
+            assert np.allclose(getattr(sparse_grid, name),
+                               getattr(restarted_sparse_grid, name)), name
+
+        # the resumed build must match the uninterrupted build
+        num_restored_samples = restarted_sparse_grid.samples.shape[1]
+        sparse_grid.build()
+        restarted_sparse_grid.build()
+        assert num_function_evaluations[0] == (
+            restarted_sparse_grid.samples.shape[1]-num_restored_samples)
+        assert np.allclose(
+            sparse_grid.smolyak_coefficients,
+            restarted_sparse_grid.smolyak_coefficients)
+        assert np.allclose(sparse_grid.values, restarted_sparse_grid.values)
+        assert np.allclose(sparse_grid.evaluate_at_interrogation_samples(),
+                           restarted_sparse_grid(validation_samples))
+
     def test_evaluate_using_all_data(self):
         """
         Check that for a level 0 grid with all level 1 subspaces active
@@ -1236,6 +1554,97 @@ class TestAdaptiveSparseGrid(unittest.TestCase):
             sparse_grid.smolyak_coefficients)
         assert np.allclose(num_samples, sparse_grid.values.shape[0])
 
+    def test_incremental_interrogation_values(self):
+        num_vars = 2
+        max_level = 4
+
+        def function(x): return np.array(
+            [np.cos(np.sum(x, axis=0)), np.sum(x**6, axis=0)]).T
+
+        admissibility_function = partial(
+            max_level_admissibility_function, max_level, None, None, None)
+
+        sparse_grid = CombinationSparseGrid(num_vars)
+        sparse_grid.set_refinement_functions(
+            variance_refinement_indicator, admissibility_function,
+            clenshaw_curtis_rule_growth)
+        sparse_grid.set_univariate_rules(
+            clenshaw_curtis_in_polynomial_order)
+        sparse_grid.set_function(function)
+        validation_samples = np.random.uniform(-1, 1, (num_vars, 20))
+        sparse_grid.set_interrogation_samples(validation_samples)
+
+        def callback(sparse_grid):
+            assert np.allclose(
+                sparse_grid.evaluate_at_interrogation_samples(),
+                sparse_grid(validation_samples))
+            # include all active subspaces by updating smolyak coefficients
+            pairs, sparse_grid.active_subspace_queue = \
+                extract_items_from_priority_queue(
+                    sparse_grid.active_subspace_queue)
+            smolyak_coefficients = sparse_grid.smolyak_coefficients.copy()
+            for pair in pairs:
+                smolyak_coefficients = update_smolyak_coefficients(
+                    sparse_grid.subspace_indices[:, pair[-1]],
+                    sparse_grid.subspace_indices, smolyak_coefficients)
+            assert np.allclose(
+                smolyak_coefficients,
+                sparse_grid.all_data_smolyak_coefficients)
+            assert np.allclose(
+                sparse_grid.evaluate_at_interrogation_samples(True),
+                sparse_grid.evaluate_using_all_data(validation_samples))
+
+        sparse_grid.refine()
+        callback(sparse_grid)
+        sparse_grid.build(callback)
+
+        # setting new samples after the grid is built
+        validation_samples = np.random.uniform(-1, 1, (num_vars, 20))
+        sparse_grid.set_interrogation_samples(validation_samples)
+        callback(sparse_grid)
+
+    def test_append_to_buffered_array(self):
+        buffer, array, buffers = None, None, set()
+        true_array = np.zeros((2, 0))
+        for ii in range(100):
+            new_array = np.random.normal(0, 1, (2, ii % 3))
+            buffer, array = append_to_buffered_array(
+                buffer, array, new_array, 1)
+            true_array = np.hstack((true_array, new_array))
+            assert np.allclose(array, true_array)
+            buffers.add(id(buffer))
+        # the capacity of the buffer is doubled when exceeded
+        assert len(buffers) <= np.log2(true_array.shape[1])+2
+
+    def test_smolyak_coefficients_updated_in_buffer(self):
+        num_vars, max_level = 2, 5
+
+        def function(x): return np.sum(x**2, axis=0)[:, np.newaxis]
+
+        sparse_grid = self.setup_adaptive_sparse_grid(
+            num_vars, max_level, function)
+        sparse_grid.set_interrogation_samples(
+            np.random.uniform(-1, 1, (num_vars, 5)))
+        sparse_grid.refine()
+        buffers = set()
+        for ii in range(10):
+            sparse_grid.refine()
+            for name in ['smolyak_coefficients',
+                         'all_data_smolyak_coefficients']:
+                # the coefficients are updated without leaving their buffer
+                assert getattr(sparse_grid, name).base is \
+                    sparse_grid._buffers[name]
+                buffers.add(id(sparse_grid._buffers[name]))
+        assert len(buffers) <= 2*(np.log2(
+            sparse_grid.subspace_indices.shape[1])+2)
+        samples = sparse_grid.canonical_interrogation_samples
+        assert np.allclose(
+            sparse_grid.evaluate_at_interrogation_samples(),
+            sparse_grid(samples))
+        assert np.allclose(
+            sparse_grid.evaluate_at_interrogation_samples(True),
+            sparse_grid.evaluate_using_all_data(samples))
+
     def test_extract_items_from_priority_queue(self):
         pairs = [(0., 0), (10., 1), (2, 2)]
         #pqueue = queue.PriorityQueue()
@@ -1,5 +1,6 @@
 import unittest
 from pyapprox.univariate_quadrature import *
+from pyapprox.univariate_quadrature import _leja_sequence_cache
 from scipy.special import gamma as gamma_fn
 from scipy.special import beta as beta_fn
 from pyapprox.utilities import beta_pdf_on_ab, gaussian_pdf
@@ -198,6 +199,55 @@ class TestUnivariateQuadrature(unittest.TestCase):
         assert np.allclose(samples[0], 2*(variable.ppf(0.5)+2)/3-1)
         assert np.allclose((samples**2).dot(weights[-1]), 1/3)
 
+    def test_cached_leja_sequence(self):
+        import tempfile
+        from scipy import stats
+        variable = stats.beta(2, 3, loc=-1, scale=4)
+        growth_rule = partial(constant_increment_growth_rule, 2)
+        quad_rule = get_univariate_leja_quadrature_rule(
+            variable, growth_rule, method='pdf')
+        level = 5
+        clear_leja_sequence_cache()
+        samples, weights = quad_rule(level)
+
+        # rules of other instances of the variable use the cached sequence
+        # and the cached sequence is extended to higher levels
+        clear_leja_sequence_cache()
+        with tempfile.TemporaryDirectory() as dirname:
+            set_leja_sequence_cache_dir(dirname)
+            try:
+                quad_rule = get_univariate_leja_quadrature_rule(
+                    stats.beta(2, 3, loc=0, scale=2), growth_rule,
+                    method='pdf')
+                cached_samples, cached_weights = quad_rule(level-2)
+                assert np.allclose(
+                    cached_samples, samples[:growth_rule(level-2)])
+                assert len(os.listdir(dirname)) == 1
+                key = get_leja_sequence_cache_key('pdf', variable)
+                assert _leja_sequence_cache[key].shape[1] == growth_rule(
+                    level-2)
+
+                cached_samples, cached_weights = quad_rule(level)
+                assert _leja_sequence_cache[key].shape[1] == growth_rule(
+                    level)
+                assert np.allclose(cached_samples, samples)
+                for ll in range(level+1):
+                    assert np.allclose(cached_weights[ll], weights[ll])
+
+                # sequences are loaded from disk if not in memory
+                clear_leja_sequence_cache()
+                cached_samples, cached_weights = quad_rule(level)
+                assert np.allclose(cached_samples, samples)
+                assert key in _leja_sequence_cache
+
+                # modifying a returned sequence does not change the cache
+                sequence = get_cached_leja_sequence_1d(
+                    key, 3, np.zeros((1, 0)), None)
+                sequence[:] = np.nan
+                assert np.all(np.isfinite(_leja_sequence_cache[key]))
+            finally:
+                set_leja_sequence_cache_dir(None)
+
     def test_sampled_based_christoffel_leja_quadrature_rule(self):
         nsamples = int(1e6)
         samples = np.random.normal(0, 1, (1, nsamples))
@@ -383,6 +383,154 @@ def candidate_based_christoffel_leja_rule_1d(
     return leja_sequence[0, :], ordered_weights_1d
 
 
+# Leja sequences shared by all the quadrature rules created in this process.
+# The sequences are expensive to compute because each point is the solution
+# of an optimization problem, but they are nested so a sequence computed
+# for one sparse grid can be reused, and extended, by any other.
+_leja_sequence_cache = dict()
+_leja_sequence_cache_dir = None
+
+
+def set_leja_sequence_cache_dir(dirname):
+    """
+    Set the directory used to store Leja sequences on disk so that they
+    can be shared between processes. The directory is created if it does
+    not exist.
+
+    Parameters
+    ----------
+    dirname : string
+        The directory. If None sequences are only cached in memory
+    """
+    global _leja_sequence_cache_dir
+    if dirname is not None and not os.path.exists(dirname):
+        os.makedirs(dirname)
+    _leja_sequence_cache_dir = dirname
+
+
+def clear_leja_sequence_cache():
+    """
+    Remove all the Leja sequences cached in memory. Sequences stored on
+    disk are not removed.
+    """
+    _leja_sequence_cache.clear()
+
+
+def _get_leja_sequence_cache_filename(key):
+    import hashlib
+    return os.path.join(
+        _leja_sequence_cache_dir,
+        'leja-sequence-%s.npz' % hashlib.sha1(repr(key).encode()).hexdigest())
+
+
+def get_leja_sequence_cache_key(method, variable, *args):
+    """
+    Return the key used to cache the Leja sequence of a variable.
+
+    Bounded variables are mapped to [-1, 1] so the key only depends on the
+    name and the shape parameters of the variable. Unbounded variables
+    also depend on their location and scale.
+
+    Parameters
+    ----------
+    method : string
+        The type of the Leja sequence
+
+    variable : scipy.stats.dist
+        The variable
+
+    args : iterable
+        Any other scalar options that change the sequence
+
+    Returns
+    -------
+    key : tuple
+        The key
+    """
+    import hashlib
+    name, scales, shapes = get_distribution_info(variable)
+    params = shapes.copy()
+    if not is_bounded_continuous_variable(variable):
+        params.update(scales)
+    # the repr of large arrays is truncated and hash() of bytes changes
+    # between processes so identify arrays by a digest of their data
+    params = tuple(
+        (param_name, float(value) if np.isscalar(value) or np.ndim(value) == 0
+         else hashlib.sha1(np.asarray(value).tobytes()).hexdigest())
+        for param_name, value in sorted(params.items()))
+    return (method, name, params)+tuple(args)
+
+
+def get_cached_leja_sequence_1d(key, num_samples, initial_points,
+                                generate_sequence):
+    """
+    Return a Leja sequence using the sequences previously generated for
+    the same variable if possible.
+
+    A cached sequence is used if it starts with the initial points or
+    if the initial points start with the cached sequence. If the cached
+    sequence is too short it is extended by passing it to
+    generate_sequence as the initial points and the longer sequence is
+    cached.
+
+    Parameters
+    ----------
+    key : tuple
+        Uniquely identifies the sequence, e.g. the type of Leja sequence
+        and the name and shape parameters of the variable in the
+        canonical domain. Must have a deterministic repr
+
+    num_samples : integer
+        The number of samples in the sequence
+
+    initial_points : np.ndarray (1, num_initial_points)
+        Points that must be the first points of the sequence
+
+    generate_sequence : callable
+        Function with signature
+
+        `generate_sequence(num_samples, initial_points) -> np.ndarray (1, num_samples)`
+
+    Returns
+    -------
+    leja_sequence : np.ndarray (1, num_samples)
+        The Leja sequence. A copy of the cached sequence
+    """
+    leja_sequence = _leja_sequence_cache.get(key)
+    filename = None
+    if _leja_sequence_cache_dir is not None:
+        filename = _get_leja_sequence_cache_filename(key)
+        if leja_sequence is None and os.path.exists(filename):
+            with np.load(filename) as data:
+                if data['key'] == repr(key):
+                    leja_sequence = data['samples']
+                    _leja_sequence_cache[key] = leja_sequence
+
+    if leja_sequence is not None:
+        num_points = min(leja_sequence.shape[1], initial_points.shape[1])
+        if not np.allclose(leja_sequence[:, :num_points],
+                           initial_points[:, :num_points]):
+            # the initial points are inconsistent with the cached sequence
+            return generate_sequence(num_samples, initial_points)
+        # generate_sequence never removes initial points
+        num_samples = max(num_samples, initial_points.shape[1])
+        if leja_sequence.shape[1] >= num_samples:
+            # return a copy so callers cannot modify the cached sequence
+            return leja_sequence[:, :num_samples].copy()
+        if leja_sequence.shape[1] > initial_points.shape[1]:
+            initial_points = leja_sequence
+
+    leja_sequence = generate_sequence(num_samples, initial_points)
+    _leja_sequence_cache[key] = leja_sequence
+    if filename is not None:
+        # write to a temporary file so other processes never read a
+        # partially written file
+        tmp_filename = filename[:-4]+'-%d.npz' % os.getpid()
+        np.savez(tmp_filename, samples=leja_sequence, key=repr(key))
+        os.replace(tmp_filename, filename)
+    return leja_sequence.copy()
+
+
 def univariate_christoffel_leja_quadrature_rule(
         variable, growth_rule, level, return_weights_for_all_levels=True,
         initial_points=None,
@@ -471,9 +619,16 @@ def univariate_christoffel_leja_quadrature_rule(
         if initial_points.shape[1] == 1:
             assert initial_points[0, 0] != 0
 
-    leja_sequence = get_christoffel_leja_sequence_1d(
-        max_nsamples, initial_points, bounds, basis_fun,
-        {'gtol':1e-8, 'verbose':False}, callback=None)
+    def generate_sequence(num_samples, initial_points):
+        return get_christoffel_leja_sequence_1d(
+            num_samples, initial_points, bounds, basis_fun,
+            {'gtol':1e-8, 'verbose':False}, callback=None)
+
+    key = get_leja_sequence_cache_key(
+        'christoffel', variable,
+        numerically_generated_poly_accuracy_tolerance)
+    leja_sequence = get_cached_leja_sequence_1d(
+        key, max_nsamples, initial_points, generate_sequence)
 
     __basis_fun = partial(basis_fun, nmax=max_nsamples-1, deriv_order=0)
     ordered_weights_1d =  get_christoffel_leja_quadrature_weights_1d(
@@ -579,9 +734,14 @@ def univariate_pdf_weighted_leja_quadrature_rule(
             loc, scale = scales['loc'], scales['scale']
             initial_points = (initial_points-loc)/scale
 
-    leja_sequence = get_pdf_weighted_leja_sequence_1d(
-        max_nsamples, initial_points, bounds, basis_fun, pdf, pdf_jac,
-        {'gtol':1e-8, 'verbose':False}, callback=None)
+    def generate_sequence(num_samples, initial_points):
+        return get_pdf_weighted_leja_sequence_1d(
+            num_samples, initial_points, bounds, basis_fun, pdf, pdf_jac,
+            {'gtol':1e-8, 'verbose':False}, callback=None)
+
+    key = get_leja_sequence_cache_key('pdf', variable)
+    leja_sequence = get_cached_leja_sequence_1d(
+        key, max_nsamples, initial_points, generate_sequence)
     
     __basis_fun = partial(basis_fun, nmax=max_nsamples-1, deriv_order=0)
     ordered_weights_1d =  get_pdf_weighted_leja_quadrature_weights_1d(
@@ -281,6 +281,26 @@ def hash_array(array, decimals=None):
     return hash(array.tobytes())
 
 
+def hash_array_columns(array):
+    r"""
+    Hash each column of an array for dictionary or set based lookup.
+    The keys are identical to those returned by calling
+    :func:`hash_array` on each column but are computed without copying
+    each column separately.
+
+    Parameters
+    ----------
+    array : np.ndarray (num_rows, num_cols)
+       The integer array to hash
+
+    Returns
+    -------
+    keys : list (num_cols)
+       The hash value of each column
+    """
+    return [hash(row.tobytes()) for row in np.ascontiguousarray(array.T)]
+
+
 def unique_matrix_rows(matrix):
     unique_rows = []
     unique_rows_set = set()
@@ -1493,12 +1513,71 @@ def update_cholesky_factorization(L_11, A_12, A_22):
     assert A_22.shape == (ncols, ncols)
     assert L_11.shape == (nrows, nrows)
     L_12 = solve_triangular(L_11, A_12, lower=True)
-    print(A_22 - L_12.T.dot(L_12))
     L_22 = np.linalg.cholesky(A_22 - L_12.T.dot(L_12))
     L = np.block([[L_11, np.zeros((nrows, ncols))], [L_12.T, L_22]])
     return L
 
 
+def update_cholesky_factorization_rank_one(L, vec):
+    r"""
+    Compute the Cholesky factorization of :math:`A+vv^T` from the
+    Cholesky factorization :math:`A=LL^T` using Givens rotations.
+
+    The cost is :math:`O(n^2)` instead of the :math:`O(n^3)` cost of
+    factorizing the updated matrix.
+
+    Parameters
+    ----------
+    L : np.ndarray (nrows, nrows)
+        The lower-triangular Cholesky factor of :math:`A`
+
+    vec : np.ndarray (nrows)
+        The vector :math:`v`
+
+    Returns
+    -------
+    L_up : np.ndarray (nrows, nrows)
+        The lower-triangular Cholesky factor of :math:`A+vv^T`
+    """
+    L = L.copy()
+    vec = np.array(vec, dtype=float)
+    for kk in range(L.shape[0]):
+        rr = np.hypot(L[kk, kk], vec[kk])
+        cc, ss = rr/L[kk, kk], vec[kk]/L[kk, kk]
+        L[kk, kk] = rr
+        L[kk+1:, kk] = (L[kk+1:, kk]+ss*vec[kk+1:])/cc
+        vec[kk+1:] = cc*vec[kk+1:]-ss*L[kk+1:, kk]
+    return L
+
+
+def delete_cholesky_factorization_row_and_column(L, idx):
+    r"""
+    Compute the Cholesky factorization of the matrix :math:`A=LL^T` with
+    the row and column ``idx`` removed.
+
+    Removing the row and column of :math:`A` removes the row of :math:`L`
+    and the trailing factor absorbs the removed column via a rank-one
+    update, so the cost is :math:`O(n^2)`.
+
+    Parameters
+    ----------
+    L : np.ndarray (nrows, nrows)
+        The lower-triangular Cholesky factor of :math:`A`
+
+    idx : integer
+        The row and column to remove
+
+    Returns
+    -------
+    L_down : np.ndarray (nrows-1, nrows-1)
+        The lower-triangular Cholesky factor of the reduced matrix
+    """
+    L_down = np.delete(np.delete(L, idx, axis=0), idx, axis=1)
+    L_down[idx:, idx:] = update_cholesky_factorization_rank_one(
+        L_down[idx:, idx:], L[idx+1:, idx])
+    return L_down
+
+
 def update_cholesky_factorization_inverse(L_11_inv, L_12, L_22):
     nrows, ncols = L_12.shape
     L_22_inv = np.linalg.inv(L_22)
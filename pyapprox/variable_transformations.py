@@ -188,7 +188,7 @@ class AffineRandomVariableTransformation(object):
         mapped_derivatives = derivatives.copy()
         for ii in range(self.variable.nunique_vars):
             var_indices = self.variable.unique_variable_indices[ii]
-            idx = np.tile(var_indices*num_samples, num_samples)+np.tile(
+            idx = np.repeat(var_indices*num_samples, num_samples)+np.tile(
                 np.arange(num_samples), var_indices.shape[0])
             loc, scale = self.scale_parameters[ii, :]
             mapped_derivatives[idx, :] /= scale